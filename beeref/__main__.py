@@ -123,6 +123,9 @@ def main():
     safe_timer(50, lambda: None)
 
     app.exec()
+    # Settings writes are kept in memory and flushed from the event
+    # loop, make sure nothing is left once the event loop has ended
+    settings.sync()
     del bee
     del app
     logger.debug('BeeRef closed')
@@ -13,7 +13,7 @@
 # You should have received a copy of the GNU General Public License
 # along with BeeRef.  If not, see <https://www.gnu.org/licenses/>.
 
-from functools import cached_property
+from functools import lru_cache
 import logging
 
 from PyQt6 import QtGui
@@ -26,9 +26,42 @@ from beeref.utils import ActionList
 logger = logging.getLogger(__name__)
 
 
+@lru_cache(maxsize=1)
+def _menu_path_index():
+    """Walks the menu structure once and returns two dicts mapping
+    action ids and dynamic menu ids (e.g. Recent Files) to the tuple of
+    menus they are located in.
+    """
+
+    static_paths = {}
+    dynamic_paths = {}
+    stack = [((), menu_item) for menu_item in menu_structure]
+    while stack:
+        parents, menu_item = stack.pop()
+        path = parents + (menu_item['menu'],)
+        items = menu_item['items']
+        if isinstance(items, list):
+            # This is a normal menu
+            for item in items:
+                if isinstance(item, dict):
+                    # This is a submenu
+                    stack.append((path, item))
+                elif isinstance(item, str):
+                    static_paths.setdefault(item, path)
+        else:
+            # This is a dynamic submenu (e.g. Recent Files)
+            dynamic_paths.setdefault(items, path)
+    return static_paths, dynamic_paths
+
+
 class Action:
     SETTINGS_GROUP = 'Actions'
 
+    __slots__ = ('id', 'text', 'callback', 'shortcuts', 'checkable',
+                 'checked', 'group', 'settings', 'enabled', 'menu_item',
+                 'menu_id', 'qaction', '_kb_settings', '_menu_path',
+                 '_qkeyseq_cache')
+
     def __init__(self, id, text, callback=None, shortcuts=None,
                  checkable=False, checked=False, group=None, settings=None,
                  enabled=True, menu_item=None, menu_id=None):
@@ -44,49 +77,44 @@ class Action:
         self.menu_item = menu_item
         self.menu_id = menu_id
         self.qaction = None
-        self.kb_settings = KeyboardSettings()
-        settings_events.restore_keyboard_defaults.connect(
-            self.on_restore_defaults)
+        self._kb_settings = None
+        self._menu_path = None
+        self._qkeyseq_cache = None
 
     def __eq__(self, other):
-        return self.id == other.id
+        return isinstance(other, Action) and self.id == other.id
+
+    def __hash__(self):
+        return hash(self.id)
 
     def __str__(self):
         return self.id
 
+    @property
+    def kb_settings(self):
+        if self._kb_settings is None:
+            self._kb_settings = KeyboardSettings()
+        return self._kb_settings
+
     def on_restore_defaults(self):
         if self.qaction:
-            self.qaction.setShortcuts(self.get_shortcuts())
+            self.qaction.setShortcuts(self.shortcuts)
 
-    @cached_property
+    @property
     def menu_path(self):
-        path = []
+        if self._menu_path is None:
+            static_paths, dynamic_paths = _menu_path_index()
+            self._menu_path = (static_paths.get(self.id)
+                               or dynamic_paths.get(self.menu_id, ()))
+        return self._menu_path
 
-        def _get_path(menu_item):
-            if isinstance(menu_item['items'], list):
-                # This is a normal menu
-                for item in menu_item['items']:
-                    if item == self.id:
-                        path.append(menu_item['menu'])
-                        return True
-                    if isinstance(item, dict):
-                        # This is a submenu
-                        if _get_path(item):
-                            path.append(menu_item['menu'])
-                            return True
-            elif menu_item['items'] == self.menu_id:
-                # This is a dynamic submenu (e.g. Recent Files)
-                path.append(menu_item['menu'])
-                return True
-
-        for menu_item in menu_structure:
-            _get_path(menu_item)
-
-        return path[::-1]
+    @menu_path.setter
+    def menu_path(self, value):
+        self._menu_path = value
 
     def get_shortcuts(self):
-        return self.kb_settings.get_list(
-            self.SETTINGS_GROUP, self.id, self.shortcuts)
+        shortcuts = self.kb_settings.get_all(self.SETTINGS_GROUP)
+        return list(shortcuts.get(self.id, self.shortcuts))
 
     def set_shortcuts(self, value):
         logger.debug(f'Setting shortcut "{self.id}" to: {value}')
@@ -97,14 +125,21 @@ class Action:
 
     def get_qkeysequence(self, index):
         """Current shortcuts as QKeySequence"""
+        shortcuts = self.get_shortcuts()
+        if (self._qkeyseq_cache is None
+                or self._qkeyseq_cache[0] != shortcuts):
+            # Only parse the shortcuts again when they have changed
+            self._qkeyseq_cache = (
+                shortcuts, [QtGui.QKeySequence(s) for s in shortcuts])
         try:
-            return QtGui.QKeySequence(self.get_shortcuts()[index])
+            return self._qkeyseq_cache[1][index]
         except IndexError:
             return QtGui.QKeySequence()
 
     def shortcuts_changed(self):
         """Whether shortcuts have changed from their defaults."""
-        return self.get_shortcuts() != self.shortcuts
+        overrides = self.kb_settings.get_all(self.SETTINGS_GROUP)
+        return self.id in overrides and overrides[self.id] != self.shortcuts
 
     def get_default_shortcut(self, index):
         try:
@@ -448,3 +483,16 @@ actions = ActionList([
         callback='on_action_open_settings_dir',
     ),
 ])
+
+
+def _on_restore_keyboard_defaults():
+    # All stored shortcuts have been removed at this point, so we can
+    # apply the defaults without reading them back from the settings
+    for action in actions.values():
+        if action.qaction:
+            action.qaction.setShortcuts(action.shortcuts)
+
+
+# One connection for all actions instead of one per action
+settings_events.restore_keyboard_defaults.connect(
+    _on_restore_keyboard_defaults)
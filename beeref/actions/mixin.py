@@ -13,7 +13,7 @@
 # You should have received a copy of the GNU General Public License
 # along with BeeRef.  If not, see <https://www.gnu.org/licenses/>.
 
-from collections import defaultdict
+from collections import deque
 from functools import partial
 import os.path
 
@@ -26,21 +26,49 @@ from .menu_structure import menu_structure, MENU_SEPARATOR
 class ActionsMixin:
 
     def actiongroup_set_enabled(self, group, value):
-        for action in self.bee_actiongroups[group]:
-            action.setEnabled(value)
+        actiongroup = self.bee_actiongroups.get(group)
+        if actiongroup is not None:
+            actiongroup.setEnabled(value)
 
     def build_menu_and_actions(self):
         """Creates a new menu or rebuilds the given menu."""
+        self._clear_menu_and_actions()
         self.context_menu = QtWidgets.QMenu(self)
         self.toplevel_menus = []
-        self.bee_actiongroups = defaultdict(list)
         self._post_create_functions = []
+        self._create_actiongroups()
         self._create_actions()
         self._create_menu(self.context_menu, menu_structure)
         for func, arg in self._post_create_functions:
             func(arg)
         del self._post_create_functions
 
+    def _clear_menu_and_actions(self):
+        """Removes and deletes menus and actions of a previous build, so
+        that they and their signal connections don't pile up.
+        """
+
+        if getattr(self, 'context_menu', None) is None:
+            return
+
+        qactions = [action.qaction for action in actions.values()
+                    if action.qaction]
+        for qaction in qactions:
+            self.removeAction(qaction)
+            qaction.deleteLater()
+        for action in actions.values():
+            action.qaction = None
+        # The recent files actions get created along with their menu
+        for key in list(actions.keys()):
+            if key.startswith('recent_files_'):
+                actions.pop(key)
+        for actiongroup in self.bee_actiongroups.values():
+            actiongroup.deleteLater()
+        # Submenus are children of the context menu and get deleted
+        # along with it
+        self.context_menu.deleteLater()
+        self.context_menu = None
+
     def update_menu_and_actions(self):
         self._build_recent_files()
 
@@ -55,7 +83,7 @@ class ActionsMixin:
 
     def _init_action_checkable(self, actiondef, qaction):
         qaction.setCheckable(True)
-        callback = getattr(self, actiondef.callback)
+        callback = self._action_callbacks[actiondef.callback]
         qaction.toggled.connect(callback)
         settings_key = actiondef.settings
         checked = actiondef.checked
@@ -67,7 +95,25 @@ class ActionsMixin:
             qaction.toggled.connect(
                 partial(self._store_checkable_setting, settings_key))
 
+    def _create_actiongroups(self):
+        self.bee_actiongroups = {}
+        names = dict.fromkeys(
+            action.group for action in actions.values() if action.group)
+        for name in names:
+            actiongroup = QtGui.QActionGroup(self)
+            # Needs to be set before adding actions, otherwise they
+            # will be made checkable
+            actiongroup.setExclusive(False)
+            # Grouped actions are disabled until the group gets enabled
+            actiongroup.setEnabled(False)
+            self.bee_actiongroups[name] = actiongroup
+
     def _create_actions(self):
+        # Resolve each callback name to its bound method only once
+        self._action_callbacks = {
+            action.callback: getattr(self, action.callback)
+            for action in actions.values() if action.callback}
+        qactions = []
         for action in actions.values():
             qaction = QtGui.QAction(action.text, self)
             qaction.setAutoRepeat(False)
@@ -77,39 +123,58 @@ class ActionsMixin:
             if action.checkable:
                 self._init_action_checkable(action, qaction)
             else:
-                qaction.triggered.connect(getattr(self, action.callback))
-            self.addAction(qaction)
+                qaction.triggered.connect(
+                    self._action_callbacks[action.callback])
             qaction.setEnabled(action.enabled)
             if action.group:
-                self.bee_actiongroups[action.group].append(qaction)
-                qaction.setEnabled(False)
+                self.bee_actiongroups[action.group].addAction(qaction)
             action.qaction = qaction
+            qactions.append(qaction)
+        self.addActions(qactions)
 
     def _create_menu(self, menu, items):
-        if isinstance(items, str):
-            getattr(self, items)(menu)
-            return menu
-        for item in items:
-            if isinstance(item, str):
-                menu.addAction(actions[item].qaction)
-            if item == MENU_SEPARATOR:
-                menu.addSeparator()
-            if isinstance(item, dict):
-                submenu = menu.addMenu(item['menu'])
-                if menu == self.context_menu:
-                    self.toplevel_menus.append(submenu)
-                self._create_menu(submenu, item['items'])
+        # Submenus are queued and filled after their parent menu
+        # instead of recursing into them
+        queue = deque([(menu, items)])
+        while queue:
+            current, current_items = queue.popleft()
+            if isinstance(current_items, str):
+                # This is a dynamic submenu (e.g. Recent Files)
+                getattr(self, current_items)(current)
+                continue
+            for item in current_items:
+                handler = self._menu_item_handlers[type(item)]
+                handler(self, current, item, queue)
 
         return menu
 
-    def _build_recent_files(self, menu=None):
-        if menu:
-            self._recent_files_submenu = menu
-        self._clear_recent_files()
-
-        files = self.settings.get_recent_files(existing_only=True)
-        items = []
-
+    def _add_menu_action(self, menu, item, queue):
+        menu.addAction(actions[item].qaction)
+
+    def _add_menu_separator(self, menu, item, queue):
+        menu.addSeparator()
+
+    def _add_submenu(self, menu, item, queue):
+        submenu = menu.addMenu(item['menu'])
+        if menu == self.context_menu:
+            self.toplevel_menus.append(submenu)
+        queue.append((submenu, item['items']))
+
+    # Handlers for the item types in the menu structure: action ids,
+    # separators and submenus
+    _menu_item_handlers = {
+        str: _add_menu_action,
+        type(MENU_SEPARATOR): _add_menu_separator,
+        dict: _add_submenu,
+    }
+
+    def _create_recent_files_actions(self):
+        """Creates the actions for the recent files menu. They are
+        created only once per menu and updated with the current files
+        by ``_build_recent_files``.
+        """
+
+        self._recent_files_qactions = []
         for i in range(10):
             action_id = f'recent_files_{i}'
             key = 0 if i == 9 else i + 1
@@ -118,22 +183,31 @@ class ActionsMixin:
                             text=f'File {i + 1}',
                             shortcuts=[f'Ctrl+{key}'])
             actions[action_id] = action
+            qaction = QtGui.QAction(action.text, self)
+            qaction.setShortcuts(action.get_shortcuts())
+            qaction.triggered.connect(self._on_recent_file_triggered)
+            # Invisible actions are disabled, including their shortcuts
+            qaction.setVisible(False)
+            action.qaction = qaction
+            self._recent_files_qactions.append(qaction)
+        self.addActions(self._recent_files_qactions)
+        self._recent_files_submenu.addActions(self._recent_files_qactions)
 
-            if i < len(files):
-                filename = files[i]
-                qaction = QtGui.QAction(os.path.basename(filename), self)
-                qaction.setShortcuts(action.get_shortcuts())
-                qaction.triggered.connect(
-                    partial(self.on_action_open_recent_file, filename))
-                self.addAction(qaction)
-                action.qaction = qaction
-                self._recent_files_submenu.addAction(qaction)
-                items.append(action_id)
+    def _build_recent_files(self, menu=None):
+        if menu:
+            self._recent_files_submenu = menu
+            self._create_recent_files_actions()
+        self._clear_recent_files()
+
+        files = self.settings.get_recent_files(existing_only=True)
+        for qaction, filename in zip(self._recent_files_qactions, files):
+            qaction.setText(os.path.basename(filename))
+            qaction.setData(filename)
+            qaction.setVisible(True)
 
     def _clear_recent_files(self):
-        for action in self._recent_files_submenu.actions():
-            self.removeAction(action)
-        self._recent_files_submenu.clear()
-        for key in list(actions.keys()):
-            if key.startswith('recent_files_'):
-                actions[key].qaction = None
+        for qaction in self._recent_files_qactions:
+            qaction.setVisible(False)
+
+    def _on_recent_file_triggered(self):
+        self.on_action_open_recent_file(self.sender().data())
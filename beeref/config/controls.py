@@ -282,12 +282,34 @@ class KeyboardSettings(QtCore.QSettings):
         ),
     ])
 
+    # Parsed list values per settings file and group, as returned by
+    # get_all. This is shared between instances, as QSettings objects
+    # for the same file share their data, too.
+    _lists_cache = {}
+
     def __init__(self):
         settings_format = QtCore.QSettings.Format.IniFormat
         filename = os.path.join(
             os.path.dirname(BeeSettings().fileName()),
             'KeyboardSettings.ini')
         super().__init__(filename, settings_format)
+        self._filename = filename
+
+    def setValue(self, key, value):
+        super().setValue(key, value)
+        self._lists_cache.clear()
+
+    def remove(self, key):
+        super().remove(key)
+        self._lists_cache.clear()
+
+    def clear(self):
+        super().clear()
+        self._lists_cache.clear()
+
+    @staticmethod
+    def _split_list(values):
+        return list(filter(lambda x: x, values.split(', ')))
 
     def set_list(self, group, key, values, default=None):
         if values == default:
@@ -298,11 +320,27 @@ class KeyboardSettings(QtCore.QSettings):
     def get_list(self, group, key, default=None):
         values = self.value(f'{group}/{key}')
         if values is not None:
-            values = list(filter(lambda x: x, values.split(', ')))
-            return values
+            return self._split_list(values)
 
         return list(default or [])  # Always return new instance of default
 
+    def get_all(self, group):
+        """All list values stored in the given group as a dict of
+        ``{key: [values]}``.
+
+        The group is read from the settings file only once and served
+        from memory afterwards until any value gets changed.
+        """
+
+        cache_key = (self._filename, group)
+        if cache_key not in self._lists_cache:
+            self.beginGroup(group)
+            values = {key: self._split_list(self.value(key))
+                      for key in self.childKeys()}
+            self.endGroup()
+            self._lists_cache[cache_key] = values
+        return self._lists_cache[cache_key]
+
     def get_value(self, group, key, default=None):
         value = self.value(f'{group}/{key}')
         return default if value is None else value
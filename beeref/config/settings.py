@@ -14,9 +14,11 @@
 # along with BeeRef.  If not, see <https://www.gnu.org/licenses/>.
 
 import argparse
+from collections import deque
 import logging
 import os
 import os.path
+import threading
 
 from PyQt6 import QtCore, QtGui
 
@@ -66,6 +68,9 @@ parser.add_argument(
     help='immediately exit with given error message')
 
 
+_commandline_args_lock = threading.Lock()
+
+
 class CommandlineArgs:
     """Wrapper around argument parsing.
 
@@ -74,28 +79,46 @@ class CommandlineArgs:
     other imports so that unit tests won't fail.
 
     This is a singleton so that arguments are only parsed once, unless
-    ``with_check`` is ``True``.
+    ``with_check`` is ``True``. Without ``with_check``, parsing is
+    deferred until an argument is accessed for the first time.
     """
 
     _instance = None
 
     def __new__(cls, *args, **kwargs):
-        if not cls._instance or kwargs.get('with_check'):
-            cls._instance = super().__new__(cls)
-        return cls._instance
-
-    def __init__(self, with_check=False):
-        if not hasattr(self, '_args'):
-            if with_check:
-                self._args = parser.parse_args()
-            else:
-                self._args = parser.parse_known_args()[0]
-
-    def __getattribute__(self, name):
-        if name == '_args':
-            return super().__getattribute__(name)
+        with_check = kwargs.get('with_check')
+        instance = cls._instance
+        if instance is not None and not with_check:
+            return instance
+
+        with _commandline_args_lock:
+            if cls._instance is None or with_check:
+                instance = super().__new__(cls)
+                if with_check:
+                    instance._parse(with_check=True)
+                # Only publish the instance once it's fully set up
+                cls._instance = instance
+            return cls._instance
+
+    def __getattr__(self, name):
+        # Only called for attributes that aren't set yet, i.e. when the
+        # arguments haven't been parsed
+        if name.startswith('__') or '_args' in self.__dict__:
+            raise AttributeError(name)
+        with _commandline_args_lock:
+            if '_args' not in self.__dict__:
+                self._parse()
+        return getattr(self, name)
+
+    def _parse(self, with_check=False):
+        if with_check:
+            args = parser.parse_args()
         else:
-            return getattr(self._args, name)
+            args = parser.parse_known_args()[0]
+        # Make the parsed arguments plain instance attributes. _args
+        # is set last since it marks the arguments as parsed.
+        self.__dict__.update(vars(args))
+        self._args = args
 
 
 class BeeSettingsEvents(QtCore.QObject):
@@ -110,6 +133,48 @@ class BeeSettingsEvents(QtCore.QObject):
 settings_events = BeeSettingsEvents()
 
 
+def make_coercer(conf):
+    """Returns a function that casts and validates a raw settings value
+    as specified by the given ``BeeSettings.FIELDS`` entry, falling back
+    to its default value.
+    """
+
+    default = conf.get('default')
+    cast = conf.get('cast')
+    validate = conf.get('validate')
+
+    def coerce(val):
+        if val is None:
+            val = default
+        if cast:
+            try:
+                val = cast(val)
+            except (ValueError, TypeError):
+                val = default
+        if validate:
+            try:
+                valid = validate(val)
+            except TypeError:
+                # E.g. unhashable values checked against a set
+                valid = False
+            if not valid:
+                val = default
+        return val
+
+    return coerce
+
+
+def filter_existing_files(filenames):
+    """Returns the given filenames that exist, keeping their order.
+
+    Each file is checked on its own. There are only a few of them, and
+    listing their directories instead can be much slower, e.g. for
+    large folders or network shares.
+    """
+
+    return [f for f in filenames if os.path.exists(f)]
+
+
 class BeeSettings(QtCore.QSettings):
 
     FIELDS = {
@@ -119,7 +184,7 @@ class BeeSettings(QtCore.QSettings):
         },
         'Items/image_storage_format': {
             'default': 'best',
-            'validate': lambda x: x in ('png', 'jpg', 'best'),
+            'validate': frozenset(('png', 'jpg', 'best')).__contains__,
         },
         'Items/arrange_gap': {
             'default': 0,
@@ -128,8 +193,8 @@ class BeeSettings(QtCore.QSettings):
         },
         'Items/arrange_default': {
             'default': 'optimal',
-            'validate': lambda x: x in (
-                'optimal', 'horizontal', 'vertical', 'square'),
+            'validate': frozenset((
+                'optimal', 'horizontal', 'vertical', 'square')).__contains__,
         },
         'Items/image_allocation_limit': {
             'default': 256,
@@ -139,6 +204,15 @@ class BeeSettings(QtCore.QSettings):
         }
     }
 
+    COERCERS = {key: make_coercer(conf) for key, conf in FIELDS.items()}
+
+    # Results of valueOrDefault per settings file and key. This is
+    # shared between instances, as QSettings objects for the same file
+    # share their data, too.
+    _values_cache = {}
+    # Recent files per settings file
+    _recent_files_cache = {}
+
     def __init__(self):
         settings_format = QtCore.QSettings.Format.IniFormat
         settings_scope = QtCore.QSettings.Scope.UserScope
@@ -151,6 +225,8 @@ class BeeSettings(QtCore.QSettings):
             settings_scope,
             constants.APPNAME,
             constants.APPNAME)
+        # The path doesn't change for the lifetime of the object
+        self._filename = os.path.normpath(super().fileName())
 
     def on_startup(self):
         """Settings to be applied on application startup."""
@@ -162,15 +238,25 @@ class BeeSettings(QtCore.QSettings):
         QtGui.QImageReader.setAllocationLimit(alloc)
 
     def setValue(self, key, value):
+        # Qt doesn't check whether anything changes, so avoid needless
+        # writes to the settings file ourselves
+        if self.contains(key) and super().value(key) == value:
+            return
         super().setValue(key, value)
-        if key in self.FIELDS and 'post_save_callback' in self.FIELDS[key]:
-            self.FIELDS[key]['post_save_callback'](value)
+        self._values_cache.clear()
+        callback = self._get_post_save_callback(key)
+        if callback:
+            callback(value)
 
     def remove(self, key):
         super().remove(key)
-        if key in self.FIELDS and 'post_save_callback' in self.FIELDS[key]:
-            value = self.valueOrDefault(key)
-            self.FIELDS[key]['post_save_callback'](value)
+        self._values_cache.clear()
+        callback = self._get_post_save_callback(key)
+        if callback:
+            callback(self.valueOrDefault(key))
+
+    def _get_post_save_callback(self, key):
+        return self.FIELDS.get(key, {}).get('post_save_callback')
 
     def valueOrDefault(self, key):
         """Get the value for key, or the default value specified in FIELDS.
@@ -182,22 +268,24 @@ class BeeSettings(QtCore.QSettings):
         'validate' are specified in the FIELDS entry for the given
         key. The default value will be returned if validation or type
         casting fails.
+
+        Results are kept in memory until any setting gets changed.
         """
 
-        val = self.value(key)
-        conf = self.FIELDS[key]
-        if val is None:
-            val = conf['default']
-        if 'cast' in conf:
-            try:
-                val = conf['cast'](val)
-            except (ValueError, TypeError):
-                val = conf['default']
-        if 'validate' in conf:
-            if not conf['validate'](val):
-                val = conf['default']
+        cache_key = (self._filename, key)
+        if cache_key in self._values_cache:
+            return self._values_cache[cache_key]
+
+        coerce = self.COERCERS.get(key) or make_coercer(self.FIELDS[key])
+        val = coerce(self.value(key))
+        self._values_cache[cache_key] = val
         return val
 
+    def clear(self):
+        super().clear()
+        self._values_cache.clear()
+        self._recent_files_cache.clear()
+
     def value_changed(self, key):
         """Whether the value for given key has changed from its default."""
 
@@ -210,11 +298,12 @@ class BeeSettings(QtCore.QSettings):
 
         logger.debug('Restoring settings to defaults')
         for key in self.FIELDS.keys():
-            self.remove(key)
+            if self.contains(key):
+                self.remove(key)
         settings_events.restore_defaults.emit()
 
     def fileName(self):
-        return os.path.normpath(super().fileName())
+        return self._filename
 
     def get_settings_dir(self):  # pragma: no cover
         args = CommandlineArgs()
@@ -222,25 +311,42 @@ class BeeSettings(QtCore.QSettings):
 
     def update_recent_files(self, filename):
         filename = os.path.abspath(filename)
-        values = self.get_recent_files()
+        old_values = self._read_recent_files()
+        values = deque(old_values, maxlen=10)
         if filename in values:
             values.remove(filename)
-        values.insert(0, filename)
+        values.appendleft(filename)
+        values = tuple(values)
+        if values == old_values:
+            return
 
         self.beginWriteArray('RecentFiles')
-        for i, filename in enumerate(values[:10]):
+        for i, filename in enumerate(values):
             self.setArrayIndex(i)
             self.setValue('path', filename)
         self.endArray()
+        self._recent_files_cache[self._filename] = values
 
     def get_recent_files(self, existing_only=False):
+        values = self._read_recent_files()
+        if existing_only:
+            return filter_existing_files(values)
+        return list(values)
+
+    def _read_recent_files(self):
+        """Returns the recent files as a tuple. The array is only read
+        from the settings file once and then kept in memory.
+        """
+
+        if self._filename in self._recent_files_cache:
+            return self._recent_files_cache[self._filename]
+
         values = []
         size = self.beginReadArray('RecentFiles')
         for i in range(size):
             self.setArrayIndex(i)
             values.append(self.value('path'))
         self.endArray()
-
-        if existing_only:
-            values = [f for f in values if os.path.exists(f)]
+        values = tuple(values)
+        self._recent_files_cache[self._filename] = values
         return values
@@ -13,13 +13,17 @@
 # You should have received a copy of the GNU General Public License
 # along with BeeRef.  If not, see <https://www.gnu.org/licenses/>.
 
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import logging
+import os
 
-from PyQt6 import QtCore
+from PyQt6 import QtCore, QtGui
 
 from beeref import commands
 from beeref.fileio.errors import BeeFileIOError
 from beeref.fileio.image import load_image
+from beeref.fileio.progress import BatchedProgress
 from beeref.fileio.sql import SQLiteIO, is_bee_file
 from beeref.items import BeePixmapItem
 
@@ -38,47 +42,89 @@ logger = logging.getLogger(__name__)
 
 def load_bee(filename, scene, worker=None):
     """Load BeeRef native file."""
-    logger.info(f'Loading from file {filename}...')
+    logger.info('Loading from file %s...', filename)
     io = SQLiteIO(filename, scene, readonly=True, worker=worker)
     return io.read()
 
 
 def save_bee(filename, scene, create_new=False, worker=None):
     """Save BeeRef native file."""
-    logger.info(f'Saving to file {filename}...')
-    logger.debug(f'Create new: {create_new}')
+    logger.info('Saving to file %s...', filename)
+    logger.debug('Create new: %s', create_new)
     io = SQLiteIO(filename, scene, create_new, worker=worker)
     io.write()
     logger.info('End save')
 
 
+def _load_display_image(filename):
+    """Loads an image and converts it to the format that pixmaps use
+    for drawing, so that this happens along with the decoding instead
+    of when creating the pixmap.
+    """
+
+    img, filename = load_image(filename)
+    if not img.isNull():
+        if img.hasAlphaChannel():
+            fmt = QtGui.QImage.Format.Format_ARGB32_Premultiplied
+        else:
+            fmt = QtGui.QImage.Format.Format_RGB32
+        if img.format() != fmt:
+            img = img.convertToFormat(fmt)
+    return img, filename
+
+
 def load_images(filenames, pos, scene, worker):
-    """Add images to existing scene."""
+    """Add images to existing scene.
+
+    The images are read and decoded in parallel, but added to the
+    scene in the given order.
+    """
+
+    worker.begin_processing.emit(len(filenames))
+    max_workers = os.cpu_count() or 1
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        items, errors = _load_images(
+            filenames, pos, scene, worker, executor, 2 * max_workers)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    scene.undo_stack.push(
+        commands.InsertItems(scene, items, ignore_first_redo=True))
+    worker.finished.emit('', errors)
+
+
+def _load_images(filenames, pos, scene, worker, executor, lookahead):
+    """Only the next few images get decoded ahead of the one that is
+    being added, so that not all decoded images need to be kept in
+    memory at once.
+    """
+
+    def submit(filename):
+        logger.info('Loading image from file %s', filename)
+        return executor.submit(_load_display_image, filename)
 
     errors = []
     items = []
-    worker.begin_processing.emit(len(filenames))
-    for i, filename in enumerate(filenames):
-        logger.info(f'Loading image from file {filename}')
-        img, filename = load_image(filename)
-        worker.progress.emit(i)
+    futures = deque(submit(filename) for filename in filenames[:lookahead])
+    progress = BatchedProgress(worker, len(filenames))
+    for i in range(len(filenames)):
+        img, filename = futures.popleft().result()
+        if i + lookahead < len(filenames):
+            futures.append(submit(filenames[i + lookahead]))
         if img.isNull():
-            logger.info(f'Could not load file {filename}')
+            logger.info('Could not load file %s', filename)
             errors.append(filename)
-            continue
-
-        item = BeePixmapItem(img, filename)
-        item.set_pos_center(pos)
-        scene.add_item_later({'item': item, 'type': 'pixmap'}, selected=True)
-        items.append(item)
+        else:
+            item = BeePixmapItem(img, filename)
+            item.set_pos_center(pos)
+            scene.add_item_later(
+                {'item': item, 'type': 'pixmap'}, selected=True)
+            items.append(item)
+        if progress.update(i, force=worker.canceled):
+            worker.wait_for_main_thread()
         if worker.canceled:
             break
-        # Give main thread time to process items:
-        worker.msleep(10)
-
-    scene.undo_stack.push(
-        commands.InsertItems(scene, items, ignore_first_redo=True))
-    worker.finished.emit('', errors)
+    return items, errors
 
 
 class ThreadedIO(QtCore.QThread):
@@ -89,6 +135,10 @@ class ThreadedIO(QtCore.QThread):
     begin_processing = QtCore.pyqtSignal(int)
     user_input_required = QtCore.pyqtSignal(str)
 
+    # How many progress signals may be waiting for the main thread
+    # before the worker blocks
+    MAX_PENDING = 32
+
     def __init__(self, func, *args, **kwargs):
         super().__init__()
         self.func = func
@@ -96,9 +146,23 @@ class ThreadedIO(QtCore.QThread):
         self.kwargs = kwargs
         self.kwargs['worker'] = self
         self.canceled = False
+        self.pending = QtCore.QSemaphore(self.MAX_PENDING)
+        # This object lives in the main thread, so the slot gets
+        # called once the main thread has handled the signal
+        self.progress.connect(self.on_progress_processed)
 
     def run(self):
         self.func(*self.args, **self.kwargs)
 
     def on_canceled(self):
         self.canceled = True
+
+    def on_progress_processed(self, value):
+        self.pending.release()
+
+    def wait_for_main_thread(self):
+        """Gives the main thread time to process emitted items: Blocks
+        when too many progress signals haven't been handled yet.
+        """
+
+        self.pending.acquire()
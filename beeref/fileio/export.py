@@ -14,13 +14,22 @@
 # along with BeeRef.  If not, see <https://www.gnu.org/licenses/>.
 
 import base64
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import errno
 import logging
+import os
 import pathlib
+import shutil
 from xml.etree import ElementTree as ET
+from xml.sax.saxutils import quoteattr
 
 from PyQt6 import QtCore, QtGui
 
 from .errors import BeeFileIOError
+from .png import PNGStreamWriter
+from .progress import BatchedProgress
 from beeref import constants, widgets
 from beeref.items import BeePixmapItem
 
@@ -28,14 +37,63 @@ from beeref.items import BeePixmapItem
 logger = logging.getLogger(__name__)
 
 
+SVG_FONT_STYLES = {
+    QtGui.QFont.Style.StyleNormal: 'normal',
+    QtGui.QFont.Style.StyleItalic: 'italic',
+    QtGui.QFont.Style.StyleOblique: 'oblique',
+}
+
+
+def write_base64(f, data, chunk_size=57 * 1024):
+    """Writes the base64 encoding of the given bytes to the text file in
+    chunks, without encoding all of the data at once.
+
+    The chunk size needs to be a multiple of 3 so that the encoded
+    chunks don't need padding.
+    """
+
+    view = memoryview(data)
+    for i in range(0, len(view), chunk_size):
+        f.write(base64.b64encode(view[i:i + chunk_size]).decode('ascii'))
+
+
+@contextmanager
+def open_for_replace(filename, mode, worker=None, **kwargs):
+    """Opens a temporary file next to ``filename`` for writing, which
+    replaces ``filename`` once it has been written completely.
+
+    When writing fails or the worker gets canceled, the temporary file
+    is removed instead, so that no truncated file is left in place of
+    the user's file. Files that aren't writable don't get replaced.
+    """
+
+    if os.path.exists(filename) and not os.access(filename, os.W_OK):
+        raise PermissionError(
+            errno.EACCES, os.strerror(errno.EACCES), filename)
+    tmpname = f'{filename}.part'
+    try:
+        with open(tmpname, mode, **kwargs) as f:
+            yield f
+        if not (worker and worker.canceled):
+            if os.path.exists(filename):
+                shutil.copymode(filename, tmpname)
+            os.replace(tmpname, filename)
+    finally:
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
+
+
 class ExporterRegistry(dict):
 
     DEFAULT_TYPE = 0
 
     def __getitem__(self, key):
         key = key.removeprefix('.')
-        exp = self.get(key, super().__getitem__(self.DEFAULT_TYPE))
-        logger.debug(f'Exporter for type {key}: {exp}')
+        exp = self.get(key)
+        if exp is None:
+            # Only look up the default when it's actually needed
+            exp = super().__getitem__(self.DEFAULT_TYPE)
+        logger.debug('Exporter for type %s: %s', key, exp)
         return exp
 
 
@@ -49,13 +107,25 @@ def register_exporter(cls):
 
 class ExporterBase:
 
+    # Progress is emitted in batches of this fraction of the total steps
+    PROGRESS_GRANULARITY = 200
+
+    _batched_progress = None
+
     def emit_begin_processing(self, worker, start):
         if worker:
             worker.begin_processing.emit(start)
+            self._batched_progress = BatchedProgress(
+                worker, start,
+                batch_size=max(1, start // self.PROGRESS_GRANULARITY))
 
     def emit_progress(self, worker, progress):
         if worker:
-            worker.progress.emit(progress)
+            if self._batched_progress:
+                self._batched_progress.update(
+                    progress, force=worker.canceled)
+            else:
+                worker.progress.emit(progress)
 
     def emit_finished(self, worker, filename, errors):
         filename = str(filename)
@@ -68,7 +138,7 @@ class ExporterBase:
 
     def handle_export_error(self, filename, error, worker):
         filename = str(filename)
-        logger.debug(f'Export failed: {error}')
+        logger.debug('Export failed: %s', error)
         if worker:
             worker.finished.emit(filename, [str(error)])
             return
@@ -88,14 +158,15 @@ class SceneExporterBase(ExporterBase):
         # image, so deselect first. (Alternatively, pass an attribute
         # to paint functions to not paint them?)
         rect = self.scene.itemsBoundingRect()
-        logger.trace(f'Items bounding rect: {rect}')
+        self.items_bounding_rect = rect
+        logger.trace('Items bounding rect: %s', rect)
         size = QtCore.QSize(int(rect.width()), int(rect.height()))
-        logger.trace(f'Export size without margins: {size}')
+        logger.trace('Export size without margins: %s', size)
         self.margin = max(size.width(), size.height()) * 0.03
         self.default_size = size.grownBy(
             QtCore.QMargins(*([int(self.margin)] * 4)))
-        logger.debug(f'Default export margin: {self.margin}')
-        logger.debug(f'Default export size with margins: {self.default_size}')
+        logger.debug('Default export margin: %s', self.margin)
+        logger.debug('Default export size with margins: %s', self.default_size)
 
 
 @register_exporter
@@ -103,6 +174,14 @@ class SceneToPixmapExporter(SceneExporterBase):
 
     TYPE = ExporterRegistry.DEFAULT_TYPE
 
+    # Qt maps the quality of PNGs to zlib compression levels via
+    # (100 - quality) * 9 / 91, so 90 would write uncompressed PNGs.
+    # 80 gives level 1, which is the fastest actual compression.
+    PNG_QUALITY = 80
+    QUALITY = 90
+    # Larger PNGs are rendered and written in strips of this many pixels
+    STRIP_PIXELS = 4096 * 4096
+
     def get_user_input(self, parent):
         """Ask user for final export size."""
 
@@ -112,34 +191,127 @@ class SceneToPixmapExporter(SceneExporterBase):
         )
         if dialog.exec():
             size = dialog.value()
-            logger.debug(f'Got export size {size}')
+            logger.debug('Got export size %s', size)
             self.size = size
             return True
         else:
             return False
 
-    def render_to_image(self):
-        logger.debug(f'Final export size: {self.size}')
-        margin = self.margin * self.size.width() / self.default_size.width()
-        logger.debug(f'Final export margin: {margin}')
+    def get_target_rect(self):
+        """Returns the rect the items get rendered to in the final
+        image, i.e. without margins.
+        """
 
-        image = QtGui.QImage(self.size, QtGui.QImage.Format.Format_RGB32)
-        image.fill(QtGui.QColor(*constants.COLORS['Scene:Canvas']))
-        painter = QtGui.QPainter(image)
-        target_rect = QtCore.QRectF(
+        margin = self.margin * self.size.width() / self.default_size.width()
+        logger.debug('Final export margin: %s', margin)
+        return QtCore.QRectF(
             margin,
             margin,
             self.size.width() - 2 * margin,
             self.size.height() - 2 * margin)
-        logger.trace(f'Final export target_rect: {target_rect}')
+
+    def render_to_image(self):
+        logger.debug('Final export size: %s', self.size)
+
+        image = QtGui.QImage(self.size, QtGui.QImage.Format.Format_RGB32)
+        image.fill(QtGui.QColor(*constants.COLORS['Scene:Canvas']))
+        painter = QtGui.QPainter(image)
+        target_rect = self.get_target_rect()
+        logger.trace('Final export target_rect: %s', target_rect)
         self.scene.render(painter,
-                          source=self.scene.itemsBoundingRect(),
+                          source=self.items_bounding_rect,
                           target=target_rect)
         painter.end()
         return image
 
+    def render_strip(self, painter, top, height, background):
+        """Renders the given rows of the final image with the painter,
+        whose device is the strip holding those rows.
+
+        Only the part of the scene that ends up in those rows gets
+        rendered, with the same scaling that ``render_to_image`` uses.
+        """
+
+        painter.fillRect(
+            QtCore.QRectF(0, 0, self.size.width(), height), background)
+        source = self.items_bounding_rect
+        if source.isEmpty():
+            return
+
+        target = self.get_target_rect()
+        # Qt keeps the aspect ratio and aligns the source with the top
+        # left corner of the target
+        ratio = min(target.width() / source.width(),
+                    target.height() / source.height())
+        start = max(top, target.top())
+        end = min(top + height, target.top() + source.height() * ratio)
+        if end > start:
+            self.scene.render(
+                painter,
+                source=QtCore.QRectF(
+                    source.left(),
+                    source.top() + (start - target.top()) / ratio,
+                    source.width(),
+                    (end - start) / ratio),
+                target=QtCore.QRectF(
+                    target.left(),
+                    start - top,
+                    source.width() * ratio,
+                    end - start))
+
+    def export_png_in_strips(self, filename, worker=None):
+        """Renders and writes the PNG in horizontal strips of at most
+        ``STRIP_PIXELS`` pixels, so that large exports don't need to
+        hold the whole image in memory.
+
+        The same strip image and painter are used for all strips.
+        """
+
+        width = self.size.width()
+        height = self.size.height()
+        strip_height = min(height, max(1, self.STRIP_PIXELS // width))
+        tops = range(0, height, strip_height)
+        logger.debug('Exporting in %s strips', len(tops))
+        self.emit_begin_processing(worker, len(tops))
+
+        background = QtGui.QColor(*constants.COLORS['Scene:Canvas'])
+        strip = QtGui.QImage(
+            width, strip_height, QtGui.QImage.Format.Format_RGB32)
+        painter = QtGui.QPainter(strip)
+        try:
+            with open_for_replace(filename, 'wb', worker) as f:
+                writer = PNGStreamWriter(f, width, height)
+                for i, top in enumerate(tops):
+                    if worker and worker.canceled:
+                        break
+                    rows = min(strip_height, height - top)
+                    self.render_strip(painter, top, rows, background)
+                    writer.write_image(strip, rows)
+                    self.emit_progress(worker, i)
+                else:
+                    writer.close()
+        except OSError as e:
+            self.handle_export_error(filename, e, worker)
+            return
+        finally:
+            painter.end()
+
+        if worker and worker.canceled:
+            logger.debug('Export canceled')
+            self.emit_finished(worker, filename, [])
+            return
+
+        logger.debug('Export finished')
+        self.emit_finished(worker, filename, [])
+
     def export(self, filename, worker=None):
-        logger.debug(f'Exporting scene to {filename}')
+        logger.debug('Exporting scene to %s', filename)
+        is_png = pathlib.Path(filename).suffix.lower() == '.png'
+        if (is_png and self.size.width() * self.size.height()
+                > self.STRIP_PIXELS):
+            self.export_png_in_strips(filename, worker)
+            return
+
         self.emit_begin_processing(worker, 1)
         image = self.render_to_image()
 
@@ -148,7 +320,11 @@ class SceneToPixmapExporter(SceneExporterBase):
             self.emit_finished(worker, filename, [])
             return
 
-        if not image.save(filename, quality=90):
+        if is_png:
+            quality = self.PNG_QUALITY
+        else:
+            quality = self.QUALITY
+        if not image.save(filename, quality=quality):
             self.handle_export_error(filename, 'Error writing file', worker)
             return
 
@@ -166,112 +342,153 @@ class SceneToSVGExporter(SceneExporterBase):
         self.size = self.default_size
         return True
 
+    def __init__(self, scene):
+        super().__init__(scene)
+        self._textstyles_cache = {}
+
     def _get_textstyles(self, item):
-        fontstylemap = {
-            QtGui.QFont.Style.StyleNormal: 'normal',
-            QtGui.QFont.Style.StyleItalic: 'italic',
-            QtGui.QFont.Style.StyleOblique: 'oblique',
-        }
+        """Returns the CSS styles of a text item. They are computed only
+        once per font and scale, as many text items tend to share them.
+        """
 
         font = item.font()
+        key = (font.toString(), item.scale())
+        styles = self._textstyles_cache.get(key)
+        if styles is not None:
+            return styles
+
         fontsize = font.pointSize() * item.scale()
         families = ', '.join(font.families())
-        fontstyle = fontstylemap[font.style()]
-
-        return ('white-space:pre',
-                f'font-size:{fontsize}pt',
-                f'font-family:{families}',
-                f'font-weight:{font.weight()}',
-                f'font-stretch:{font.stretch()}',
-                f'font-style:{fontstyle}')
-
-    def render_to_svg(self, worker=None):
-        svg = ET.Element(
-            'svg',
-            attrib={'width': str(self.size.width()),
-                    'height': str(self.size.height()),
-                    'xmlns': 'http://www.w3.org/2000/svg',
-                    'xmlns:xlink': 'http://www.w3.org/1999/xlink',
-                    })
-
-        rect = self.scene.itemsBoundingRect()
-        offset = rect.topLeft() - QtCore.QPointF(self.margin, self.margin)
-
-        for i, item in enumerate(sorted(self.scene.items(),
-                                        key=lambda x: x.zValue())):
+        fontstyle = SVG_FONT_STYLES[font.style()]
+
+        styles = ('white-space:pre',
+                  f'font-size:{fontsize}pt',
+                  f'font-family:{families}',
+                  f'font-weight:{font.weight()}',
+                  f'font-stretch:{font.stretch()}',
+                  f'font-style:{fontstyle}')
+        self._textstyles_cache[key] = styles
+        return styles
+
+    def _get_svg_attributes(self):
+        return {'width': str(self.size.width()),
+                'height': str(self.size.height()),
+                'xmlns': 'http://www.w3.org/2000/svg',
+                'xmlns:xlink': 'http://www.w3.org/1999/xlink',
+                }
+
+    def _render_element(self, item, offset):
+        """Returns the SVG element for the item without its image data,
+        and the image data as ``(bytes, format)`` for pixmap items.
+        """
+
+        pos = item.pos() - offset
+        anchor = pos
+        imgdata = None
+
+        if item.TYPE == 'text':
+            styles = self._get_textstyles(item)
+            element = ET.Element(
+                'text',
+                attrib={'style': ';'.join(styles),
+                        'dominant-baseline': 'hanging'})
+            element.text = item.toPlainText()
+        if item.TYPE == 'pixmap':
+            width = item.width * item.scale()
+            height = item.height * item.scale()
+            imgdata = item.pixmap_to_bytes(
+                apply_grayscale=True,
+                apply_crop=True)
+            element = ET.Element(
+                'image',
+                attrib={
+                    'width': str(width),
+                    'height': str(height),
+                    'image-rendering': ('crisp-edges' if item.scale() > 2
+                                        else 'optimizeQuality')})
+            pos = pos + item.crop.topLeft()
+
+        ax = anchor.x()
+        ay = anchor.y()
+        transform = f'rotate({item.rotation()} {ax} {ay})'
+        flip = item.flip()
+        if flip == -1:
+            # The following is not recognised by Inkscape and not an
+            # official standard:
+            # element.set('transform-origin', f'{anchor.x()} {anchor.y()}')
+            # Thus we need to fix the origin manually
+            transform = (f'translate({ax} {ay}) scale({flip} 1) '
+                         f'translate(-{ax} -{ay}) {transform}')
+
+        element.set('transform', transform)
+        element.set('x', str(pos.x()))
+        element.set('y', str(pos.y()))
+        element.set('opacity', str(item.opacity()))
+        return element, imgdata
+
+    def _iter_items(self, worker=None):
+        """Yields all items in z order, one at a time, along with the
+        offset of the export. Stops early when the worker gets canceled.
+        """
+
+        offset = (self.items_bounding_rect.topLeft()
+                  - QtCore.QPointF(self.margin, self.margin))
+        items = self.scene.items(QtCore.Qt.SortOrder.AscendingOrder)
+
+        for i, item in enumerate(items):
             # z order in SVG specified via the order of elements in the tree
-            pos = item.pos() - offset
-            anchor = pos
-
-            if item.TYPE == 'text':
-                styles = self._get_textstyles(item)
-                element = ET.Element(
-                    'text',
-                    attrib={'style': ';'.join(styles),
-                            'dominant-baseline': 'hanging'})
-                element.text = item.toPlainText()
-            if item.TYPE == 'pixmap':
-                width = item.width * item.scale()
-                height = item.height * item.scale()
-                pixmap, imgformat = item.pixmap_to_bytes(
-                    apply_grayscale=True,
-                    apply_crop=True)
-                pixmap = base64.b64encode(pixmap).decode('ascii')
-                element = ET.Element(
-                    'image',
-                    attrib={
-                        'xlink:href':
-                        f'data:image/{imgformat};base64,{pixmap}',
-                        'width': str(width),
-                        'height': str(height),
-                        'image-rendering': ('crisp-edges' if item.scale() > 2
-                                            else 'optimizeQuality')})
-                pos = pos + item.crop.topLeft()
-
-            transforms = []
-            if item.flip() == -1:
-                # The following is not recognised by Inkscape and not an
-                # official standard:
-                # element.set('transform-origin', f'{anchor.x()} {anchor.y()}')
-                # Thus we need to fix the origin manually
-                transforms.append(f'translate({anchor.x()} {anchor.y()})')
-                transforms.append(f'scale({item.flip()} 1)')
-                transforms.append(f'translate(-{anchor.x()} -{anchor.y()})')
-            transforms.append(
-                f'rotate({item.rotation()} {anchor.x()} {anchor.y()})')
-
-            element.set('transform', ' '.join(transforms))
-            element.set('x', str(pos.x()))
-            element.set('y', str(pos.y()))
-            element.set('opacity', str(item.opacity()))
-
-            svg.append(element)
+            yield item, offset
             self.emit_progress(worker, i)
             if worker and worker.canceled:
                 return
 
-        return svg
+    def write_svg(self, f, worker=None):
+        """Writes the SVG to the given text file one element at a time,
+        so that the whole document never needs to be held in memory.
+
+        Image data is base64 encoded straight into the file in chunks.
+        """
+
+        attrs = ' '.join(f'{key}={quoteattr(value)}'
+                         for key, value in self._get_svg_attributes().items())
+        f.write("<?xml version='1.0' encoding='utf-8'?>\n")
+        f.write(f'<svg {attrs}>\n')
+        for item, offset in self._iter_items(worker):
+            element, imgdata = self._render_element(item, offset)
+            markup = ET.tostring(element, encoding='unicode')
+            # Item elements have no children, so indenting them
+            # only takes a prefix
+            f.write('  ')
+            if imgdata:
+                # Base64 only consists of characters that are safe in
+                # XML attributes, so it can be written unescaped
+                pixmap, imgformat = imgdata
+                start = f'<{element.tag}'
+                f.write(f'{start} xlink:href="data:image/{imgformat};base64,')
+                write_base64(f, pixmap)
+                f.write('"')
+                markup = markup.removeprefix(start)
+            f.write(markup)
+            f.write('\n')
+        f.write('</svg>\n')
 
     def export(self, filename, worker=None):
-        logger.debug(f'Exporting scene to {filename}')
+        logger.debug('Exporting scene to %s', filename)
         self.emit_begin_processing(worker, len(self.scene.items()))
-        svg = self.render_to_svg(worker)
-
-        if worker and worker.canceled:
-            logger.debug('Export canceled')
-            worker.finished.emit(filename, [])
-            return
-
-        tree = ET.ElementTree(svg)
-        ET.indent(tree, space='  ')
 
         try:
-            with open(filename, 'w') as f:
-                tree.write(f, encoding='unicode', xml_declaration=True)
+            with open_for_replace(
+                    filename, 'w', worker, encoding='utf-8') as f:
+                self.write_svg(f, worker)
         except OSError as e:
             self.handle_export_error(filename, e, worker)
             return
 
+        if worker and worker.canceled:
+            logger.debug('Export canceled')
+            worker.finished.emit(filename, [])
+            return
+
         logger.debug('Export finished')
         self.emit_finished(worker, filename, [])
 
@@ -296,20 +513,59 @@ class ImagesToDirectoryExporter(ExporterBase):
         self.handle_existing = None
 
     def export(self, worker=None):
-        logger.debug(f'Exporting images to {self.dirname}')
-        logger.debug(f'Starting at {self.start_from}')
+        logger.debug('Exporting images to %s', self.dirname)
+        logger.debug('Starting at %s', self.start_from)
 
         self.emit_begin_processing(worker, self.num_total)
         self.emit_progress(worker, self.start_from)
 
-        for i, item in enumerate(
-                self.items[self.start_from:], start=self.start_from):
+        try:
+            dir_fd = self._open_dir()
+        except OSError as e:
+            self.handle_export_error(self.dirname, e, worker)
+            return
+
+        max_workers = os.cpu_count() or 1
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            self._export(executor, 2 * max_workers, dir_fd, worker)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+            if dir_fd is not None:
+                os.close(dir_fd)
+
+    def _open_dir(self):
+        """Returns a file descriptor of the export directory, so that
+        files can be accessed relative to it without resolving the
+        whole path each time. Returns None on platforms that don't
+        support this.
+        """
+
+        if {os.open, os.stat} <= os.supports_dir_fd:
+            return os.open(self.dirname,
+                           os.O_RDONLY | getattr(os, 'O_DIRECTORY', 0))
+
+    def _export(self, executor, lookahead, dir_fd, worker):
+        # Encoding is the expensive part, so the next few images get
+        # encoded in parallel while the current one gets written.
+        # Pixmaps can't be used in the pool's threads, so the images
+        # to encode get prepared in this thread.
+        items = self.items[self.start_from:]
+        futures = deque(executor.submit(item.prepare_pixmap_bytes())
+                        for item in items[:lookahead])
+
+        for i, item in enumerate(items, start=self.start_from):
             if worker and worker.canceled:
                 logger.debug('Export canceled')
                 worker.finished.emit(self.dirname, [])
                 return
 
-            pixmap, imgformat = item.pixmap_to_bytes()
+            future = futures.popleft()
+            next_index = i - self.start_from + lookahead
+            if next_index < len(items):
+                futures.append(executor.submit(
+                    items[next_index].prepare_pixmap_bytes()))
+            pixmap, imgformat = future.result()
 
             if item.save_id:
                 filename = item.get_filename_for_export(imgformat)
@@ -318,18 +574,22 @@ class ImagesToDirectoryExporter(ExporterBase):
                 save_id = self.max_save_id
                 filename = item.get_filename_for_export(imgformat, save_id)
 
+            path = os.path.join(self.dirname, filename)
+            name = path if dir_fd is None else filename
             try:
-                path = pathlib.Path(self.dirname) / filename
-                path_exists = path.exists()
+                os.stat(name, dir_fd=dir_fd)
+                path_exists = True
+            except FileNotFoundError:
+                path_exists = False
             except OSError as e:
                 self.handle_export_error(self.dirname, e, worker)
                 return
 
             if path_exists:
-                logger.debug(f'File already exists: {path}')
+                logger.debug('File already exists: %s', path)
                 if self.handle_existing is None:
                     self.start_from = i
-                    self.emit_user_input_required(worker, str(path))
+                    self.emit_user_input_required(worker, path)
                     return
                 else:
                     if self.handle_existing == 'skip':
@@ -345,9 +605,16 @@ class ImagesToDirectoryExporter(ExporterBase):
                     elif self.handle_existing == 'overwrite_all':
                         logger.debug('Overwrite file')
 
-            logger.debug(f'Writing file: {path}')
+            logger.debug('Writing file: %s', path)
             try:
-                path.write_bytes(pixmap)
+                fd = os.open(
+                    name,
+                    (os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+                     | getattr(os, 'O_BINARY', 0)),
+                    0o666,
+                    dir_fd=dir_fd)
+                with open(fd, 'wb') as f:
+                    f.write(pixmap)
             except OSError as e:
                 self.handle_export_error(path, e, worker)
                 return
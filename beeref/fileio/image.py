@@ -13,17 +13,13 @@
 # You should have received a copy of the GNU General Public License
 # along with BeeRef.  If not, see <https://www.gnu.org/licenses/>.
 
+from html.parser import HTMLParser
 import logging
 import os.path
-import tempfile
 from urllib.error import URLError
 from urllib import parse, request
 
-from PyQt6 import QtGui
-
-import exif
-from lxml import etree
-import plum
+from PyQt6 import QtCore, QtGui
 
 
 logger = logging.getLogger(__name__)
@@ -32,55 +28,44 @@ logger = logging.getLogger(__name__)
 def exif_rotated_image(path=None):
     """Returns a QImage that is transformed according to the source's
     orientation EXIF data.
+
+    The transformation is applied by Qt while decoding the image.
     """
 
-    img = QtGui.QImage(path)
-    if img.isNull():
-        return img
+    reader = QtGui.QImageReader(path) if path else QtGui.QImageReader()
+    reader.setAutoTransform(True)
+    return reader.read()
 
-    with open(path, 'rb') as f:
-        try:
-            exifimg = exif.Image(f)
-        except (plum.exceptions.UnpackError, NotImplementedError):
-            logger.exception(f'Exif parser failed on image: {path}')
-            return img
 
-    try:
-        if 'orientation' in exifimg.list_all():
-            orientation = exifimg.orientation
-        else:
-            return img
-    except (NotImplementedError, ValueError):
-        logger.exception(f'Exif failed reading orientation of image: {path}')
-        return img
-
-    transform = QtGui.QTransform()
-
-    if orientation == exif.Orientation.TOP_RIGHT:
-        return img.mirrored(horizontal=True, vertical=False)
-    if orientation == exif.Orientation.BOTTOM_RIGHT:
-        transform.rotate(180)
-        return img.transformed(transform)
-    if orientation == exif.Orientation.BOTTOM_LEFT:
-        return img.mirrored(horizontal=False, vertical=True)
-    if orientation == exif.Orientation.LEFT_TOP:
-        transform.rotate(90)
-        return img.transformed(transform).mirrored(
-            horizontal=True, vertical=False)
-    if orientation == exif.Orientation.RIGHT_TOP:
-        transform.rotate(90)
-        return img.transformed(transform)
-    if orientation == exif.Orientation.RIGHT_BOTTOM:
-        transform.rotate(270)
-        return img.transformed(transform).mirrored(
-            horizontal=True, vertical=False)
-    if orientation == exif.Orientation.LEFT_BOTTOM:
-        transform.rotate(270)
-        return img.transformed(transform)
+def exif_rotated_image_from_data(data):
+    """Like ``exif_rotated_image``, but decodes the image from the given
+    bytes in memory.
+    """
 
+    buffer = QtCore.QBuffer()
+    buffer.setData(data)
+    buffer.open(QtCore.QIODevice.OpenModeFlag.ReadOnly)
+    reader = QtGui.QImageReader(buffer)
+    reader.setAutoTransform(True)
+    img = reader.read()
+    buffer.close()
     return img
 
 
+class FirstImageSourceParser(HTMLParser):
+    """Finds the source of the first image with a source in an HTML
+    page.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.src = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'img' and self.src is None:
+            self.src = dict(attrs).get('src')
+
+
 def load_image(path):
     if isinstance(path, str):
         path = os.path.normpath(path)
@@ -95,19 +80,18 @@ def load_image(path):
     if domain == 'pinterest.com':
         try:
             page_data = request.urlopen(url).read()
-            root = etree.HTML(page_data)
-            url = root.xpath("//img")[0].get('src')
+            parser = FirstImageSourceParser()
+            parser.feed(page_data.decode('utf-8', errors='replace'))
+            parser.close()
+            if parser.src is None:
+                raise ValueError('No image found')
+            url = parser.src
         except Exception as e:
-            logger.debug(f'Pinterest image download failed: {e}')
+            logger.debug('Pinterest image download failed: %s', e)
     try:
         imgdata = request.urlopen(url).read()
     except URLError as e:
-        logger.debug(f'Downloading image failed: {e.reason}')
+        logger.debug('Downloading image failed: %s', e.reason)
     else:
-        with tempfile.TemporaryDirectory() as tmp:
-            fname = os.path.join(tmp, 'img')
-            with open(fname, 'wb') as f:
-                f.write(imgdata)
-                logger.debug(f'Temporarily saved in: {fname}')
-            img = exif_rotated_image(fname)
+        img = exif_rotated_image_from_data(imgdata)
     return (img, url)
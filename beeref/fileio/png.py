@@ -0,0 +1,88 @@
+# This file is part of BeeRef.
+#
+# BeeRef is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# BeeRef is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with BeeRef.  If not, see <https://www.gnu.org/licenses/>.
+
+import struct
+import zlib
+
+from PyQt6 import QtGui
+
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+class PNGStreamWriter:
+    """Writes an RGB PNG file from horizontal strips of the image, so
+    that the whole image never needs to be held in memory.
+
+    Qt can only write whole images, so this writes the PNG format
+    itself, with every row unfiltered.
+    """
+
+    def __init__(self, f, width, height, level=1):
+        self.f = f
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self.compressor = zlib.compressobj(level)
+        f.write(PNG_SIGNATURE)
+        # 8 bit depth, color type 2 (RGB), default compression and
+        # filter method, no interlacing
+        self._write_chunk(
+            b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+
+    def _write_chunk(self, chunk_type, data):
+        self.f.write(struct.pack('>I', len(data)))
+        self.f.write(chunk_type)
+        self.f.write(data)
+        crc = zlib.crc32(data, zlib.crc32(chunk_type))
+        self.f.write(struct.pack('>I', crc))
+
+    def write_image(self, img, height=None):
+        """Append the rows of the given image, which needs to be as wide
+        as the PNG. If ``height`` is given, only that many rows from the
+        top of the image are appended.
+        """
+
+        if img.width() != self.width:
+            raise ValueError(
+                f'Image width {img.width()} doesn\'t match PNG width '
+                f'{self.width}')
+        if height is None:
+            height = img.height()
+        if height > img.height() or self.rows_written + height > self.height:
+            raise ValueError(
+                f'Can\'t write {height} more rows to PNG with '
+                f'{self.height - self.rows_written} rows left')
+        img = img.convertToFormat(QtGui.QImage.Format.Format_RGB888)
+        rowsize = self.width * 3
+        bytes_per_line = img.bytesPerLine()
+        data = memoryview(img.constBits().asstring(img.sizeInBytes()))
+        compressed = []
+        for i in range(height):
+            start = i * bytes_per_line
+            compressed.append(self.compressor.compress(b'\x00'))
+            compressed.append(
+                self.compressor.compress(data[start:start + rowsize]))
+        self.rows_written += height
+        compressed = b''.join(compressed)
+        if compressed:
+            self._write_chunk(b'IDAT', compressed)
+
+    def close(self):
+        if self.rows_written != self.height:
+            raise ValueError(
+                f'PNG needs {self.height} rows, but got {self.rows_written}')
+        self._write_chunk(b'IDAT', self.compressor.flush())
+        self._write_chunk(b'IEND', b'')
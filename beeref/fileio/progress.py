@@ -0,0 +1,56 @@
+# This file is part of BeeRef.
+#
+# BeeRef is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# BeeRef is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with BeeRef.  If not, see <https://www.gnu.org/licenses/>.
+
+import time
+
+
+class BatchedProgress:
+    """Emits a worker's progress signal in batches instead of for every
+    single step, since each emit from a worker thread needs to be
+    dispatched to the main thread.
+
+    The first and last step are always emitted. In between, progress
+    is emitted every ``batch_size`` steps or after ``interval``
+    seconds, whichever comes first.
+    """
+
+    def __init__(self, worker, total, batch_size=8, interval=0.05):
+        self.worker = worker
+        self.total = total
+        self.batch_size = batch_size
+        self.interval = interval
+        self.last_step = None
+        self.last_time = time.monotonic()
+
+    def update(self, step, force=False):
+        """Emit progress for the given step if it's due.
+
+        :param int step: The step that has been finished
+        :param bool force: Emit regardless of the batch
+        :return: Whether progress has been emitted
+        """
+
+        now = time.monotonic()
+        if not (force
+                or self.last_step is None
+                or step >= self.total - 1
+                or step - self.last_step >= self.batch_size
+                or now - self.last_time >= self.interval):
+            return False
+
+        self.worker.progress.emit(step)
+        self.last_step = step
+        self.last_time = now
+        return True
@@ -23,29 +23,108 @@ https://www.sqlite.org/appfileformat.html
 https://www.sqlite.org/sqlar.html
 """
 
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import json
 import logging
 import os
 import pathlib
 import shutil
 import sqlite3
+import sys
 import tempfile
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
 from PyQt6 import QtGui
 
 from beeref import constants
 from beeref.items import BeePixmapItem, BeeErrorItem
 from .errors import BeeFileIOError, IMG_LOADING_ERROR_MSG
+from .progress import BatchedProgress
 from .schema import SCHEMA, USER_VERSION, MIGRATIONS, APPLICATION_ID
 
 
 logger = logging.getLogger(__name__)
 
 
+CONNECTION_PRAGMAS = [
+    'PRAGMA cache_size=-65536',  # 64 MiB
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA mmap_size=268435456',  # 256 MiB
+]
+
+# Only used for new files; needs to be set before the first write.
+# Larger pages mean fewer overflow pages for image blobs.
+NEW_FILE_PRAGMAS = [
+    'PRAGMA page_size=8192',
+]
+
+# ioctl request for cloning files on Linux; only available as
+# fcntl.FICLONE from Python 3.12 on
+FICLONE = getattr(fcntl, 'FICLONE', 0x40049409)
+
+# Number of statements sqlite3 keeps prepared per connection
+STATEMENT_CACHE_SIZE = 256
+
+# Statements that get executed for every item on save. They are kept
+# as constants so that sqlite3's statement cache is always hit.
+_SQL_INSERT_ITEM = (
+    'INSERT INTO items (id, type, x, y, z, scale, rotation, flip, data) '
+    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)')
+_SQL_UPDATE_ITEM = (
+    'UPDATE items SET x=?, y=?, z=?, scale=?, rotation=?, flip=?, data=? '
+    'WHERE id=?')
+_SQL_INSERT_SQLAR = (
+    'INSERT INTO sqlar (item_id, name, mode, sz, data) '
+    'VALUES (?, ?, ?, ?, ?)')
+_SQL_INSERT_SQLAR_ZEROBLOB = (
+    'INSERT INTO sqlar (item_id, name, mode, sz, data) '
+    'VALUES (?, ?, ?, ?, zeroblob(?))')
+_SQL_DELETE_ITEMS = 'DELETE FROM items WHERE id IN ({})'
+_SQL_DELETE_SQLAR = 'DELETE FROM sqlar WHERE item_id IN ({})'
+# Reads all items in a single scan of the items table; the join uses
+# the index of the unique item_id column. An index on items.type
+# wouldn't help, since almost all items are read anyway.
+_SQL_SELECT_ITEMS = (
+    'SELECT items.id, type, x, y, z, scale, rotation, flip, '
+    'items.data, sqlar.rowid '
+    'FROM items LEFT JOIN sqlar ON sqlar.item_id = items.id '
+    'WHERE sqlar.rowid IS NOT NULL OR items.type = "text"')
+
+
 def is_bee_file(path):
     """Check whether the file at the given path is a bee file."""
 
-    return os.path.splitext(path)[1] == '.bee'
+    return str(path)[-4:].lower() == '.bee'
+
+
+# The data column gets decoded for every item when loading; use the
+# decoder directly instead of going through json.loads each time
+_decode_json = json.JSONDecoder().decode
+
+
+def copy_file(src, dst):
+    """Copy a file. Where the file system supports it, the copy shares
+    its data with the original until one of them gets modified, which
+    doesn't need to read and write the whole file.
+    """
+
+    if fcntl and sys.platform == 'linux':
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            try:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+                return
+            except OSError:
+                logger.debug('File system can\'t clone files; copying')
+    shutil.copyfile(src, dst)
+
+
+def _decode_image(data):
+    return data, QtGui.QImage.fromData(data)
 
 
 def handle_sqlite_errors(func):
@@ -53,10 +132,10 @@ def handle_sqlite_errors(func):
         try:
             func(self, *args, **kwargs)
         except Exception as e:
-            logger.exception(f'Error while reading/writing {self.filename}')
+            logger.exception('Error while reading/writing %s', self.filename)
             try:
                 # Try to roll back transaction if there is any
-                if (hasattr(self, '_connection')
+                if (self._connection is not None
                         and self._connection.in_transaction):
                     self.ex('ROLLBACK')
                     logger.debug('Transaction rolled back')
@@ -73,6 +152,19 @@ def handle_sqlite_errors(func):
 
 class SQLiteIO:
 
+    # Number of new items whose rows get inserted with one statement
+    INSERT_BATCH_SIZE = 32
+
+    # Number of deleted items whose rows get deleted with one statement;
+    # stays below SQLite's limit of bound parameters in older versions
+    DELETE_BATCH_SIZE = 500
+
+    # Size of the chunks in which image data is written into blobs
+    BLOB_CHUNK_SIZE = 65536
+
+    # Fraction of unused pages above which the file gets compacted
+    VACUUM_THRESHOLD = 0.25
+
     def __init__(self, filename, scene, create_new=False, readonly=False,
                  worker=None):
         self.scene = scene
@@ -81,19 +173,22 @@ class SQLiteIO:
         self.readonly = readonly
         self.worker = worker
         self.retry = False
+        self._connection = None
+        self._cursor = None
+        # Temporary directory for migrating files that aren't writable
+        self._tmpdir = None
 
     def __del__(self):
         self._close_connection()
 
     def _close_connection(self):
-        if hasattr(self, '_connection'):
+        if self._connection is not None:
             self._connection.close()
-            delattr(self, '_connection')
-        if hasattr(self, '_cursor'):
-            delattr(self, '_cursor')
-        if hasattr(self, '_tmpdir'):
+            self._connection = None
+        self._cursor = None
+        if self._tmpdir is not None:
             self._tmpdir.cleanup()
-            delattr(self, '_tmpdir')
+            self._tmpdir = None
 
     def _establish_connection(self):
         if (self.create_new
@@ -107,22 +202,34 @@ class SQLiteIO:
         uri = pathlib.Path(self.filename).resolve().as_uri()
         if self.readonly:
             uri = f'{uri}?mode=rw'
-        self._connection = sqlite3.connect(uri, uri=True)
-        self._cursor = self.connection.cursor()
+        self._connection = sqlite3.connect(
+            uri, uri=True, cached_statements=STATEMENT_CACHE_SIZE)
+        self._cursor = self._connection.cursor()
+        self._configure_connection()
         if not self.create_new:
             try:
                 self._migrate()
             except Exception:
                 # Updating a file failed; try creating it from scratch instead
                 logger.exception('Error migrating bee file')
+                self._close_connection()
                 self.create_new = True
                 self._establish_connection()
 
+    def _configure_connection(self):
+        """Tune the connection for reading and writing large blobs."""
+
+        for pragma in CONNECTION_PRAGMAS:
+            self.ex(pragma)
+        if self.create_new and not self.readonly:
+            for pragma in NEW_FILE_PRAGMAS:
+                self.ex(pragma)
+
     def _migrate(self):
         """Migrate database if necessary."""
 
         version = self.fetchone('PRAGMA user_version')[0]
-        logger.debug(f'Found bee file version: {version}')
+        logger.debug('Found bee file version: %s', version)
         if version >= USER_VERSION:
             logger.debug('Version ok; no migrations necessary')
             return
@@ -137,13 +244,15 @@ class SQLiteIO:
                 self._tmpdir = tempfile.TemporaryDirectory(
                     prefix=constants.APPNAME)
                 tmpname = os.path.join(self._tmpdir.name, 'mig.bee')
-                shutil.copyfile(self.filename, tmpname)
-                self._connection = sqlite3.connect(tmpname)
-                self._cursor = self.connection.cursor()
+                copy_file(self.filename, tmpname)
+                self._connection = sqlite3.connect(
+                    tmpname, cached_statements=STATEMENT_CACHE_SIZE)
+                self._cursor = self._connection.cursor()
+                self._configure_connection()
 
         self.ex('BEGIN TRANSACTION')
         for i in range(version, USER_VERSION):
-            logger.debug(f'Migrating from version {i} to {i + 1}...')
+            logger.debug('Migrating from version %s to %s...', i, i + 1)
             for migration in MIGRATIONS[i + 1]:
                 self.ex(migration)
         self.write_meta()
@@ -152,13 +261,13 @@ class SQLiteIO:
 
     @property
     def connection(self):
-        if not hasattr(self, '_connection'):
+        if self._connection is None:
             self._establish_connection()
         return self._connection
 
     @property
     def cursor(self):
-        if not hasattr(self, '_cursor'):
+        if self._cursor is None:
             self._establish_connection()
         return self._cursor
 
@@ -177,6 +286,8 @@ class SQLiteIO:
         return self.cursor.fetchall()
 
     def write_meta(self):
+        # Not using executescript here: it commits any pending
+        # transaction first, which would split up migrations
         self.ex('PRAGMA application_id=%s' % APPLICATION_ID)
         self.ex('PRAGMA user_version=%s' % USER_VERSION)
         self.ex('PRAGMA foreign_keys=ON')
@@ -189,36 +300,60 @@ class SQLiteIO:
 
     @handle_sqlite_errors
     def read(self):
-        rows = self.fetchall(
-            'SELECT items.id, type, x, y, z, scale, rotation, flip, '
-            'items.data, sqlar.data '
-            'FROM sqlar JOIN items on sqlar.item_id = items.id')
-        # Avoid OUTER JOIN for performance reasons; fetch text items
-        # separately instead
-        rows.extend(self.fetchall(
-            'SELECT items.id, type, x, y, z, scale, rotation, flip, '
-            ' items.data, null as data '
-            'FROM items '
-            'WHERE items.type = "text"'))
+        # Image data is read later, one image at a time, so that we
+        # don't need to keep all of it in memory at once.
+        rows = self.fetchall(_SQL_SELECT_ITEMS)
+        progress = None
         if self.worker:
             self.worker.begin_processing.emit(len(rows))
+            progress = BatchedProgress(self.worker, len(rows))
+
+        max_workers = os.cpu_count() or 1
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            self._read_rows(rows, executor, 2 * max_workers, progress)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _decode_rows(self, rows, executor, lookahead):
+        """Yield each row along with its decoded image data.
+
+        Decoding is the expensive part, so the images of the next few
+        rows get decoded in parallel while the current one is handled.
+        Text rows come with ``(None, None)`` as image data.
+        """
+
+        def submit(row):
+            if row[1] == 'pixmap':
+                return executor.submit(_decode_image, self.read_blob(row[9]))
 
+        futures = deque(submit(row) for row in rows[:lookahead])
         for i, row in enumerate(rows):
+            future = futures.popleft()
+            if i + lookahead < len(rows):
+                futures.append(submit(rows[i + lookahead]))
+            yield row, future.result() if future else (None, None)
+
+    def _read_rows(self, rows, executor, lookahead, progress):
+        add_item_later = self.scene.add_item_later
+        decoded = self._decode_rows(rows, executor, lookahead)
+        for i, (row, (blob, img)) in enumerate(decoded):
+            save_id, typ, x, y, z, scale, rotation, flip, itemdata, _ = row
             data = {
-                'save_id': row[0],
-                'type': row[1],
-                'x': row[2],
-                'y': row[3],
-                'z': row[4],
-                'scale': row[5],
-                'rotation': row[6],
-                'flip': row[7],
-                'data': json.loads(row[8]),
+                'save_id': save_id,
+                'type': typ,
+                'x': x,
+                'y': y,
+                'z': z,
+                'scale': scale,
+                'rotation': rotation,
+                'flip': flip,
+                'data': _decode_json(itemdata),
             }
 
-            if data['type'] == 'pixmap':
+            if typ == 'pixmap':
                 item = BeePixmapItem(QtGui.QImage())
-                item.pixmap_from_bytes(row[9])
+                item.pixmap_from_bytes(blob, img)
                 if item.pixmap().isNull():
                     item = data['data']['text'] = (
                         f'Image could not be loaded: {item.filename}\n'
@@ -226,19 +361,30 @@ class SQLiteIO:
                     data['type'] = BeeErrorItem.TYPE
                 data['item'] = item
 
-            self.scene.add_item_later(data)
+            add_item_later(data)
 
             if self.worker:
-                logger.trace(f'Emit progress: {i}')
-                self.worker.progress.emit(i)
+                if progress.update(i, force=self.worker.canceled):
+                    logger.trace('Emitted progress: %s', i)
+                    self.worker.wait_for_main_thread()
                 if self.worker.canceled:
                     self.worker.finished.emit('', [])
                     return
-                # Give main thread time to process items:
-                self.worker.msleep(10)
         if self.worker:
             self.worker.finished.emit(self.filename, [])
 
+    def read_blob(self, rowid):
+        """Read the image data stored in the sqlar row with the given
+        rowid."""
+
+        if hasattr(self.connection, 'blobopen'):
+            # Python >= 3.11: Read the blob directly without a query
+            with self.connection.blobopen(
+                    'sqlar', 'data', rowid, readonly=True) as blob:
+                return blob.read()
+        return self.fetchone(
+            'SELECT data FROM sqlar WHERE rowid=?', (rowid,))[0]
+
     @handle_sqlite_errors
     def write(self):
         if self.readonly:
@@ -261,70 +407,143 @@ class SQLiteIO:
                 self.write()
 
     def write_data(self):
-        to_delete = {row[0] for row in self.fetchall('SELECT id from ITEMS')}
+        """Write all items in a single transaction.
+
+        Statements are executed per batch of items instead of per item.
+        New items get their save ids only once they have been committed.
+        """
+
+        existing = {row[0] for row in self.fetchall('SELECT id from ITEMS')}
+        # New items get ids after all existing ones
+        next_id = max(existing, default=0) + 1
         # We don't want to touch existing items that are displayed as errors:
         keep = {item.original_save_id
                 for item in self.scene.items_by_type(BeeErrorItem.TYPE)}
-        logger.debug(f'Not saving error items: {keep}')
-        to_delete = to_delete - keep
+        logger.debug('Not saving error items: %s', keep)
+        to_delete = existing - keep
 
         to_save = list(self.scene.items_for_save())
+        progress = None
         if self.worker:
             self.worker.begin_processing.emit(len(to_save))
-        for i, item in enumerate(to_save):
-            logger.debug(f'Saving {item} with id {item.save_id}')
-            if item.save_id:
-                self.update_item(item)
-                to_delete.remove(item.save_id)
-            else:
-                self.insert_item(item)
-            if self.worker:
-                self.worker.progress.emit(i)
+            progress = BatchedProgress(self.worker, len(to_save))
+
+        # Only write items that have changed since they have last been
+        # saved or loaded
+        existing_items = [item for item in to_save if item.save_id]
+        to_update = []
+        for item in existing_items:
+            to_delete.remove(item.save_id)
+            state = item.get_save_state()
+            if state != item.saved_state:
+                to_update.append((item, state))
+        logger.debug('Updating %s of %s existing items',
+                     len(to_update), len(existing_items))
+        self.update_items(to_update)
+        done = len(existing_items)
+        if progress and done:
+            progress.update(done - 1, force=self.worker.canceled)
+
+        to_insert = [item for item in to_save if not item.save_id]
+        inserted = []
+        for start in range(0, len(to_insert), self.INSERT_BATCH_SIZE):
+            batch = to_insert[start:start + self.INSERT_BATCH_SIZE]
+            ids = range(next_id + start, next_id + start + len(batch))
+            states = self.insert_items(batch, ids)
+            inserted.extend(zip(batch, ids, states))
+            done += len(batch)
+            if progress:
+                progress.update(done - 1, force=self.worker.canceled)
                 if self.worker.canceled:
                     break
+
         self.delete_items(to_delete)
-        self.ex('VACUUM')
         self.connection.commit()
+        for item, state in to_update:
+            item.saved_state = state
+        for item, save_id, state in inserted:
+            item.save_id = save_id
+            item.saved_state = state
+        self.vacuum_if_needed()
         if self.worker:
             self.worker.finished.emit(self.filename, [])
 
+    def vacuum_if_needed(self):
+        """Compact the file if a large part of it is unused.
+
+        VACUUM rewrites the whole file, so we only do it when enough
+        pages have been freed by deleted items to make it worthwhile.
+        """
+
+        page_count = self.fetchone('PRAGMA page_count')[0]
+        freelist_count = self.fetchone('PRAGMA freelist_count')[0]
+        logger.debug('Unused pages: %s of %s', freelist_count, page_count)
+        if page_count and freelist_count / page_count > self.VACUUM_THRESHOLD:
+            logger.debug('Compacting file')
+            self.ex('VACUUM')
+
     def delete_items(self, to_delete):
-        to_delete = [(pk,) for pk in to_delete]
-        self.exmany('DELETE FROM items WHERE id=?', to_delete)
-        self.exmany('DELETE FROM sqlar WHERE item_id=?', to_delete)
-        self.connection.commit()
+        """Delete items with the given ids, without committing.
 
-    def insert_item(self, item):
-        self.ex(
-            'INSERT INTO items (type, x, y, z, scale, rotation, flip, '
-            'data) '
-            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
-            (item.TYPE, item.pos().x(), item.pos().y(), item.zValue(),
-             item.scale(), item.rotation(), item.flip(),
-             json.dumps(item.get_extra_save_data())))
-        item.save_id = self.cursor.lastrowid
-
-        if hasattr(item, 'pixmap_to_bytes'):
-            pixmap, imgformat = item.pixmap_to_bytes()
-            name = item.get_filename_for_export(imgformat)
-            self.ex(
-                'INSERT INTO sqlar (item_id, name, mode, sz, data) '
-                'VALUES (?, ?, ?, ?, ?)',
-                (item.save_id, name, 0o644, len(pixmap), pixmap))
-        self.connection.commit()
+        Items get deleted with one statement per batch instead of one
+        per item. The image data is deleted explicitly, since foreign
+        keys aren't enforced on all connections.
+        """
 
-    def update_item(self, item):
-        """Update item data.
+        to_delete = list(to_delete)
+        for start in range(0, len(to_delete), self.DELETE_BATCH_SIZE):
+            batch = to_delete[start:start + self.DELETE_BATCH_SIZE]
+            placeholders = ', '.join('?' * len(batch))
+            self.ex(_SQL_DELETE_ITEMS.format(placeholders), batch)
+            self.ex(_SQL_DELETE_SQLAR.format(placeholders), batch)
+
+    def insert_items(self, items, ids):
+        """Insert new items with the given ids, without committing.
+
+        Returns the saved states of the items.
+        """
+
+        states = [item.get_save_state() for item in items]
+        self.exmany(
+            _SQL_INSERT_ITEM,
+            [(save_id, item.TYPE, *state[:6], json.dumps(state[6]))
+             for item, save_id, state in zip(items, ids, states)])
+
+        blobs = []
+        for item, save_id in zip(items, ids):
+            if hasattr(item, 'pixmap_to_bytes'):
+                pixmap, imgformat = item.pixmap_to_bytes()
+                name = item.get_filename_for_export(imgformat, save_id)
+                blobs.append((save_id, name, 0o644, len(pixmap), pixmap))
+
+        if hasattr(self.connection, 'blobopen'):
+            # Python >= 3.11: Write the data into an allocated blob
+            # instead of letting sqlite3 make a copy of it for binding
+            for save_id, name, mode, size, pixmap in blobs:
+                self.ex(_SQL_INSERT_SQLAR_ZEROBLOB,
+                        (save_id, name, mode, size, size))
+                self.write_blob(self.cursor.lastrowid, pixmap)
+        else:
+            self.exmany(_SQL_INSERT_SQLAR, blobs)
+        return states
+
+    def write_blob(self, rowid, data):
+        """Write data into the already allocated blob of the sqlar row
+        with the given rowid."""
+
+        data = memoryview(data)
+        with self.connection.blobopen('sqlar', 'data', rowid) as blob:
+            for start in range(0, len(data), self.BLOB_CHUNK_SIZE):
+                blob.write(data[start:start + self.BLOB_CHUNK_SIZE])
+
+    def update_items(self, items):
+        """Update item data from ``(item, state)`` pairs, without
+        committing.
 
         We only update the item data, not the pixmap data, as pixmap
         data never changes and is also time-consuming to save.
         """
-        self.ex(
-            'UPDATE items SET x=?, y=?, z=?, scale=?, rotation=?, flip=?, '
-            'data=? '
-            'WHERE id=?',
-            (item.pos().x(), item.pos().y(), item.zValue(), item.scale(),
-             item.rotation(), item.flip(),
-             json.dumps(item.get_extra_save_data()),
-             item.save_id))
-        self.connection.commit()
+        self.exmany(
+            _SQL_UPDATE_ITEM,
+            [(*state[:6], json.dumps(state[6]), item.save_id)
+             for item, state in items])
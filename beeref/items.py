@@ -17,9 +17,10 @@
 text).
 """
 
-from collections import defaultdict
+from collections import Counter
 from functools import cached_property
 import logging
+from operator import attrgetter
 import os.path
 
 from PyQt6 import QtCore, QtGui, QtWidgets
@@ -29,15 +30,42 @@ from beeref import commands
 from beeref.config import BeeSettings
 from beeref.constants import COLORS
 from beeref.selection import SelectableMixin
+from beeref.utils import BytesLRUCache
 
 
 logger = logging.getLogger(__name__)
 
 item_registry = {}
+# The create_from_data methods of the registered item classes, so
+# that creating an item while loading doesn't need to look them up
+item_factories = {}
+
+# Encoded image data of pixmap items, so that saving and exporting
+# the same unchanged images again doesn't need to encode them again.
+# Cleared along with the scene.
+pixmap_bytes_cache = BytesLRUCache(max_size=32 * 1024 * 1024)
+
+
+# File signatures of the image formats that we store images in
+IMGFORMAT_SIGNATURES = {
+    b'\x89PNG\r\n\x1a\n': 'png',
+    b'\xff\xd8\xff': 'jpg',
+}
+
+
+def get_imgformat_from_bytes(data):
+    """Returns the image format of the encoded image data if it's one of
+    the formats we store images in, otherwise None.
+    """
+
+    for signature, imgformat in IMGFORMAT_SIGNATURES.items():
+        if data[:len(signature)] == signature:
+            return imgformat
 
 
 def register_item(cls):
     item_registry[cls.TYPE] = cls
+    item_factories[cls.TYPE] = cls.create_from_data
     return cls
 
 
@@ -48,6 +76,8 @@ def sort_by_filename(items):
     without a filename but with a save_id follow (ordered by
     save_id), then remaining items in the order that they have
     been inserted into the scene.
+
+    Expects user items, i.e. items that have a ``save_id``.
     """
 
     items_by_filename = []
@@ -55,15 +85,15 @@ def sort_by_filename(items):
     items_remaining = []
 
     for item in items:
-        if getattr(item, 'filename', None):
+        if item.TYPE == BeePixmapItem.TYPE and item.filename:
             items_by_filename.append(item)
-        elif getattr(item, 'save_id', None):
+        elif item.save_id:
             items_by_save_id.append(item)
         else:
             items_remaining.append(item)
 
-    items_by_filename.sort(key=lambda x: x.filename)
-    items_by_save_id.sort(key=lambda x: x.save_id)
+    items_by_filename.sort(key=attrgetter('filename'))
+    items_by_save_id.sort(key=attrgetter('save_id'))
     return items_by_filename + items_by_save_id + items_remaining
 
 
@@ -94,7 +124,24 @@ class BeeItemMixin(SelectableMixin):
                 and not self.scene().active_mode is None):
             self.bring_to_front()
 
+    def get_save_state(self):
+        """The data that gets written to bee files for this item.
+
+        Used to find out whether an item has changed since it has last
+        been saved or loaded.
+        """
+
+        pos = self.pos()
+        return (pos.x(), pos.y(), self.zValue(), self.scale(),
+                self.rotation(), self.flip(), self.get_extra_save_data())
+
     def update_from_data(self, **kwargs):
+        if 'save_id' in kwargs:
+            # Remember what has been loaded from the bee file
+            self.saved_state = (
+                kwargs.get('x'), kwargs.get('y'), kwargs.get('z'),
+                kwargs.get('scale'), kwargs.get('rotation'),
+                kwargs.get('flip'), kwargs.get('data'))
         self.save_id = kwargs.get('save_id', self.save_id)
         self.setPos(kwargs.get('x', self.pos().x()),
                     kwargs.get('y', self.pos().y()))
@@ -105,6 +152,44 @@ class BeeItemMixin(SelectableMixin):
             self.do_flip()
 
 
+# How far the crop handles and edges can be moved, as
+# (left, top, right, bottom) for the current crop rect and pixmap size
+CROP_MOVE_BOUNDS = {
+    'crop_handle_topleft':
+        lambda crop, w, h: (0, 0, crop.right(), crop.bottom()),
+    'crop_handle_bottomleft':
+        lambda crop, w, h: (0, crop.top(), crop.right(), h),
+    'crop_handle_bottomright':
+        lambda crop, w, h: (crop.left(), crop.top(), w, h),
+    'crop_handle_topright':
+        lambda crop, w, h: (crop.left(), 0, w, crop.bottom()),
+    'crop_edge_top': lambda crop, w, h: (0, 0, w, crop.bottom()),
+    'crop_edge_bottom': lambda crop, w, h: (0, crop.top(), w, h),
+    'crop_edge_left': lambda crop, w, h: (0, 0, crop.right(), h),
+    'crop_edge_right': lambda crop, w, h: (crop.left(), 0, w, h),
+}
+
+# The point of the crop rect that moves along with each crop handle
+# and edge, and how to move it
+CROP_MOVE_POINTS = {
+    'crop_handle_topleft': (QtCore.QRectF.topLeft, QtCore.QRectF.setTopLeft),
+    'crop_handle_bottomleft': (
+        QtCore.QRectF.bottomLeft, QtCore.QRectF.setBottomLeft),
+    'crop_handle_bottomright': (
+        QtCore.QRectF.bottomRight, QtCore.QRectF.setBottomRight),
+    'crop_handle_topright': (
+        QtCore.QRectF.topRight, QtCore.QRectF.setTopRight),
+    'crop_edge_top': (
+        QtCore.QRectF.topLeft, lambda crop, p: crop.setTop(p.y())),
+    'crop_edge_left': (
+        QtCore.QRectF.topLeft, lambda crop, p: crop.setLeft(p.x())),
+    'crop_edge_bottom': (
+        QtCore.QRectF.bottomLeft, lambda crop, p: crop.setBottom(p.y())),
+    'crop_edge_right': (
+        QtCore.QRectF.topRight, lambda crop, p: crop.setRight(p.x())),
+}
+
+
 @register_item
 class BeePixmapItem(BeeItemMixin, QtWidgets.QGraphicsPixmapItem):
     """Class for images added by the user."""
@@ -114,10 +199,14 @@ class BeePixmapItem(BeeItemMixin, QtWidgets.QGraphicsPixmapItem):
 
     def __init__(self, image, filename=None, **kwargs):
         super().__init__(QtGui.QPixmap.fromImage(image))
+        # The JPEG data the pixmap has been loaded from, if any
+        self._raw_data = None
         self.save_id = None
+        # The data as last saved to or loaded from a bee file
+        self.saved_state = None
         self.filename = filename
         self.reset_crop()
-        logger.debug(f'Initialized {self}')
+        logger.debug('Initialized %s', self)
         self.is_image = True
         self.crop_mode = False
         self.init_selectable()
@@ -145,7 +234,7 @@ class BeePixmapItem(BeeItemMixin, QtWidgets.QGraphicsPixmapItem):
 
     @crop.setter
     def crop(self, value):
-        logger.debug(f'Setting crop for {self} to {value}')
+        logger.debug('Setting crop for %s to %s', self, value)
         self.prepareGeometryChange()
         self._crop = value
         self.update()
@@ -156,58 +245,96 @@ class BeePixmapItem(BeeItemMixin, QtWidgets.QGraphicsPixmapItem):
 
     @grayscale.setter
     def grayscale(self, value):
-        logger.debug('Setting grayscale for {self} to {value}')
+        logger.debug('Setting grayscale for %s to %s', self, value)
         self._grayscale = value
-        if value is True:
-            # Using the grayscale image format to convert to grayscale
-            # loses an image's tranparency. So the straightworward
-            # following method gives us an ugly black replacement:
-            # img = img.convertToFormat(QtGui.QImage.Format.Format_Grayscale8)
-
-            # Instead, we will fill the background with the current
-            # canvas colour, so the issue is only visible if the image
-            # overlaps other images. The way we do it here only works
-            # as long as the canvas colour is itself grayscale,
-            # though.
-            img = QtGui.QImage(
-                self.pixmap().size(), QtGui.QImage.Format.Format_Grayscale8)
-            img.fill(QtGui.QColor(*COLORS['Scene:Canvas']))
-            painter = QtGui.QPainter(img)
-            painter.drawPixmap(0, 0, self.pixmap())
-            painter.end()
-            self._grayscale_pixmap = QtGui.QPixmap.fromImage(img)
-
-            # Alternative methods that have their own issues:
-            #
-            # 1. Use setAlphaChannel of the resulting grayscale
-            # image. How do we get the original alpha channel? Using
-            # the whole original image also takes color values into
-            # account, not just their alpha values.
-            #
-            # 2. QtWidgets.QGraphicsColorizeEffect() with black colour
-            # on the GraphicsItem. This applys to everything the paint
-            # method does, so the selection outline/handles will also
-            # be gray. setGraphicsEffect is only available on some
-            # widgets, so we can't apply it selectively.
-            #
-            # 3. Going through every pixel and doing it manually — bad
-            # performance.
-        else:
-            self._grayscale_pixmap = None
-
+        self.__dict__.pop('_grayscale_pixmap', None)
+        self.__dict__.pop('_sample_image', None)
         self.update()
 
-    def sample_color_at(self, pos):
-        ipos = self.mapFromScene(pos)
+    @cached_property
+    def _grayscale_pixmap(self):
+        """The grayscale version of the pixmap.
+
+        Only built when it's first needed for painting or exporting, so
+        that loading many grayscale images doesn't convert all of them
+        up front.
+        """
+
+        # Using the grayscale image format to convert to grayscale
+        # loses an image's tranparency. So the straightworward
+        # following method gives us an ugly black replacement:
+        # img = img.convertToFormat(QtGui.QImage.Format.Format_Grayscale8)
+
+        # Instead, we will fill the background with the current
+        # canvas colour, so the issue is only visible if the image
+        # overlaps other images. The way we do it here only works
+        # as long as the canvas colour is itself grayscale,
+        # though.
+        img = QtGui.QImage(
+            self.pixmap().size(), QtGui.QImage.Format.Format_Grayscale8)
+        img.fill(QtGui.QColor(*COLORS['Scene:Canvas']))
+        painter = QtGui.QPainter(img)
+        painter.drawPixmap(0, 0, self.pixmap())
+        painter.end()
+
+        # Alternative methods that have their own issues:
+        #
+        # 1. Use setAlphaChannel of the resulting grayscale
+        # image. How do we get the original alpha channel? Using
+        # the whole original image also takes color values into
+        # account, not just their alpha values.
+        #
+        # 2. QtWidgets.QGraphicsColorizeEffect() with black colour
+        # on the GraphicsItem. This applys to everything the paint
+        # method does, so the selection outline/handles will also
+        # be gray. setGraphicsEffect is only available on some
+        # widgets, so we can't apply it selectively.
+        #
+        # 3. Going through every pixel and doing it manually — bad
+        # performance.
+
+        return QtGui.QPixmap.fromImage(img)
+
+    @cached_property
+    def _pixmap_size(self):
+        """Width and height of the pixmap.
+
+        Kept around for restricting the crop rectangle on every mouse
+        move in crop mode.
+        """
+
+        size = self.pixmap().size()
+        return (size.width(), size.height())
+
+    @cached_property
+    def _sample_image(self):
+        """The displayed image for sampling colors from.
+
+        Kept around so that sampling colors while moving the mouse
+        doesn't need to convert the whole pixmap for every sample, until
+        :meth:`clear_sample_image` gets called.
+        """
+
         if self.grayscale:
             pm = self._grayscale_pixmap
         else:
             pm = self.pixmap()
-        img = pm.toImage()
+        return pm.toImage().convertToFormat(
+            QtGui.QImage.Format.Format_ARGB32)
+
+    def clear_sample_image(self):
+        self.__dict__.pop('_sample_image', None)
 
-        color = img.pixelColor(int(ipos.x()), int(ipos.y()))
-        if color.alpha():
-            return color
+    def sample_color_at(self, pos):
+        ipos = self.mapFromScene(pos)
+        x, y = int(ipos.x()), int(ipos.y())
+        img = self._sample_image
+        if not img.valid(x, y):
+            return
+
+        argb = img.pixel(x, y)
+        if argb >> 24:
+            return QtGui.QColor.fromRgba(argb)
 
     def bounding_rect_unselected(self):
         if self.crop_mode:
@@ -216,13 +343,11 @@ class BeePixmapItem(BeeItemMixin, QtWidgets.QGraphicsPixmapItem):
             return self.crop
 
     def get_extra_save_data(self):
+        crop = self.crop
         return {'filename': self.filename,
                 'opacity': self.opacity(),
                 'grayscale': self.grayscale,
-                'crop': [self.crop.topLeft().x(),
-                         self.crop.topLeft().y(),
-                         self.crop.width(),
-                         self.crop.height()]}
+                'crop': [crop.x(), crop.y(), crop.width(), crop.height()]}
 
     def get_filename_for_export(self, imgformat, save_id_default=None):
         save_id = self.save_id or save_id_default
@@ -247,40 +372,111 @@ class BeePixmapItem(BeeItemMixin, QtWidgets.QGraphicsPixmapItem):
             else:
                 formt = 'jpg'
 
-        logger.debug(f'Found format {formt} for {self}')
+        logger.debug('Found format %s for %s', formt, self)
         return formt
 
     def pixmap_to_bytes(self, apply_grayscale=False, apply_crop=False):
-        """Convert the pixmap data to PNG bytestring."""
-        barray = QtCore.QByteArray()
-        buffer = QtCore.QBuffer(barray)
-        buffer.open(QtCore.QIODevice.OpenModeFlag.WriteOnly)
+        """Convert the pixmap data to PNG bytestring.
+
+        Results are cached as long as the pixmap, crop and storage
+        format stay the same. Pixmaps that have been loaded from
+        encoded data aren't encoded again as long as that data still
+        matches.
+        """
+
+        return self.prepare_pixmap_bytes(apply_grayscale, apply_crop)()
+
+    def prepare_pixmap_bytes(self, apply_grayscale=False, apply_crop=False):
+        """Does everything for :meth:`pixmap_to_bytes` that needs the
+        pixmap or the settings.
+
+        Returns a function without arguments that returns the result
+        of :meth:`pixmap_to_bytes`. It only uses images, so it can be
+        called from other threads to do the encoding there.
+        """
+
+        if self._raw_data and self._raw_data_matches(
+                apply_grayscale, apply_crop):
+            raw_data = self._raw_data
+            return lambda: raw_data
+
         if apply_grayscale and self.grayscale:
             pm = self._grayscale_pixmap
         else:
             pm = self.pixmap()
 
-        if apply_crop:
-            pm = pm.copy(self.crop.toRect())
+        crop = self.crop.toRect() if apply_crop else None
+        cache_key = (
+            pm.cacheKey(),
+            crop.getRect() if crop else None,
+            self.settings.valueOrDefault('Items/image_storage_format'))
+        use_cache = not pm.isNull()
+        if use_cache:
+            cached = pixmap_bytes_cache.get(cache_key)
+            if cached:
+                return lambda: cached
 
         img = pm.toImage()
+        if crop and crop != img.rect():
+            img = img.copy(crop)
         imgformat = self.get_imgformat(img)
-        img.save(buffer, imgformat.upper(), quality=90)
-        return (barray.data(), imgformat)
+
+        def encode():
+            barray = QtCore.QByteArray()
+            buffer = QtCore.QBuffer(barray)
+            buffer.open(QtCore.QIODevice.OpenModeFlag.WriteOnly)
+            img.save(buffer, imgformat.upper(), quality=90)
+            result = (barray.data(), imgformat)
+            if use_cache:
+                pixmap_bytes_cache.set(cache_key, result, len(result[0]))
+            return result
+
+        return encode
+
+    def _raw_data_matches(self, apply_grayscale, apply_crop):
+        """Whether the data the pixmap has been loaded from can be used
+        as is for the requested conversion.
+        """
+
+        if apply_grayscale and self.grayscale:
+            return False
+        pm = self.pixmap()
+        if apply_crop and self.crop != QtCore.QRectF(pm.rect()):
+            return False
+        return self._raw_data[1] == self.get_imgformat(pm)
 
     def setPixmap(self, pixmap):
+        self._raw_data = None
+        self.__dict__.pop('_grayscale_pixmap', None)
+        self.__dict__.pop('_pixmap_size', None)
+        self.__dict__.pop('_sample_image', None)
         super().setPixmap(pixmap)
         self.reset_crop()
 
-    def pixmap_from_bytes(self, data):
-        """Set image pimap from a bytestring."""
-        pixmap = QtGui.QPixmap()
-        pixmap.loadFromData(data)
+    def pixmap_from_bytes(self, data, img=None):
+        """Set image pimap from a bytestring.
+
+        :param img: The image decoded from ``data``, if that has
+            already been done
+        """
+        if img is None:
+            pixmap = QtGui.QPixmap()
+            pixmap.loadFromData(data)
+        else:
+            pixmap = QtGui.QPixmap.fromImage(img)
         self.setPixmap(pixmap)
+        # Only JPEG data is kept: it is much smaller than the pixmap,
+        # and encoding it again loses quality. PNGs are stored with
+        # next to no compression, so keeping their data would about
+        # double the memory each image takes up.
+        if (get_imgformat_from_bytes(data) == 'jpg'
+                and not pixmap.isNull()):
+            self._raw_data = (bytes(data), 'jpg')
 
     def create_copy(self):
         item = BeePixmapItem(QtGui.QImage(), self.filename)
         item.setPixmap(self.pixmap())
+        item._raw_data = self._raw_data
         item.setPos(self.pos())
         item.setZValue(self.zValue())
         item.setScale(self.scale())
@@ -295,34 +491,42 @@ class BeePixmapItem(BeeItemMixin, QtWidgets.QGraphicsPixmapItem):
     @cached_property
     def color_gamut(self):
         logger.debug(f'Calculating color gamut for {self}')
-        gamut = defaultdict(int)
-        img = self.pixmap().toImage()
+        gamut = Counter()
+        img = self.pixmap().toImage().convertToFormat(
+            QtGui.QImage.Format.Format_ARGB32)
+        if img.isNull():
+            return gamut
+        width = img.width()
         # Don't evaluate every pixel for larger images:
-        step = max(1, int(max(img.width(), img.height()) / 1000))
+        step = max(1, int(max(width, img.height()) / 1000))
         logger.debug(f'Considering every {step}. row/column')
 
-        # Not actually faster than solution below :(
-        # ptr = img.bits()
-        # size = img.sizeInBytes()
-        # pixelsize = int(img.sizeInBytes() / img.width() / img.height())
-        # ptr.setsize(size)
-        # for pixel in batched(ptr, n=pixelsize):
-        #     r, g, b, alpha = tuple(map(ord, pixel))
-        #     if 5 < alpha and 5 < r < 250 and 5 < g < 250 and 5 < b < 250:
-        #         # Only consider pixels that aren't close to
-        #         # transparent, white or black
-        #         rgb = QtGui.QColor(r, g, b)
-        #         gamut[rgb.hue(), rgb.saturation()] += 1
-
-        for i in range(0, img.width(), step):
-            for j in range(0, img.height(), step):
-                rgb = img.pixelColor(i, j)
-                rgbtuple = (rgb.red(), rgb.blue(), rgb.green())
-                if (5 < rgb.alpha()
-                        and min(rgbtuple) < 250 and max(rgbtuple) > 5):
-                    # Only consider pixels that aren't close to
-                    # transparent, white or black
-                    gamut[rgb.hue(), rgb.saturation()] += 1
+        # Count the sampled pixels by their 0xAARRGGBB value first, so
+        # that the hue and saturation only need to be computed once
+        # per distinct color instead of once per pixel
+        ptr = img.constBits()
+        ptr.setsize(img.sizeInBytes())
+        pixels = memoryview(ptr).cast('I')
+        pixels_per_line = img.bytesPerLine() // 4
+        counts = Counter()
+        for j in range(0, img.height(), step):
+            start = j * pixels_per_line
+            counts.update(pixels[start:start + width:step])
+
+        # Alpha doesn't change hue and saturation, so merge colors
+        # that only differ in alpha, keyed by their packed 0xRRGGBB value
+        rgb_counts = Counter()
+        for argb, count in counts.items():
+            rgbtuple = ((argb >> 16) & 0xff, (argb >> 8) & 0xff, argb & 0xff)
+            if (5 < argb >> 24
+                    and min(rgbtuple) < 250 and max(rgbtuple) > 5):
+                # Only consider pixels that aren't close to
+                # transparent, white or black
+                rgb_counts[argb & 0xffffff] += count
+
+        for rgb, count in rgb_counts.items():
+            color = QtGui.QColor.fromRgba(0xff000000 | rgb)
+            gamut[color.hue(), color.saturation()] += count
 
         logger.debug(f'Got {len(gamut)} color gamut values')
         return gamut
@@ -338,37 +542,45 @@ class BeePixmapItem(BeeItemMixin, QtWidgets.QGraphicsPixmapItem):
     def crop_handle_size(self):
         return self.fixed_length_for_viewport(self.CROP_HANDLE_SIZE)
 
-    def crop_handle_topleft(self):
+    def crop_handle_topleft(self, size=None):
+        if size is None:
+            size = self.crop_handle_size
         topleft = self.crop_temp.topLeft()
         return QtCore.QRectF(
             topleft.x(),
             topleft.y(),
-            self.crop_handle_size,
-            self.crop_handle_size)
+            size,
+            size)
 
-    def crop_handle_bottomleft(self):
+    def crop_handle_bottomleft(self, size=None):
+        if size is None:
+            size = self.crop_handle_size
         bottomleft = self.crop_temp.bottomLeft()
         return QtCore.QRectF(
             bottomleft.x(),
-            bottomleft.y() - self.crop_handle_size,
-            self.crop_handle_size,
-            self.crop_handle_size)
+            bottomleft.y() - size,
+            size,
+            size)
 
-    def crop_handle_bottomright(self):
+    def crop_handle_bottomright(self, size=None):
+        if size is None:
+            size = self.crop_handle_size
         bottomright = self.crop_temp.bottomRight()
         return QtCore.QRectF(
-            bottomright.x() - self.crop_handle_size,
-            bottomright.y() - self.crop_handle_size,
-            self.crop_handle_size,
-            self.crop_handle_size)
-
-    def crop_handle_topright(self):
+            bottomright.x() - size,
+            bottomright.y() - size,
+            size,
+            size)
+
+    def crop_handle_topright(self, size=None):
+        if size is None:
+            size = self.crop_handle_size
         topright = self.crop_temp.topRight()
         return QtCore.QRectF(
-            topright.x() - self.crop_handle_size,
+            topright.x() - size,
             topright.y(),
-            self.crop_handle_size,
-            self.crop_handle_size)
+            size,
+            size)
 
     def crop_handles(self):
         return (self.crop_handle_topleft,
@@ -376,37 +588,45 @@ class BeePixmapItem(BeeItemMixin, QtWidgets.QGraphicsPixmapItem):
                 self.crop_handle_bottomright,
                 self.crop_handle_topright)
 
-    def crop_edge_top(self):
+    def crop_edge_top(self, size=None):
+        if size is None:
+            size = self.crop_handle_size
         topleft = self.crop_temp.topLeft()
         return QtCore.QRectF(
-            topleft.x() + self.crop_handle_size,
+            topleft.x() + size,
             topleft.y(),
-            self.crop_temp.width() - 2 * self.crop_handle_size,
-            self.crop_handle_size)
+            self.crop_temp.width() - 2 * size,
+            size)
 
-    def crop_edge_left(self):
+    def crop_edge_left(self, size=None):
+        if size is None:
+            size = self.crop_handle_size
         topleft = self.crop_temp.topLeft()
         return QtCore.QRectF(
             topleft.x(),
-            topleft.y() + self.crop_handle_size,
-            self.crop_handle_size,
-            self.crop_temp.height() - 2 * self.crop_handle_size)
+            topleft.y() + size,
+            size,
+            self.crop_temp.height() - 2 * size)
 
-    def crop_edge_bottom(self):
+    def crop_edge_bottom(self, size=None):
+        if size is None:
+            size = self.crop_handle_size
         bottomleft = self.crop_temp.bottomLeft()
         return QtCore.QRectF(
-            bottomleft.x() + self.crop_handle_size,
-            bottomleft.y() - self.crop_handle_size,
-            self.crop_temp.width() - 2 * self.crop_handle_size,
-            self.crop_handle_size)
-
-    def crop_edge_right(self):
+            bottomleft.x() + size,
+            bottomleft.y() - size,
+            self.crop_temp.width() - 2 * size,
+            size)
+
+    def crop_edge_right(self, size=None):
+        if size is None:
+            size = self.crop_handle_size
         topright = self.crop_temp.topRight()
         return QtCore.QRectF(
-            topright.x() - self.crop_handle_size,
-            topright.y() + self.crop_handle_size,
-            self.crop_handle_size,
-            self.crop_temp.height() - 2 * self.crop_handle_size)
+            topright.x() - size,
+            topright.y() + size,
+            size,
+            self.crop_temp.height() - 2 * size)
 
     def crop_edges(self):
         return (self.crop_edge_top,
@@ -447,7 +667,10 @@ class BeePixmapItem(BeeItemMixin, QtWidgets.QGraphicsPixmapItem):
         painter.drawRect(rect)
 
     def paint(self, painter, option, widget):
-        if abs(painter.combinedTransform().m11()) < 2:
+        # The view draws items with their device transform as the
+        # painter's world transform, so we don't need to combine it
+        # with the (identity) view transform here.
+        if abs(painter.worldTransform().m11()) < 2:
             # We want image smoothing, but only for images where we
             # are not zoomed in a lot. This is to ensure that for
             # example icons and pixel sprites can be viewed correctly.
@@ -467,8 +690,9 @@ class BeePixmapItem(BeeItemMixin, QtWidgets.QGraphicsPixmapItem):
             painter.drawPath(path)
             painter.setBrush(QtGui.QBrush())
 
+            size = self.crop_handle_size
             for handle in self.crop_handles():
-                self.draw_crop_rect(painter, handle())
+                self.draw_crop_rect(painter, handle(size))
             self.draw_crop_rect(painter, self.crop_temp)
         else:
             pm = self._grayscale_pixmap if self.grayscale else self.pixmap()
@@ -512,12 +736,13 @@ class BeePixmapItem(BeeItemMixin, QtWidgets.QGraphicsPixmapItem):
         if not self.crop_mode:
             return super().hoverMoveEvent(event)
 
+        size = self.crop_handle_size
         for handle in self.crop_handles():
-            if handle().contains(event.pos()):
+            if handle(size).contains(event.pos()):
                 self.set_cursor(self.get_crop_handle_cursor(handle))
                 return
         for edge in self.crop_edges():
-            if edge().contains(event.pos()):
+            if edge(size).contains(event.pos()):
                 self.set_cursor(self.get_crop_edge_cursor(edge))
                 return
         self.unset_cursor()
@@ -527,15 +752,16 @@ class BeePixmapItem(BeeItemMixin, QtWidgets.QGraphicsPixmapItem):
             return super().mousePressEvent(event)
 
         event.accept()
+        size = self.crop_handle_size
         for handle in self.crop_handles():
             # Click into a handle?
-            if handle().contains(event.pos()):
+            if handle(size).contains(event.pos()):
                 self.crop_mode_event_start = event.pos()
                 self.crop_mode_move = handle
                 return
         for edge in self.crop_edges():
             # Click into an edge handle?
-            if edge().contains(event.pos()):
+            if edge(size).contains(event.pos()):
                 self.crop_mode_event_start = event.pos()
                 self.crop_mode_move = edge
                 return
@@ -546,78 +772,21 @@ class BeePixmapItem(BeeItemMixin, QtWidgets.QGraphicsPixmapItem):
     def ensure_point_within_crop_bounds(self, point, handle):
         """Returns the point, or the nearest point within the pixmap."""
 
-        if handle == self.crop_handle_topleft:
-            topleft = QtCore.QPointF(0, 0)
-            bottomright = self.crop_temp.bottomRight()
-        if handle == self.crop_handle_bottomleft:
-            topleft = QtCore.QPointF(0, self.crop_temp.top())
-            bottomright = QtCore.QPointF(
-                self.crop_temp.right(), self.pixmap().size().height())
-        if handle == self.crop_handle_bottomright:
-            topleft = self.crop_temp.topLeft()
-            bottomright = QtCore.QPointF(
-                self.pixmap().size().width(), self.pixmap().size().height())
-        if handle == self.crop_handle_topright:
-            topleft = QtCore.QPointF(self.crop_temp.left(), 0)
-            bottomright = QtCore.QPointF(
-                self.pixmap().size().width(), self.crop_temp.bottom())
-        if handle == self.crop_edge_top:
-            topleft = QtCore.QPointF(0, 0)
-            bottomright = QtCore.QPointF(
-                self.pixmap().size().width(), self.crop_temp.bottom())
-        if handle == self.crop_edge_bottom:
-            topleft = QtCore.QPointF(0, self.crop_temp.top())
-            bottomright = QtCore.QPointF(
-                self.pixmap().size().width(), self.pixmap().size().height())
-        if handle == self.crop_edge_left:
-            topleft = QtCore.QPointF(0, 0)
-            bottomright = QtCore.QPointF(
-                self.crop_temp.right(), self.pixmap().size().height())
-        if handle == self.crop_edge_right:
-            topleft = QtCore.QPointF(self.crop_temp.left(), 0)
-            bottomright = QtCore.QPointF(
-                self.pixmap().size().width(), self.pixmap().size().height())
-
-        point.setX(min(bottomright.x(), max(topleft.x(), point.x())))
-        point.setY(min(bottomright.y(), max(topleft.y(), point.y())))
+        left, top, right, bottom = CROP_MOVE_BOUNDS[handle.__name__](
+            self.crop_temp, *self._pixmap_size)
+        point.setX(min(right, max(left, point.x())))
+        point.setY(min(bottom, max(top, point.y())))
 
         return point
 
     def mouseMoveEvent(self, event):
         if self.crop_mode and self.crop_mode_event_start:
             diff = event.pos() - self.crop_mode_event_start
-            if self.crop_mode_move == self.crop_handle_topleft:
-                new = self.ensure_point_within_crop_bounds(
-                    self.crop_temp.topLeft() + diff, self.crop_mode_move)
-                self.crop_temp.setTopLeft(new)
-            if self.crop_mode_move == self.crop_handle_bottomleft:
-                new = self.ensure_point_within_crop_bounds(
-                    self.crop_temp.bottomLeft() + diff, self.crop_mode_move)
-                self.crop_temp.setBottomLeft(new)
-            if self.crop_mode_move == self.crop_handle_bottomright:
-                new = self.ensure_point_within_crop_bounds(
-                    self.crop_temp.bottomRight() + diff, self.crop_mode_move)
-                self.crop_temp.setBottomRight(new)
-            if self.crop_mode_move == self.crop_handle_topright:
-                new = self.ensure_point_within_crop_bounds(
-                    self.crop_temp.topRight() + diff, self.crop_mode_move)
-                self.crop_temp.setTopRight(new)
-            if self.crop_mode_move == self.crop_edge_top:
-                new = self.ensure_point_within_crop_bounds(
-                    self.crop_temp.topLeft() + diff, self.crop_mode_move)
-                self.crop_temp.setTop(new.y())
-            if self.crop_mode_move == self.crop_edge_left:
-                new = self.ensure_point_within_crop_bounds(
-                    self.crop_temp.topLeft() + diff, self.crop_mode_move)
-                self.crop_temp.setLeft(new.x())
-            if self.crop_mode_move == self.crop_edge_bottom:
-                new = self.ensure_point_within_crop_bounds(
-                    self.crop_temp.bottomLeft() + diff, self.crop_mode_move)
-                self.crop_temp.setBottom(new.y())
-            if self.crop_mode_move == self.crop_edge_right:
-                new = self.ensure_point_within_crop_bounds(
-                    self.crop_temp.topRight() + diff, self.crop_mode_move)
-                self.crop_temp.setRight(new.x())
+            get_point, set_point = CROP_MOVE_POINTS[
+                self.crop_mode_move.__name__]
+            new = self.ensure_point_within_crop_bounds(
+                get_point(self.crop_temp) + diff, self.crop_mode_move)
+            set_point(self.crop_temp, new)
             self.update()
             self.crop_mode_event_start = event.pos()
             event.accept()
@@ -642,7 +811,9 @@ class BeeTextItem(BeeItemMixin, QtWidgets.QGraphicsTextItem):
     def __init__(self, text=None, **kwargs):
         super().__init__(text or "Text")
         self.save_id = None
-        logger.debug(f'Initialized {self}')
+        # The data as last saved to or loaded from a bee file
+        self.saved_state = None
+        logger.debug('Initialized %s', self)
         self.is_image = False
         self.init_selectable()
         self.is_editable = True
@@ -747,7 +918,7 @@ class BeeErrorItem(BeeItemMixin, QtWidgets.QGraphicsTextItem):
     def __init__(self, text=None, **kwargs):
         super().__init__(text or "Text")
         self.original_save_id = None
-        logger.debug(f'Initialized {self}')
+        logger.debug('Initialized %s', self)
         self.is_image = False
         self.init_selectable()
         self.is_editable = False
@@ -16,6 +16,7 @@
 from functools import partial
 import logging
 import math
+from operator import methodcaller
 from queue import Queue
 
 from PyQt6 import QtCore, QtWidgets, QtGui
@@ -25,7 +26,13 @@ import rpack
 
 from beeref import commands
 from beeref.config import BeeSettings
-from beeref.items import item_registry, BeeErrorItem, sort_by_filename
+from beeref.items import (
+    item_factories,
+    pixmap_bytes_cache,
+    BeeErrorItem,
+    BeePixmapItem,
+    sort_by_filename,
+)
 from beeref.selection import MultiSelectItem, RubberbandItem
 
 
@@ -59,6 +66,7 @@ class BeeGraphicsScene(QtWidgets.QGraphicsScene):
         self._clear_ongoing = True
         super().clear()
         self.internal_clipboard = []
+        pixmap_bytes_cache.clear()
         self.rubberband_item = RubberbandItem()
         self.multi_select_item = MultiSelectItem()
         self._clear_ongoing = False
@@ -104,7 +112,7 @@ class BeeGraphicsScene(QtWidgets.QGraphicsScene):
     def raise_to_top(self):
         self.cancel_active_modes()
         items = self.selectedItems(user_only=True)
-        z_values = map(lambda i: i.zValue(), items)
+        z_values = map(methodcaller('zValue'), items)
         delta = self.max_z + self.Z_STEP - min(z_values)
         logger.debug(f'Raise to top, delta: {delta}')
         for item in items:
@@ -113,7 +121,7 @@ class BeeGraphicsScene(QtWidgets.QGraphicsScene):
     def lower_to_bottom(self):
         self.cancel_active_modes()
         items = self.selectedItems(user_only=True)
-        z_values = map(lambda i: i.zValue(), items)
+        z_values = map(methodcaller('zValue'), items)
         delta = self.min_z - self.Z_STEP - max(z_values)
         logger.debug(f'Lower to bottom, delta: {delta}')
 
@@ -330,6 +338,12 @@ class BeeGraphicsScene(QtWidgets.QGraphicsScene):
         if item_at_pos:
             return item_at_pos.sample_color_at(position)
 
+    def clear_sample_images(self):
+        """Drops the images that have been kept for sampling colors."""
+
+        for item in self.items_by_type(BeePixmapItem.TYPE):
+            item.clear_sample_image()
+
     def select_all_items(self):
         self.cancel_active_modes()
         path = QtGui.QPainterPath()
@@ -542,18 +556,33 @@ class BeeGraphicsScene(QtWidgets.QGraphicsScene):
         self.items_to_add.put((itemdata, selected))
 
     def add_queued_items(self):
-        """Adds items added via ``add_item_later``"""
+        """Adds items added via ``add_item_later``
+
+        The selection changed signal is only emitted once for all
+        added items instead of for each item.
+        """
 
+        signals_blocked = self.blockSignals(True)
+        try:
+            selection_changed = self._add_queued_items()
+        finally:
+            self.blockSignals(signals_blocked)
+        if selection_changed and not signals_blocked:
+            self.selectionChanged.emit()
+
+    def _add_queued_items(self):
+        selection_changed = False
+        get_factory = item_factories.get
         while not self.items_to_add.empty():
             data, selected = self.items_to_add.get()
             typ = data.pop('type')
-            cls = item_registry.get(typ)
-            if not cls:
+            create_from_data = get_factory(typ)
+            if not create_from_data:
                 # Just in case we add new item types in future versions
                 logger.warning(f'Encountered item of unknown type: {typ}')
-                cls = BeeErrorItem
+                create_from_data = BeeErrorItem.create_from_data
                 data['data'] = {'text': f'Item of unknown type: {typ}'}
-            item = cls.create_from_data(**data)
+            item = create_from_data(**data)
             # Set the values common to all item types:
             item.update_from_data(**data)
             self.addItem(item)
@@ -562,3 +591,5 @@ class BeeGraphicsScene(QtWidgets.QGraphicsScene):
             if selected:
                 item.setSelected(True)
                 item.bring_to_front()
+                selection_changed = True
+        return selection_changed
@@ -15,6 +15,7 @@
 
 from collections import OrderedDict
 import re
+import threading
 
 from PyQt6 import QtCore, QtGui
 
@@ -97,13 +98,99 @@ def qcolor_to_hex(color):
 
 
 class ActionList(OrderedDict):
+    """Ordered dict of actions by id which can also be indexed by
+    position.
+
+    The values are kept as a tuple that is only rebuilt after the
+    list has been modified.
+    """
 
     def __init__(self, actions):
+        self._values_cache = None
         super().__init__()
         for action in actions:
             self[action.id] = action
 
     def __getitem__(self, key):
         if isinstance(key, int):
-            key = list(self.keys())[key]
+            return self.values()[key]
         return super().__getitem__(key)
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._values_cache = None
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._values_cache = None
+
+    def pop(self, *args):
+        self._values_cache = None
+        return super().pop(*args)
+
+    def popitem(self, *args, **kwargs):
+        self._values_cache = None
+        return super().popitem(*args, **kwargs)
+
+    def setdefault(self, *args):
+        self._values_cache = None
+        return super().setdefault(*args)
+
+    def update(self, *args, **kwargs):
+        self._values_cache = None
+        super().update(*args, **kwargs)
+
+    def move_to_end(self, *args, **kwargs):
+        self._values_cache = None
+        super().move_to_end(*args, **kwargs)
+
+    def clear(self):
+        self._values_cache = None
+        super().clear()
+
+    def values(self):
+        if self._values_cache is None:
+            self._values_cache = tuple(super().values())
+        return self._values_cache
+
+
+class BytesLRUCache:
+    """Thread-safe least recently used cache for values holding byte
+    strings, bounded by the total size of the byte strings instead of
+    the number of entries.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key][0]
+
+    def set(self, key, value, size):
+        """Store the value which takes up ``size`` bytes."""
+
+        if size > self.max_size:
+            return
+        with self._lock:
+            if key in self._data:
+                self.size -= self._data.pop(key)[1]
+            self._data[key] = (value, size)
+            self.size += size
+            while self.size > self.max_size:
+                _, (_, old_size) = self._data.popitem(last=False)
+                self.size -= old_size
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
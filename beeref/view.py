@@ -85,7 +85,7 @@ class BeeGraphicsView(MainControlsMixin,
         # Load files given via command line
         if commandline_args.filenames:
             fn = commandline_args.filenames[0]
-            if os.path.splitext(fn)[1] == '.bee':
+            if fileio.is_bee_file(fn):
                 self.open_from_file(fn)
             else:
                 self.do_insert_images(commandline_args.filenames)
@@ -116,6 +116,7 @@ class BeeGraphicsView(MainControlsMixin,
         if hasattr(self, 'sample_color_widget'):
             self.sample_color_widget.hide()
             del self.sample_color_widget
+            self.scene.clear_sample_images()
         if self.scene.has_multi_selection():
             self.scene.multi_select_item.bring_to_front()
 
@@ -59,7 +59,7 @@ class KeyboardShortcutsEditor(QtWidgets.QKeySequenceEdit):
             if action == self.action:
                 continue
             if shortcut in action.get_shortcuts():
-                txt = ': '.join(action.menu_path + [action.text])
+                txt = ': '.join((*action.menu_path, action.text))
                 txt = txt.replace('&', '').removesuffix('...')
                 msg = ('<p>This shortcut is already used for:</p>'
                        f'<p>{txt}</p>'
@@ -105,7 +105,7 @@ class KeyboardShortcutsModel(QtCore.QAbstractTableModel):
         if role in (QtCore.Qt.ItemDataRole.DisplayRole,
                     QtCore.Qt.ItemDataRole.EditRole):
             action = actions[index.row()]
-            txt = ': '.join(action.menu_path + [action.text])
+            txt = ': '.join((*action.menu_path, action.text))
             if index.column() == 0:
                 return txt.replace('&', '').removesuffix('...')
             if index.column() == 1 and action.shortcuts_changed():
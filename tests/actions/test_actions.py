@@ -1,8 +1,28 @@
 from unittest.mock import patch
 
+import pytest
 from PyQt6 import QtGui
 
-from beeref.actions.actions import Action
+from beeref.actions.actions import Action, _menu_path_index
+from beeref.config import settings_events
+from beeref.utils import ActionList
+
+
+@pytest.fixture(autouse=True)
+def clear_menu_path_index():
+    _menu_path_index.cache_clear()
+    yield
+    _menu_path_index.cache_clear()
+
+
+def test_action_has_no_instance_dict():
+    action = Action(id='foo', text='Foo', shortcuts=['Ctrl+R'])
+    assert not hasattr(action, '__dict__')
+
+
+def test_action_kb_settings_created_once(kbsettings):
+    action = Action(id='foo', text='Foo', shortcuts=['Ctrl+R'])
+    assert action.kb_settings is action.kb_settings
 
 
 def test_action_str():
@@ -10,6 +30,12 @@ def test_action_str():
     assert str(action) == 'foo'
 
 
+@patch('beeref.actions.actions.KeyboardSettings')
+def test_action_init_doesnt_access_settings(kb_mock):
+    Action(id='foo', text='Foo', shortcuts=['Ctrl+R'])
+    kb_mock.assert_not_called()
+
+
 def test_action_equals_true():
     action1 = Action(id='foo', text='Foo', shortcuts=['Ctrl+R'])
     action2 = Action(id='foo', text='Bar', shortcuts=['Ctrl+F'])
@@ -22,6 +48,20 @@ def test_action_equals_false():
     assert not action1 == action2
 
 
+def test_action_equals_false_when_other_type():
+    action = Action(id='foo', text='Foo', shortcuts=['Ctrl+R'])
+    assert not action == 'foo'
+    assert not action == None  # noqa: E711
+
+
+def test_action_hash():
+    action1 = Action(id='foo', text='Foo', shortcuts=['Ctrl+R'])
+    action2 = Action(id='foo', text='Bar', shortcuts=['Ctrl+F'])
+    action3 = Action(id='bar', text='Bar', shortcuts=['Ctrl+F'])
+    assert hash(action1) == hash(action2)
+    assert {action1, action2, action3} == {action1, action3}
+
+
 def test_action_on_restore_defaults(kbsettings, view):
     action = Action(id='foo', text='Foo', shortcuts=['Ctrl+R'])
     action.qaction = QtGui.QAction('foo', view)
@@ -37,6 +77,29 @@ def test_action_on_restore_defaults_when_no_defaults(kbsettings, view):
     assert action.qaction.shortcuts() == []
 
 
+def test_restore_keyboard_defaults_restores_all_actions(kbsettings, view):
+    action = Action(id='foo', text='Foo', shortcuts=['Ctrl+R'])
+    action.qaction = QtGui.QAction('foo', view)
+    action.qaction.setShortcuts(['Ctrl+B'])
+    with patch('beeref.actions.actions.actions', ActionList([action])):
+        settings_events.restore_keyboard_defaults.emit()
+    assert action.qaction.shortcuts() == ['Ctrl+R']
+
+
+def test_restore_keyboard_defaults_skips_actions_without_qaction(
+        kbsettings, view):
+    action1 = Action(id='foo', text='Foo', shortcuts=['Ctrl+R'])
+    action2 = Action(id='bar', text='Bar', shortcuts=['Ctrl+B'])
+    action2.qaction = QtGui.QAction('bar', view)
+    with patch('beeref.actions.actions.actions',
+               ActionList([action1, action2])):
+        with patch('beeref.actions.actions.KeyboardSettings') as kb_mock:
+            settings_events.restore_keyboard_defaults.emit()
+            kb_mock.assert_not_called()
+    assert action1.qaction is None
+    assert action2.qaction.shortcuts() == ['Ctrl+B']
+
+
 def test_action_get_overwritten_shortcuts(kbsettings):
     kbsettings.set_list('Actions', 'foo', ['Alt+O'])
     action = Action(id='foo', text='Foo', shortcuts=['Ctrl+F'])
@@ -48,6 +111,32 @@ def test_action_get_shortcuts_gets_default(kbsettings):
     assert action.get_shortcuts() == ['Ctrl+F']
 
 
+def test_action_get_shortcuts_reads_settings_once(kbsettings):
+    kbsettings.set_list('Actions', 'foo', ['Alt+O'])
+    action = Action(id='foo', text='Foo', shortcuts=['Ctrl+F'])
+    action.get_shortcuts()
+    with patch('beeref.config.KeyboardSettings.value') as value_mock:
+        with patch('beeref.config.KeyboardSettings.fileName') as name_mock:
+            assert action.get_shortcuts() == ['Alt+O']
+            value_mock.assert_not_called()
+            name_mock.assert_not_called()
+
+
+def test_action_get_shortcuts_after_set_shortcuts(kbsettings):
+    action = Action(id='foo', text='Foo', shortcuts=['Ctrl+F'])
+    assert action.get_shortcuts() == ['Ctrl+F']
+    action.set_shortcuts(['Alt+O'])
+    assert action.get_shortcuts() == ['Alt+O']
+    action.set_shortcuts(['Ctrl+F'])
+    assert action.get_shortcuts() == ['Ctrl+F']
+
+
+def test_action_get_shortcuts_returns_copy(kbsettings):
+    action = Action(id='foo', text='Foo', shortcuts=['Ctrl+F'])
+    action.get_shortcuts().append('Alt+O')
+    assert action.get_shortcuts() == ['Ctrl+F']
+
+
 def test_action_set_shortcuts_when_no_qaction(kbsettings):
     action = Action(id='foo', text='Foo')
     action.qaction = None
@@ -83,6 +172,21 @@ def test_action_get_qkeysequence_second_when_not_set(kbsettings):
     assert action.get_qkeysequence(1) == QtGui.QKeySequence()
 
 
+def test_action_get_qkeysequence_reuses_parsed_sequences(kbsettings):
+    action = Action(id='foo', text='Foo', shortcuts=['Ctrl+F'])
+    expected = action.get_qkeysequence(0)
+    with patch('PyQt6.QtGui.QKeySequence') as seq_mock:
+        assert action.get_qkeysequence(0) is expected
+        seq_mock.assert_not_called()
+
+
+def test_action_get_qkeysequence_after_shortcuts_changed(kbsettings):
+    action = Action(id='foo', text='Foo', shortcuts=['Ctrl+F'])
+    assert action.get_qkeysequence(0) == QtGui.QKeySequence('Ctrl+F')
+    kbsettings.set_list('Actions', 'foo', ['Ctrl+B'])
+    assert action.get_qkeysequence(0) == QtGui.QKeySequence('Ctrl+B')
+
+
 def test_action_shortcuts_changed_when_not_changed(kbsettings):
     action = Action(id='foo', text='Foo', shortcuts=['Ctrl+F'])
     assert action.shortcuts_changed() is False
@@ -94,6 +198,18 @@ def test_action_shortcuts_changed_when_changed(kbsettings):
     assert action.shortcuts_changed() is True
 
 
+def test_action_shortcuts_changed_when_removed(kbsettings):
+    action = Action(id='foo', text='Foo', shortcuts=['Ctrl+F'])
+    kbsettings.set_list('Actions', 'foo', [])
+    assert action.shortcuts_changed() is True
+
+
+def test_action_shortcuts_changed_when_stored_value_is_default(kbsettings):
+    action = Action(id='foo', text='Foo', shortcuts=['Ctrl+F'])
+    kbsettings.setValue('Actions/foo', 'Ctrl+F')
+    assert action.shortcuts_changed() is False
+
+
 def test_action_shortcuts_changed_when_empty(kbsettings):
     action = Action(id='foo', text='Foo')
     assert action.shortcuts_changed() is False
@@ -123,21 +239,21 @@ def test_action_get_default_shortcut_second_when_none_set():
        [{'menu': 'Foo', 'items': ['bar', 'baz']}])
 def test_action_menu_path():
     action = Action(id='baz', text='Foo')
-    assert action.menu_path == ['Foo']
+    assert action.menu_path == ('Foo',)
 
 
 @patch('beeref.actions.actions.menu_structure',
        [{'menu': 'Foo', 'items': [{'menu': 'Bar', 'items': ['baz']}]}])
 def test_action_menu_path_with_submenus():
     action = Action(id='baz', text='Foo')
-    assert action.menu_path == ['Foo', 'Bar']
+    assert action.menu_path == ('Foo', 'Bar')
 
 
 @patch('beeref.actions.actions.menu_structure',
        [{'menu': 'Foo', 'items': '_build_recent_files'}])
 def test_action_menu_path_recent_files():
     action = Action(id='baz', text='Foo', menu_id='_build_recent_files')
-    assert action.menu_path == ['Foo']
+    assert action.menu_path == ('Foo',)
 
 
 @patch('beeref.actions.actions.menu_structure',
@@ -145,4 +261,19 @@ def test_action_menu_path_recent_files():
            {'menu': 'Bar', 'items': '_build_recent_files'}]}])
 def test_action_menu_path_recent_files_in_submenu():
     action = Action(id='baz', text='Foo', menu_id='_build_recent_files')
-    assert action.menu_path == ['Foo', 'Bar']
+    assert action.menu_path == ('Foo', 'Bar')
+
+
+@patch('beeref.actions.actions.menu_structure',
+       [{'menu': 'Foo', 'items': [{'menu': 'Bar', 'items': ['bar']}]},
+        {'menu': 'Baz', 'items': ['baz']}])
+def test_action_menu_path_ignores_sibling_submenus():
+    action = Action(id='baz', text='Foo')
+    assert action.menu_path == ('Baz',)
+
+
+@patch('beeref.actions.actions.menu_structure',
+       [{'menu': 'Foo', 'items': ['bar']}])
+def test_action_menu_path_when_not_in_menu():
+    action = Action(id='baz', text='Foo')
+    assert action.menu_path == ()
@@ -1,5 +1,5 @@
 import os.path
-from unittest.mock import patch, MagicMock, call
+from unittest.mock import patch, MagicMock
 
 from PyQt6 import QtWidgets
 
@@ -35,9 +35,8 @@ class FooWidget(QtWidgets.QWidget, ActionsMixin):
            shortcuts=['Ctrl+F'],
            callback='on_foo',
        )]))
-@patch('beeref.config.KeyboardSettings.get_list')
+@patch('beeref.config.KeyboardSettings.get_all', return_value={})
 def test_create_actions(kb_mock, toggle_mock, trigger_mock, qapp):
-    kb_mock.side_effect = lambda group, key, default: default
     widget = FooWidget()
     widget.build_menu_and_actions()
     trigger_mock.connect.assert_called_once_with(widget.on_foo)
@@ -50,7 +49,7 @@ def test_create_actions(kb_mock, toggle_mock, trigger_mock, qapp):
     assert qaction.isEnabled() is True
     from beeref.actions.mixin import actions
     assert actions['foo'].qaction == qaction
-    kb_mock.assert_called_once_with('Actions', 'foo', ['Ctrl+F'])
+    kb_mock.assert_called_once_with('Actions')
 
 
 @patch('beeref.actions.mixin.menu_structure',
@@ -162,7 +161,9 @@ def test_create_actions_with_group(qapp):
     widget.build_menu_and_actions()
     assert len(widget.actions()) == 1
     qaction = widget.actions()[0]
-    assert widget.bee_actiongroups['bar'] == [qaction]
+    assert widget.bee_actiongroups['bar'].actions() == [qaction]
+    assert widget.bee_actiongroups['bar'].isExclusive() is False
+    assert qaction.isCheckable() is False
 
 
 @patch('beeref.actions.mixin.menu_structure',
@@ -213,6 +214,39 @@ def test_build_menu_and_actions_with_submenu(qapp):
             add_mock.assert_called_once_with(actions['foo'].qaction)
 
 
+@patch('beeref.actions.mixin.menu_structure',
+       [{'menu': 'Foo', 'items': [
+           {'menu': 'Bar', 'items': [
+               {'menu': 'Baz', 'items': ['foo']},
+               MENU_SEPARATOR,
+           ]},
+           'bar',
+       ]}])
+@patch('beeref.actions.mixin.actions',
+       ActionList([
+           Action(id='foo', text='&Foo', callback='on_foo'),
+           Action(id='bar', text='&Bar', callback='on_bar'),
+       ]))
+def test_build_menu_and_actions_with_nested_submenus(qapp):
+    widget = FooWidget()
+    widget.build_menu_and_actions()
+    from beeref.actions.mixin import actions
+    assert len(widget.toplevel_menus) == 1
+    foo_menu = widget.toplevel_menus[0]
+    assert foo_menu.title() == 'Foo'
+    foo_items = foo_menu.actions()
+    assert len(foo_items) == 2
+    assert foo_items[1] == actions['bar'].qaction
+    bar_menu = foo_items[0].menu()
+    assert bar_menu.title() == 'Bar'
+    bar_items = bar_menu.actions()
+    assert len(bar_items) == 2
+    assert bar_items[1].isSeparator()
+    baz_menu = bar_items[0].menu()
+    assert baz_menu.title() == 'Baz'
+    assert baz_menu.actions() == [actions['foo'].qaction]
+
+
 @patch('beeref.actions.mixin.menu_structure',
        [{'menu': 'Foo', 'items': ['foo']}])
 @patch('beeref.actions.mixin.actions',
@@ -237,6 +271,24 @@ def test_actiongroup_set_enabled(qapp):
     from beeref.actions.mixin import actions
     assert actions['foo'].qaction.isEnabled() is True
     assert actions['bar'].qaction.isEnabled() is False
+    widget.actiongroup_set_enabled('g1', False)
+    assert actions['foo'].qaction.isEnabled() is False
+
+
+@patch('beeref.actions.mixin.menu_structure',
+       [{'menu': 'Foo', 'items': ['foo']}])
+@patch('beeref.actions.mixin.actions',
+       ActionList([Action(
+           id='foo',
+           text='&Foo',
+           callback='on_foo',
+       )]))
+def test_actiongroup_set_enabled_unknown_group(qapp):
+    widget = FooWidget()
+    widget.build_menu_and_actions()
+    widget.actiongroup_set_enabled('g1', False)
+    from beeref.actions.mixin import actions
+    assert actions['foo'].qaction.isEnabled() is True
 
 
 @patch('beeref.actions.mixin.menu_structure',
@@ -256,14 +308,17 @@ def test_build_menu_and_actions_disables_actiongroups(qapp):
     assert qaction.isEnabled() is False
 
 
+def visible_actions(widget):
+    return [action for action in widget.actions() if action.isVisible()]
+
+
 @patch('PyQt6.QtGui.QAction.triggered')
-@patch('beeref.config.KeyboardSettings.get_list')
+@patch('beeref.config.KeyboardSettings.get_all', return_value={})
 @patch('beeref.actions.mixin.menu_structure',
        [{'menu': 'Foo', 'items': '_build_recent_files'}])
 @patch('beeref.actions.mixin.actions', ActionList([]))
 def test_create_recent_files_more_than_10_files(
         kb_mock, triggered_mock, qapp):
-    kb_mock.side_effect = lambda group, key, default: default
     widget = FooWidget()
     widget.settings.get_recent_files.return_value = [
         os.path.abspath(f'{i}.bee') for i in range(15)]
@@ -271,6 +326,7 @@ def test_create_recent_files_more_than_10_files(
     widget.build_menu_and_actions()
     triggered_mock.connect.assert_called()
     assert len(widget.actions()) == 10
+    assert len(visible_actions(widget)) == 10
 
     from beeref.actions.mixin import actions
     qaction1 = widget.actions()[0]
@@ -285,27 +341,24 @@ def test_create_recent_files_more_than_10_files(
     assert actions['recent_files_9'].qaction == qaction10
 
     assert kb_mock.call_count == 10
-    kb_mock.assert_has_calls(
-        [call('Actions', 'recent_files_0', ['Ctrl+1']),
-         call('Actions', 'recent_files_9', ['Ctrl+0'])],
-        any_order=True)
+    kb_mock.assert_called_with('Actions')
 
 
 @patch('PyQt6.QtGui.QAction.triggered')
 @patch('beeref.actions.mixin.menu_structure',
        [{'menu': 'Foo', 'items': '_build_recent_files'}])
 @patch('beeref.actions.mixin.actions', ActionList([]))
-@patch('beeref.config.KeyboardSettings.get_list')
+@patch('beeref.config.KeyboardSettings.get_all', return_value={})
 def test_create_recent_files_fewer_files_than_10_files(
         kb_mock, triggered_mock, qapp):
-    kb_mock.side_effect = lambda group, key, default: default
     widget = FooWidget()
     widget.settings.get_recent_files.return_value = [
         os.path.abspath(f'{i}.bee') for i in range(5)]
 
     widget.build_menu_and_actions()
     triggered_mock.connect.assert_called()
-    assert len(widget.actions()) == 5
+    assert len(widget.actions()) == 10
+    assert len(visible_actions(widget)) == 5
 
     from beeref.actions.mixin import actions
     qaction1 = widget.actions()[0]
@@ -318,26 +371,24 @@ def test_create_recent_files_fewer_files_than_10_files(
     assert qaction5.shortcut() == 'Ctrl+5'
     assert qaction5.isEnabled() is True
     assert actions['recent_files_4'].qaction == qaction5
-    assert actions['recent_files_5'].qaction is None
+    qaction6 = widget.actions()[5]
+    assert qaction6.isVisible() is False
+    assert qaction6.isEnabled() is False
+    assert actions['recent_files_5'].qaction == qaction6
 
-    assert kb_mock.call_count == 5
-    kb_mock.assert_has_calls(
-        [call('Actions', 'recent_files_0', ['Ctrl+1']),
-         call('Actions', 'recent_files_4', ['Ctrl+5'])],
-        any_order=True)
+    assert kb_mock.call_count == 10
+    kb_mock.assert_called_with('Actions')
 
 
 @patch('beeref.actions.mixin.menu_structure',
        [{'menu': 'Foo', 'items': '_build_recent_files'}])
 @patch('beeref.actions.mixin.actions', ActionList([]))
-@patch('beeref.config.KeyboardSettings.get_list')
-def test_create_recent_files_when_no_files(kb_mock, qapp):
-    kb_mock.side_effect = lambda group, key, default: default
+def test_create_recent_files_when_no_files(qapp):
     widget = FooWidget()
     widget.settings.get_recent_files.return_value = []
     widget.build_menu_and_actions()
-    assert len(widget.actions()) == 0
-    kb_mock.assert_not_called()
+    assert len(widget.actions()) == 10
+    assert visible_actions(widget) == []
 
 
 @patch('PyQt6.QtGui.QAction.triggered')
@@ -351,19 +402,84 @@ def test_update_recent_files(triggered_mock, qapp):
 
     widget.build_menu_and_actions()
     triggered_mock.connect.reset_mock()
-    assert len(widget.actions()) == 1
-    qaction1 = widget.actions()[0]
+    qactions = widget.actions()
+    assert len(visible_actions(widget)) == 1
+    qaction1 = visible_actions(widget)[0]
     assert qaction1.text() == 'foo.bee'
 
     widget.settings.get_recent_files.return_value = [
-        os.path.abspath('bar.bee')]
+        os.path.abspath('bar.bee'), os.path.abspath('baz.bee')]
     widget.update_menu_and_actions()
-    triggered_mock.connect.assert_called()
-    assert len(widget.actions()) == 1
-    qaction1 = widget.actions()[0]
+    triggered_mock.connect.assert_not_called()
+    assert widget.actions() == qactions
+    assert len(visible_actions(widget)) == 2
+    assert visible_actions(widget)[0] == qaction1
     assert qaction1.text() == 'bar.bee'
 
 
+@patch('beeref.actions.mixin.menu_structure',
+       [{'menu': 'Foo', 'items': '_build_recent_files'}])
+@patch('beeref.actions.mixin.actions', ActionList([]))
+def test_update_recent_files_hides_unused_actions(qapp):
+    widget = FooWidget()
+    widget.settings.get_recent_files.return_value = [
+        os.path.abspath('foo.bee'), os.path.abspath('bar.bee')]
+    widget.build_menu_and_actions()
+    assert len(visible_actions(widget)) == 2
+
+    widget.settings.get_recent_files.return_value = [
+        os.path.abspath('baz.bee')]
+    widget.update_menu_and_actions()
+    assert len(visible_actions(widget)) == 1
+    assert visible_actions(widget)[0].text() == 'baz.bee'
+    assert widget._recent_files_submenu.actions() == widget.actions()
+
+
+@patch('beeref.actions.mixin.menu_structure',
+       [{'menu': 'Foo', 'items': '_build_recent_files'}])
+@patch('beeref.actions.mixin.actions', ActionList([]))
+def test_recent_files_action_opens_current_file(qapp):
+    widget = FooWidget()
+    widget.settings.get_recent_files.return_value = [
+        os.path.abspath('foo.bee')]
+    widget.build_menu_and_actions()
+
+    with patch.object(widget, 'on_action_open_recent_file') as open_mock:
+        widget.settings.get_recent_files.return_value = [
+            os.path.abspath('bar.bee')]
+        widget.update_menu_and_actions()
+        from beeref.actions.mixin import actions
+        actions['recent_files_0'].qaction.trigger()
+        open_mock.assert_called_once_with(os.path.abspath('bar.bee'))
+
+
+@patch('beeref.actions.mixin.menu_structure',
+       [{'menu': 'Foo', 'items': ['foo']},
+        {'menu': 'Bar', 'items': '_build_recent_files'}])
+@patch('beeref.actions.mixin.actions',
+       ActionList([Action(
+           id='foo',
+           text='&Foo',
+           callback='on_foo',
+           group='bar',
+       )]))
+def test_build_menu_and_actions_twice_replaces_menus_and_actions(qapp):
+    widget = FooWidget()
+    widget.settings.get_recent_files.return_value = []
+    widget.build_menu_and_actions()
+    old_qactions = widget.actions()
+    old_menu = widget.context_menu
+    widget.build_menu_and_actions()
+
+    assert len(widget.actions()) == len(old_qactions)
+    assert set(widget.actions()).isdisjoint(old_qactions)
+    assert widget.context_menu != old_menu
+    assert len(widget.toplevel_menus) == 2
+    from beeref.actions.mixin import actions
+    assert widget.bee_actiongroups['bar'].actions() == [
+        actions['foo'].qaction]
+
+
 def test_create_menubar(qapp):
     widget = FooWidget()
     widget.toplevel_menus = [QtWidgets.QMenu('Foo')]
@@ -426,6 +426,37 @@ def test_keyboardsettings_get_list_default(kbsettings):
     assert shortcuts == ['Ctrl+B']
 
 
+def test_keyboardsettings_get_all(kbsettings):
+    kbsettings.set_list('mygroup', 'foo', ['Ctrl+F', 'Alt+O'])
+    kbsettings.set_list('mygroup', 'bar', [])
+    kbsettings.set_list('othergroup', 'baz', ['Ctrl+B'])
+    assert kbsettings.get_all('mygroup') == {
+        'foo': ['Ctrl+F', 'Alt+O'],
+        'bar': [],
+    }
+
+
+def test_keyboardsettings_get_all_empty(kbsettings):
+    assert kbsettings.get_all('mygroup') == {}
+
+
+def test_keyboardsettings_get_all_reads_settings_once(kbsettings):
+    kbsettings.set_list('mygroup', 'foo', ['Ctrl+F'])
+    kbsettings.get_all('mygroup')
+    with patch('beeref.config.KeyboardSettings.value') as value_mock:
+        assert kbsettings.get_all('mygroup') == {'foo': ['Ctrl+F']}
+        value_mock.assert_not_called()
+
+
+def test_keyboardsettings_get_all_updates_after_change(kbsettings):
+    kbsettings.set_list('mygroup', 'foo', ['Ctrl+F'])
+    kbsettings.get_all('mygroup')
+    KeyboardSettings().set_list('mygroup', 'foo', ['Ctrl+B'])
+    assert kbsettings.get_all('mygroup') == {'foo': ['Ctrl+B']}
+    KeyboardSettings().remove('mygroup/foo')
+    assert kbsettings.get_all('mygroup') == {}
+
+
 @patch('beeref.config.KeyboardSettings.setValue')
 @patch('beeref.config.KeyboardSettings.remove')
 def test_keyboardsettings_set_list_other_than_default_saves(
@@ -1,13 +1,20 @@
+import argparse
 import os
 import os.path
 import tempfile
+import threading
 from unittest.mock import patch, MagicMock
 
 import pytest
 
-from PyQt6 import QtGui
+from PyQt6 import QtCore, QtGui
 
-from beeref.config.settings import CommandlineArgs
+from beeref.config.settings import (
+    BeeSettings,
+    CommandlineArgs,
+    filter_existing_files,
+    make_coercer,
+)
 
 
 def test_command_line_args_singleton():
@@ -25,12 +32,64 @@ def test_command_line_args_with_check_forces_new_parsing(parse_mock):
     CommandlineArgs._instance = None
 
 
+@patch('beeref.config.settings.parser.parse_known_args')
+def test_command_line_args_parses_on_first_access(parse_mock):
+    parse_mock.return_value = (argparse.Namespace(loglevel='DEBUG'), [])
+    args = CommandlineArgs()
+    parse_mock.assert_not_called()
+    assert args.loglevel == 'DEBUG'
+    assert args.loglevel == 'DEBUG'
+    parse_mock.assert_called_once_with()
+    CommandlineArgs._instance = None
+
+
+@patch('beeref.config.settings.parser.parse_known_args')
+def test_command_line_args_threads_parse_once(parse_mock):
+    parse_mock.return_value = (argparse.Namespace(loglevel='DEBUG'), [])
+    CommandlineArgs._instance = None
+    barrier = threading.Barrier(8, timeout=5)
+    results = []
+
+    def access():
+        barrier.wait()
+        args = CommandlineArgs()
+        results.append((args, args.loglevel))
+
+    threads = [threading.Thread(target=access) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len({id(args) for args, loglevel in results}) == 1
+    assert {loglevel for args, loglevel in results} == {'DEBUG'}
+    parse_mock.assert_called_once_with()
+    CommandlineArgs._instance = None
+
+
+@patch('beeref.config.settings.parser.parse_args')
+def test_command_line_args_with_check_parses_before_publishing(parse_mock):
+    parse_mock.return_value = argparse.Namespace(loglevel='DEBUG')
+    args = CommandlineArgs(with_check=True)
+    assert CommandlineArgs._instance is args
+    assert args.__dict__['loglevel'] == 'DEBUG'
+    CommandlineArgs._instance = None
+
+
 def test_command_line_args_get():
     args = CommandlineArgs()
     assert args.loglevel == 'INFO'
     CommandlineArgs._instance = None
 
 
+def test_command_line_args_get_stored_on_instance():
+    args = CommandlineArgs()
+    args.filenames
+    assert args.__dict__['loglevel'] == 'INFO'
+    assert args.__dict__['debug_shapes'] is False
+    CommandlineArgs._instance = None
+
+
 def test_command_line_args_get_unknown():
     args = CommandlineArgs()
     with pytest.raises(AttributeError):
@@ -67,6 +126,22 @@ def test_settings_set_value_with_callback(settings):
     assert settings.value('foo/bar') == 100
 
 
+def test_settings_set_value_unchanged_skips_write(settings):
+    foo_callback = MagicMock()
+    settings.FIELDS = {'foo/bar': {'post_save_callback': foo_callback}}
+    settings.setValue('foo/bar', 'baz')
+    foo_callback.reset_mock()
+    with patch('beeref.config.settings.QtCore.QSettings.setValue') as set_mock:
+        settings.setValue('foo/bar', 'baz')
+        set_mock.assert_not_called()
+    foo_callback.assert_not_called()
+
+
+def test_settings_set_value_none_when_not_set(settings):
+    settings.setValue('foo/bar', None)
+    assert settings.contains('foo/bar') is True
+
+
 def test_settings_remove_without_callback(settings):
     settings.FIELDS = {'foo/bar': {}}
     settings.remove('foo/bar')
@@ -108,6 +183,23 @@ def test_settings_value_or_default_gets_default_when_cast_error(settings):
     assert settings.valueOrDefault('Items/arrange_gap') == 0
 
 
+def test_settings_value_or_default_reads_settings_once(settings):
+    settings.setValue('Items/arrange_gap', '5')
+    settings.valueOrDefault('Items/arrange_gap')
+    with patch('beeref.config.settings.BeeSettings.value') as value_mock:
+        assert settings.valueOrDefault('Items/arrange_gap') == 5
+        value_mock.assert_not_called()
+
+
+def test_settings_value_or_default_after_change_in_other_instance(settings):
+    settings.setValue('Items/arrange_gap', 5)
+    assert settings.valueOrDefault('Items/arrange_gap') == 5
+    BeeSettings().setValue('Items/arrange_gap', 10)
+    assert settings.valueOrDefault('Items/arrange_gap') == 10
+    BeeSettings().remove('Items/arrange_gap')
+    assert settings.valueOrDefault('Items/arrange_gap') == 0
+
+
 def test_settings_value_changed_when_default(settings):
     assert settings.value_changed('Items/image_storage_format') is False
 
@@ -130,6 +222,13 @@ def test_settings_restore_defaults_leaves_other_settings(settings):
     assert settings.value('foo/bar') == 'baz'
 
 
+def test_settings_restore_defaults_skips_unset_keys(settings):
+    settings.setValue('Items/image_storage_format', 'png')
+    with patch.object(settings, 'remove') as remove_mock:
+        settings.restore_defaults()
+        remove_mock.assert_called_once_with('Items/image_storage_format')
+
+
 def test_settings_recent_files_get_empty(settings):
     settings.get_recent_files() == []
 
@@ -166,3 +265,94 @@ def test_settings_recent_files_update_respects_max_num(settings):
     assert len(recent) == 10
     assert recent[0] == os.path.abspath('14.bee')
     assert recent[-1] == os.path.abspath('5.bee')
+
+
+def test_settings_recent_files_shared_between_instances(settings):
+    settings.update_recent_files('foo.bee')
+    assert BeeSettings().get_recent_files() == [os.path.abspath('foo.bee')]
+
+
+def test_settings_recent_files_get_reads_array_only_once(settings):
+    settings.update_recent_files('foo.bee')
+    BeeSettings._recent_files_cache.clear()
+    with patch.object(settings, 'beginReadArray',
+                      wraps=settings.beginReadArray) as read_mock:
+        settings.get_recent_files()
+        settings.get_recent_files()
+        read_mock.assert_called_once_with('RecentFiles')
+
+
+def test_settings_recent_files_get_returns_copy(settings):
+    settings.update_recent_files('foo.bee')
+    settings.get_recent_files().append('bar.bee')
+    assert settings.get_recent_files() == [os.path.abspath('foo.bee')]
+
+
+def test_settings_recent_files_update_unchanged_skips_write(settings):
+    settings.update_recent_files('foo.bee')
+    with patch.object(settings, 'beginWriteArray') as write_mock:
+        settings.update_recent_files('foo.bee')
+        write_mock.assert_not_called()
+
+
+def test_settings_recent_files_clear(settings):
+    settings.update_recent_files('foo.bee')
+    settings.clear()
+    assert settings.get_recent_files() == []
+
+
+def test_filter_existing_files():
+    with tempfile.TemporaryDirectory() as dirname:
+        paths = [os.path.join(dirname, name) for name in ('a', 'b', 'c')]
+        for path in paths[:2]:
+            open(path, 'w').close()
+        filenames = [paths[2], paths[1], '/nonexisting/foo.bee', paths[0]]
+        assert filter_existing_files(filenames) == [paths[1], paths[0]]
+
+
+def test_make_coercer_returns_value():
+    coerce = make_coercer({'default': 1, 'cast': int,
+                           'validate': lambda x: x > 0})
+    assert coerce('5') == 5
+
+
+def test_make_coercer_returns_default_when_none():
+    coerce = make_coercer({'default': 1, 'cast': int})
+    assert coerce(None) == 1
+
+
+def test_make_coercer_returns_default_when_cast_fails():
+    coerce = make_coercer({'default': 1, 'cast': int})
+    assert coerce('foo') == 1
+
+
+def test_make_coercer_returns_default_when_invalid():
+    coerce = make_coercer({'default': 1, 'validate': lambda x: x > 0})
+    assert coerce(-3) == 1
+
+
+def test_make_coercer_without_cast_and_validate():
+    coerce = make_coercer({'default': 'foo'})
+    assert coerce('bar') == 'bar'
+
+
+def test_make_coercer_unhashable_value_gets_default():
+    coerce = make_coercer({'default': 'a',
+                           'validate': frozenset(('a', 'b')).__contains__})
+    assert coerce(['a', 'b']) == 'a'
+
+
+def test_settings_value_or_default_choices_unhashable(settings):
+    settings.setValue('Items/arrange_default', ['vertical', 'square'])
+    assert settings.valueOrDefault('Items/arrange_default') == 'optimal'
+
+
+def test_settings_file_name_normalized(settings):
+    assert settings.fileName() == os.path.normpath(
+        QtCore.QSettings.fileName(settings))
+
+
+def test_settings_file_name_computed_once(settings):
+    with patch('beeref.config.settings.os.path.normpath') as normpath_mock:
+        settings.fileName()
+        normpath_mock.assert_not_called()
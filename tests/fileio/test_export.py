@@ -10,6 +10,9 @@ from beeref.fileio.export import (
 @pytest.mark.parametrize('key,expected',
                          [('png', SceneToPixmapExporter),
                           ('jpg', SceneToPixmapExporter),
-                          ('svg', SceneToSVGExporter)])
+                          ('.jpg', SceneToPixmapExporter),
+                          ('foo', SceneToPixmapExporter),
+                          ('svg', SceneToSVGExporter),
+                          ('.svg', SceneToSVGExporter)])
 def test_registry(key, expected):
-    exporter_registry[key] == expected
+    assert exporter_registry[key] == expected
@@ -1,6 +1,7 @@
 import os
 import stat
-from unittest.mock import MagicMock
+import threading
+from unittest.mock import MagicMock, patch
 import pytest
 
 from PyQt6 import QtGui
@@ -26,6 +27,54 @@ def test_images_to_directory_exporter_export_writes_images(
         assert f.read().startswith(b'\x89PNG')
 
 
+def test_images_to_directory_exporter_export_closes_dir(
+        view, tmpdir, imgfilename3x3):
+    item = BeePixmapItem(QtGui.QImage(imgfilename3x3))
+    view.scene.addItem(item)
+    exporter = ImagesToDirectoryExporter(view.scene, tmpdir)
+    with patch('beeref.fileio.export.os.close', wraps=os.close) as close_mock:
+        exporter.export()
+        if os.stat in os.supports_dir_fd:
+            close_mock.assert_called_once()
+
+    with open(os.path.join(tmpdir, '0001.png'), 'rb') as f:
+        assert f.read().startswith(b'\x89PNG')
+
+
+def test_images_to_directory_exporter_export_without_dir_fd_support(
+        view, tmpdir, imgfilename3x3):
+    item = BeePixmapItem(QtGui.QImage(imgfilename3x3))
+    view.scene.addItem(item)
+    with open(os.path.join(tmpdir, '0002.png'), 'w') as f:
+        f.write('foo')
+    item = BeePixmapItem(QtGui.QImage(imgfilename3x3))
+    item.save_id = 2
+    view.scene.addItem(item)
+    exporter = ImagesToDirectoryExporter(view.scene, tmpdir)
+    exporter.handle_existing = 'overwrite_all'
+    with patch('beeref.fileio.export.os.supports_dir_fd', set()):
+        exporter.export()
+
+    for name in ('0002.png', '0003.png'):
+        with open(os.path.join(tmpdir, name), 'rb') as f:
+            assert f.read().startswith(b'\x89PNG')
+
+
+def test_images_to_directory_exporter_export_when_dir_missing(
+        view, tmpdir, imgfilename3x3):
+    item = BeePixmapItem(QtGui.QImage(imgfilename3x3))
+    view.scene.addItem(item)
+    dirname = os.path.join(tmpdir, 'foo')
+    exporter = ImagesToDirectoryExporter(view.scene, dirname)
+    worker = MagicMock(canceled=False)
+
+    exporter.export(worker)
+    worker.finished.emit.assert_called_once()
+    args = worker.finished.emit.call_args.args
+    assert args[0] == dirname
+    assert len(args[1]) == 1
+
+
 def test_images_to_directory_exporter_export_file_exists_no_user_input(
         view, tmpdir, imgdata3x3, imgfilename3x3,):
     item1 = BeePixmapItem(QtGui.QImage(imgfilename3x3))
@@ -285,3 +334,82 @@ def test_images_to_directory_exporter_export_when_img_not_writeable_w_worker(
     args = worker.finished.emit.call_args.args
     assert args[0] == imgfilename
     assert len(args[1]) == 1
+
+
+def test_images_to_directory_exporter_export_encodes_in_parallel(
+        view, tmpdir, imgfilename3x3):
+    barrier = threading.Barrier(2, timeout=5)
+
+    def encode():
+        # Both images need to be encoding at the same time to get past
+        # the barrier
+        barrier.wait()
+        return (b'foo', 'png')
+
+    for i in range(2):
+        item = BeePixmapItem(QtGui.QImage(imgfilename3x3))
+        item.save_id = i + 1
+        item.prepare_pixmap_bytes = MagicMock(return_value=encode)
+        view.scene.addItem(item)
+    exporter = ImagesToDirectoryExporter(view.scene, tmpdir)
+    with patch('beeref.fileio.export.os.cpu_count', return_value=2):
+        exporter.export()
+
+    for name in ('0001.png', '0002.png'):
+        with open(os.path.join(tmpdir, name), 'rb') as f:
+            assert f.read() == b'foo'
+
+
+def test_images_to_directory_exporter_export_prepares_in_calling_thread(
+        view, tmpdir, imgfilename3x3):
+    threads = []
+
+    def prepare():
+        threads.append(threading.current_thread())
+        return lambda: (b'foo', 'png')
+
+    for i in range(3):
+        item = BeePixmapItem(QtGui.QImage(imgfilename3x3))
+        item.save_id = i + 1
+        item.prepare_pixmap_bytes = MagicMock(side_effect=prepare)
+        view.scene.addItem(item)
+    exporter = ImagesToDirectoryExporter(view.scene, tmpdir)
+    with patch('beeref.fileio.export.os.cpu_count', return_value=2):
+        exporter.export()
+
+    assert threads == [threading.current_thread()] * 3
+
+
+def test_images_to_directory_exporter_export_keeps_order(
+        view, tmpdir, imgfilename3x3):
+    for i in range(5):
+        item = BeePixmapItem(QtGui.QImage(imgfilename3x3))
+        item.save_id = i + 1
+        view.scene.addItem(item)
+    worker = MagicMock(canceled=False)
+    exporter = ImagesToDirectoryExporter(view.scene, tmpdir)
+    with patch('beeref.fileio.export.os.cpu_count', return_value=1):
+        exporter.export(worker)
+
+    assert sorted(os.listdir(tmpdir)) == [
+        '0001.png', '0002.png', '0003.png', '0004.png', '0005.png']
+    assert [c.args[0] for c in worker.progress.emit.call_args_list] == [
+        0, 1, 2, 3, 4]
+
+
+def test_images_to_directory_exporter_export_emits_progress_in_batches(
+        view, tmpdir, imgfilename3x3):
+    for i in range(10):
+        item = BeePixmapItem(QtGui.QImage(imgfilename3x3))
+        item.save_id = i + 1
+        view.scene.addItem(item)
+    worker = MagicMock(canceled=False)
+    exporter = ImagesToDirectoryExporter(view.scene, tmpdir)
+    with patch.object(ImagesToDirectoryExporter, 'PROGRESS_GRANULARITY', 2):
+        with patch('beeref.fileio.progress.time.monotonic', return_value=0):
+            exporter.export(worker)
+
+    assert len(os.listdir(tmpdir)) == 10
+    assert [c.args[0] for c in worker.progress.emit.call_args_list] == [
+        0, 5, 9]
+    worker.finished.emit.assert_called_once_with(tmpdir, [])
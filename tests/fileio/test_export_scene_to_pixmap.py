@@ -111,6 +111,160 @@ def test_scene_to_pixmap_exporter_export_writes_image(view, tmpdir):
         assert f.read().startswith(b'\x89PNG')
 
 
+@pytest.mark.parametrize('filename,quality',
+                         [('foo.png', 80),
+                          ('foo.PNG', 80),
+                          ('foo.jpg', 90)])
+def test_scene_to_pixmap_exporter_export_quality(
+        view, tmpdir, filename, quality):
+    filename = os.path.join(tmpdir, filename)
+    item = BeePixmapItem(
+        QtGui.QImage(100, 120, QtGui.QImage.Format.Format_RGB32))
+    view.scene.addItem(item)
+    exporter = SceneToPixmapExporter(view.scene)
+    exporter.size = QtCore.QSize(100, 120)
+    with patch('PyQt6.QtGui.QImage.save', return_value=True) as save_mock:
+        exporter.export(filename)
+        save_mock.assert_called_once_with(filename, quality=quality)
+
+
+def test_scene_to_pixmap_exporter_export_compresses_png(view, tmpdir):
+    filename = os.path.join(tmpdir, 'foo.png')
+    item_img = QtGui.QImage(1000, 1200, QtGui.QImage.Format.Format_RGB32)
+    item_img.fill(QtGui.QColor(100, 120, 130))
+    item = BeePixmapItem(item_img)
+    view.scene.addItem(item)
+    exporter = SceneToPixmapExporter(view.scene)
+    exporter.size = QtCore.QSize(1000, 1200)
+    exporter.export(filename)
+
+    # Uncompressed, this would take more than 3 bytes per pixel
+    assert os.path.getsize(filename) < 1000 * 1200 / 10
+
+
+def test_scene_to_pixmap_exporter_export_png_in_strips(view, tmpdir):
+    filename = os.path.join(tmpdir, 'foo.png')
+    item_img = QtGui.QImage(300, 200, QtGui.QImage.Format.Format_RGB32)
+    item_img.fill(QtGui.QColor(100, 120, 130))
+    item = BeePixmapItem(item_img)
+    item.setRotation(30)
+    view.scene.addItem(item)
+    item_img = QtGui.QImage(300, 200, QtGui.QImage.Format.Format_RGB32)
+    item_img.fill(QtGui.QColor(200, 10, 50))
+    item = BeePixmapItem(item_img)
+    item.setPos(QtCore.QPointF(100, 250))
+    item.setScale(0.7)
+    view.scene.addItem(item)
+    exporter = SceneToPixmapExporter(view.scene)
+    exporter.size = QtCore.QSize(457, 403)
+    expected = exporter.render_to_image()
+
+    with patch.object(SceneToPixmapExporter, 'STRIP_PIXELS', 457 * 37):
+        with patch('PyQt6.QtGui.QImage.save') as save_mock:
+            exporter.export(filename)
+            save_mock.assert_not_called()
+
+    image = QtGui.QImage(filename)
+    assert image.size() == QtCore.QSize(457, 403)
+    # Pixels exactly on the edges of transformed items may flip due to
+    # floating point rounding, but the strips have to line up
+    mismatches = sum(
+        image.pixel(x, y) != expected.pixel(x, y)
+        for x in range(457) for y in range(403))
+    assert mismatches < 10
+
+
+def test_scene_to_pixmap_exporter_export_png_in_strips_reuses_painter(
+        view, tmpdir):
+    filename = os.path.join(tmpdir, 'foo.png')
+    item_img = QtGui.QImage(100, 120, QtGui.QImage.Format.Format_RGB32)
+    item = BeePixmapItem(item_img)
+    view.scene.addItem(item)
+    exporter = SceneToPixmapExporter(view.scene)
+    exporter.size = QtCore.QSize(100, 120)
+    with patch.object(SceneToPixmapExporter, 'STRIP_PIXELS', 100 * 50):
+        with patch('beeref.fileio.export.QtGui.QPainter',
+                   wraps=QtGui.QPainter) as painter_mock:
+            exporter.export(filename)
+            painter_mock.assert_called_once()
+
+    assert QtGui.QImage(filename).size() == QtCore.QSize(100, 120)
+
+
+def test_scene_to_pixmap_exporter_export_png_in_strips_with_worker(
+        view, tmpdir):
+    filename = os.path.join(tmpdir, 'foo.png')
+    item_img = QtGui.QImage(100, 120, QtGui.QImage.Format.Format_RGB32)
+    item = BeePixmapItem(item_img)
+    view.scene.addItem(item)
+    exporter = SceneToPixmapExporter(view.scene)
+    exporter.size = QtCore.QSize(100, 120)
+    worker = MagicMock(canceled=False)
+    with patch.object(SceneToPixmapExporter, 'STRIP_PIXELS', 100 * 50):
+        exporter.export(filename, worker)
+
+    worker.begin_processing.emit.assert_called_once_with(3)
+    assert worker.progress.emit.call_count == 3
+    worker.progress.emit.assert_called_with(2)
+    worker.finished.emit.assert_called_once_with(filename, [])
+    assert QtGui.QImage(filename).size() == QtCore.QSize(100, 120)
+
+
+def test_scene_to_pixmap_exporter_export_png_in_strips_when_canceled(
+        view, tmpdir):
+    filename = os.path.join(tmpdir, 'foo.png')
+    item_img = QtGui.QImage(100, 120, QtGui.QImage.Format.Format_RGB32)
+    item = BeePixmapItem(item_img)
+    view.scene.addItem(item)
+    exporter = SceneToPixmapExporter(view.scene)
+    exporter.size = QtCore.QSize(100, 120)
+    worker = MagicMock(canceled=True)
+    with patch.object(SceneToPixmapExporter, 'STRIP_PIXELS', 100 * 50):
+        exporter.export(filename, worker)
+
+    worker.progress.emit.assert_not_called()
+    worker.finished.emit.assert_called_once_with(filename, [])
+    assert os.path.exists(filename) is False
+
+
+def test_scene_to_pixmap_exporter_export_png_in_strips_canceled_keeps_file(
+        view, tmpdir):
+    filename = os.path.join(tmpdir, 'foo.png')
+    with open(filename, 'wb') as f:
+        f.write(b'foo')
+    view.scene.addItem(BeePixmapItem(
+        QtGui.QImage(100, 120, QtGui.QImage.Format.Format_RGB32)))
+    exporter = SceneToPixmapExporter(view.scene)
+    exporter.size = QtCore.QSize(100, 120)
+    worker = MagicMock(canceled=True)
+    with patch.object(SceneToPixmapExporter, 'STRIP_PIXELS', 100 * 50):
+        exporter.export(filename, worker)
+
+    with open(filename, 'rb') as f:
+        assert f.read() == b'foo'
+    assert os.listdir(tmpdir) == ['foo.png']
+
+
+def test_scene_to_pixmap_exporter_export_png_in_strips_error_keeps_file(
+        view, tmpdir):
+    filename = os.path.join(tmpdir, 'foo.png')
+    with open(filename, 'wb') as f:
+        f.write(b'foo')
+    view.scene.addItem(BeePixmapItem(
+        QtGui.QImage(100, 120, QtGui.QImage.Format.Format_RGB32)))
+    exporter = SceneToPixmapExporter(view.scene)
+    exporter.size = QtCore.QSize(100, 120)
+    with patch.object(SceneToPixmapExporter, 'STRIP_PIXELS', 100 * 50):
+        with patch.object(exporter, 'render_strip',
+                          side_effect=[None, ValueError]):
+            with pytest.raises(ValueError):
+                exporter.export(filename)
+
+    with open(filename, 'rb') as f:
+        assert f.read() == b'foo'
+    assert os.listdir(tmpdir) == ['foo.png']
+
+
 def test_scene_to_pixmap_exporter_export_with_worker(view, tmpdir):
     filename = os.path.join(tmpdir, 'foo.png')
     item_img = QtGui.QImage(1000, 1200, QtGui.QImage.Format.Format_RGB32)
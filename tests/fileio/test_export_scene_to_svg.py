@@ -1,13 +1,26 @@
+import base64
+import io
 import os
 import stat
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
+from xml.etree import ElementTree as ET
 import pytest
 
 from PyQt6 import QtGui, QtCore
 
 from beeref.items import BeePixmapItem, BeeTextItem
 from beeref.fileio.errors import BeeFileIOError
-from beeref.fileio.export import SceneToSVGExporter
+from beeref.fileio.export import SceneToSVGExporter, write_base64
+
+
+SVG = '{http://www.w3.org/2000/svg}'
+XLINK_HREF = '{http://www.w3.org/1999/xlink}href'
+
+
+def render_svg(exporter, worker=None):
+    f = io.StringIO()
+    exporter.write_svg(f, worker)
+    return ET.fromstring(f.getvalue())
 
 
 def test_scene_to_svg_exporter_get_user_input(view):
@@ -43,18 +56,16 @@ def test_scene_to_svg_exporter_render_pixmap_items(view):
     exporter = SceneToSVGExporter(view.scene)
     exporter.size = QtCore.QSize(200, 400)
     exporter.margin = 5
-    svg = exporter.render_to_svg()
+    svg = render_svg(exporter)
 
-    assert svg.tag == 'svg'
+    assert svg.tag == f'{SVG}svg'
     assert svg.get('width') == '200'
     assert svg.get('height') == '400'
-    assert svg.get('xmlns') == 'http://www.w3.org/2000/svg'
-    assert svg.get('xmlns:xlink') == 'http://www.w3.org/1999/xlink'
     assert len(svg) == 2
 
     element = svg[0]  # item2
-    assert element.tag == 'image'
-    assert element.get('xlink:href').startswith('data:image/png;base64,iVBOR')
+    assert element.tag == f'{SVG}image'
+    assert element.get(XLINK_HREF).startswith('data:image/png;base64,iVBOR')
     assert element.get('width') == '70.0'
     assert element.get('height') == '77.0'
     assert element.get('image-rendering') == 'optimizeQuality'
@@ -64,7 +75,7 @@ def test_scene_to_svg_exporter_render_pixmap_items(view):
     assert element.get('opacity') == '1.0'
 
     element = svg[1]  # item1
-    assert element.tag == 'image'
+    assert element.tag == f'{SVG}image'
     assert element.get('width') == '100.0'
     assert element.get('height') == '110.0'
     assert element.get('image-rendering') == 'optimizeQuality'
@@ -74,6 +85,30 @@ def test_scene_to_svg_exporter_render_pixmap_items(view):
     assert element.get('opacity') == '1.0'
 
 
+def test_scene_to_svg_exporter_render_in_z_order(view):
+    for z in (3, -1, 2):
+        item = BeeTextItem(f'z{z}')
+        item.setZValue(z)
+        view.scene.addItem(item)
+
+    exporter = SceneToSVGExporter(view.scene)
+    exporter.size = QtCore.QSize(200, 400)
+    svg = render_svg(exporter)
+    assert [element.text for element in svg] == ['z-1', 'z2', 'z3']
+
+
+def test_scene_to_svg_exporter_computes_bounding_rect_once(view):
+    item = BeeTextItem('foo')
+    view.scene.addItem(item)
+
+    with patch.object(view.scene, 'itemsBoundingRect',
+                      wraps=view.scene.itemsBoundingRect) as rect_mock:
+        exporter = SceneToSVGExporter(view.scene)
+        exporter.size = QtCore.QSize(200, 400)
+        render_svg(exporter)
+        rect_mock.assert_called_once_with()
+
+
 def test_scene_to_svg_exporter_render_pixmap_with_crop(view):
     item = BeePixmapItem(
         QtGui.QImage(100, 110, QtGui.QImage.Format.Format_RGB32))
@@ -83,12 +118,12 @@ def test_scene_to_svg_exporter_render_pixmap_with_crop(view):
     exporter = SceneToSVGExporter(view.scene)
     exporter.size = QtCore.QSize(200, 400)
     exporter.margin = 5
-    svg = exporter.render_to_svg()
+    svg = render_svg(exporter)
 
     assert len(svg) == 1
 
     element = svg[0]
-    assert element.tag == 'image'
+    assert element.tag == f'{SVG}image'
     assert element.get('width') == '30.0'
     assert element.get('height') == '33.0'
     assert element.get('transform') == 'rotate(0.0 -15.0 -20.0)'
@@ -105,12 +140,12 @@ def test_scene_to_svg_exporter_render_pixmap_with_rotation(view):
     exporter = SceneToSVGExporter(view.scene)
     exporter.size = QtCore.QSize(200, 400)
     exporter.margin = 5
-    svg = exporter.render_to_svg()
+    svg = render_svg(exporter)
 
     assert len(svg) == 1
 
     element = svg[0]
-    assert element.tag == 'image'
+    assert element.tag == f'{SVG}image'
     assert element.get('transform') == 'rotate(90.0 115.0 5.0)'
     assert element.get('x') == '115.0'
     assert element.get('y') == '5.0'
@@ -125,12 +160,12 @@ def test_scene_to_svg_exporter_render_pixmap_with_opacity(view):
     exporter = SceneToSVGExporter(view.scene)
     exporter.size = QtCore.QSize(200, 400)
     exporter.margin = 5
-    svg = exporter.render_to_svg()
+    svg = render_svg(exporter)
 
     assert len(svg) == 1
 
     element = svg[0]
-    assert element.tag == 'image'
+    assert element.tag == f'{SVG}image'
     assert element.get('opacity') == '0.75'
 
 
@@ -143,12 +178,12 @@ def test_scene_to_svg_exporter_render_pixmap_with_flip(view):
     exporter = SceneToSVGExporter(view.scene)
     exporter.size = QtCore.QSize(200, 400)
     exporter.margin = 5
-    svg = exporter.render_to_svg()
+    svg = render_svg(exporter)
 
     assert len(svg) == 1
 
     element = svg[0]
-    assert element.tag == 'image'
+    assert element.tag == f'{SVG}image'
     assert element.get('transform') == (
         'translate(105.0 5.0) scale(-1.0 1)'
         ' translate(-105.0 -5.0) rotate(0.0 105.0 5.0)')
@@ -163,12 +198,12 @@ def test_scene_to_svg_exporter_render_text(view):
     exporter = SceneToSVGExporter(view.scene)
     exporter.size = QtCore.QSize(200, 400)
     exporter.margin = 5
-    svg = exporter.render_to_svg()
+    svg = render_svg(exporter)
 
     assert len(svg) == 1
 
     element = svg[0]
-    assert element.tag == 'text'
+    assert element.tag == f'{SVG}text'
     assert element.text == 'foo'
     assert element.get('dominant-baseline') == 'hanging'
     assert 'font-family' in element.get('style')
@@ -177,6 +212,30 @@ def test_scene_to_svg_exporter_render_text(view):
     assert element.get('y') == '5.0'
 
 
+def test_scene_to_svg_exporter_render_text_styles_per_font(view):
+    item1 = BeeTextItem('foo')
+    view.scene.addItem(item1)
+    item2 = BeeTextItem('bar')
+    view.scene.addItem(item2)
+    item3 = BeeTextItem('baz')
+    item3.setScale(2)
+    view.scene.addItem(item3)
+    item4 = BeeTextItem('qux')
+    font = item4.font()
+    font.setItalic(True)
+    item4.setFont(font)
+    view.scene.addItem(item4)
+
+    exporter = SceneToSVGExporter(view.scene)
+    styles = [exporter._get_textstyles(item)
+              for item in (item1, item2, item3, item4)]
+    assert styles[0] is styles[1]
+    assert styles[0] != styles[2]
+    assert 'font-style:italic' in styles[3]
+    assert 'font-style:normal' in styles[0]
+    assert len(exporter._textstyles_cache) == 3
+
+
 def test_scene_to_svg_exporter_export_when_file_not_writeable(view, tmpdir):
     filename = os.path.join(tmpdir, 'foo.svg')
     with open(filename, 'w') as f:
@@ -201,22 +260,22 @@ def test_scene_to_svg_exporter_render_with_worker(view):
     exporter.margin = 5
 
     worker = MagicMock(canceled=False)
-    svg = exporter.render_to_svg(worker=worker)
+    svg = render_svg(exporter, worker=worker)
     assert len(svg) == 1
     worker.progress.emit.assert_called_once_with(0)
 
 
 def test_scene_to_svg_exporter_render_with_worker_canceled(view):
-    item = BeeTextItem('foo')
-    item.setPos(QtCore.QPointF(20, 30))
-    view.scene.addItem(item)
+    for text in ('foo', 'bar'):
+        view.scene.addItem(BeeTextItem(text))
     exporter = SceneToSVGExporter(view.scene)
     exporter.size = QtCore.QSize(200, 400)
     exporter.margin = 5
 
     worker = MagicMock(canceled=True)
-    svg = exporter.render_to_svg(worker=worker)
-    assert svg is None
+    svg = render_svg(exporter, worker=worker)
+    assert len(svg) == 1
+    worker.progress.emit.assert_called_once_with(0)
 
 
 def test_scene_to_svg_exporter_export_writes_svg(view, tmpdir):
@@ -281,3 +340,134 @@ def test_scene_to_svg_exporter_export_when_file_not_writeable_with_worker(
     args = worker.finished.emit.call_args.args
     assert args[0] == filename
     assert len(args[1]) == 1
+
+
+def test_scene_to_svg_exporter_export_emits_progress_in_batches(
+        view, tmpdir):
+    filename = os.path.join(tmpdir, 'foo.svg')
+    for i in range(10):
+        view.scene.addItem(BeeTextItem(f'foo{i}'))
+    exporter = SceneToSVGExporter(view.scene)
+    exporter.size = QtCore.QSize(100, 120)
+    worker = MagicMock(canceled=False)
+    with patch.object(SceneToSVGExporter, 'PROGRESS_GRANULARITY', 3):
+        with patch('beeref.fileio.progress.time.monotonic', return_value=0):
+            exporter.export(filename, worker)
+
+    worker.begin_processing.emit.assert_called_once_with(10)
+    assert [c.args[0] for c in worker.progress.emit.call_args_list] == [
+        0, 3, 6, 9]
+    worker.finished.emit.assert_called_once_with(filename, [])
+
+
+def test_scene_to_svg_exporter_export_escapes_text(view, tmpdir):
+    filename = os.path.join(tmpdir, 'foo.svg')
+    item = BeeTextItem('foo & <bar>')
+    view.scene.addItem(item)
+    exporter = SceneToSVGExporter(view.scene)
+    exporter.size = QtCore.QSize(100, 120)
+    exporter.export(filename)
+
+    svg = ET.parse(filename).getroot()
+    assert svg.find(f'{SVG}text').text == 'foo & <bar>'
+
+
+def test_scene_to_svg_exporter_export_writes_image_data(view, tmpdir):
+    filename = os.path.join(tmpdir, 'foo.svg')
+    item = BeePixmapItem(
+        QtGui.QImage(100, 110, QtGui.QImage.Format.Format_RGB32))
+    view.scene.addItem(item)
+    exporter = SceneToSVGExporter(view.scene)
+    exporter.size = QtCore.QSize(100, 120)
+    exporter.export(filename)
+
+    svg = ET.parse(filename).getroot()
+    prefix = 'data:image/png;base64,'
+    href = svg[0].get(XLINK_HREF)
+    assert href.startswith(prefix)
+    img = QtGui.QImage.fromData(base64.b64decode(href[len(prefix):]))
+    assert img.size() == QtCore.QSize(100, 110)
+    assert svg[0].get('width') == '100.0'
+
+
+@pytest.mark.parametrize('data', [b'', b'a', b'ab', b'abc', bytes(range(256))])
+def test_write_base64(data):
+    f = io.StringIO()
+    write_base64(f, data, chunk_size=3)
+    assert f.getvalue() == base64.b64encode(data).decode('ascii')
+
+
+def test_scene_to_svg_exporter_export_indents_elements(view, tmpdir):
+    filename = os.path.join(tmpdir, 'foo.svg')
+    view.scene.addItem(BeeTextItem('foo\nbar'))
+    view.scene.addItem(BeePixmapItem(
+        QtGui.QImage(10, 10, QtGui.QImage.Format.Format_RGB32)))
+    exporter = SceneToSVGExporter(view.scene)
+    exporter.size = QtCore.QSize(100, 120)
+    exporter.export(filename)
+
+    with open(filename, encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    assert lines[0].startswith('<?xml')
+    assert lines[1].startswith('<svg ')
+    assert lines[2].startswith('  <text ')
+    assert lines[3] == 'bar</text>'
+    assert lines[4].startswith('  <image ')
+    assert lines[4].endswith(' />')
+    assert lines[5] == '</svg>'
+
+
+def test_scene_to_svg_exporter_export_canceled_removes_file(view, tmpdir):
+    filename = os.path.join(tmpdir, 'foo.svg')
+    item = BeeTextItem('foo')
+    view.scene.addItem(item)
+    exporter = SceneToSVGExporter(view.scene)
+    exporter.size = QtCore.QSize(100, 120)
+    worker = MagicMock(canceled=True)
+    exporter.export(filename, worker)
+    assert os.path.exists(filename) is False
+
+
+def test_scene_to_svg_exporter_export_canceled_keeps_existing_file(
+        view, tmpdir):
+    filename = os.path.join(tmpdir, 'foo.svg')
+    with open(filename, 'w') as f:
+        f.write('foo')
+    view.scene.addItem(BeeTextItem('foo'))
+    exporter = SceneToSVGExporter(view.scene)
+    exporter.size = QtCore.QSize(100, 120)
+    worker = MagicMock(canceled=True)
+    exporter.export(filename, worker)
+    with open(filename) as f:
+        assert f.read() == 'foo'
+    assert os.listdir(tmpdir) == ['foo.svg']
+
+
+def test_scene_to_svg_exporter_export_error_keeps_existing_file(
+        view, tmpdir):
+    filename = os.path.join(tmpdir, 'foo.svg')
+    with open(filename, 'w') as f:
+        f.write('foo')
+    view.scene.addItem(BeeTextItem('foo'))
+    exporter = SceneToSVGExporter(view.scene)
+    exporter.size = QtCore.QSize(100, 120)
+    with patch.object(exporter, '_render_element', side_effect=ValueError):
+        with pytest.raises(ValueError):
+            exporter.export(filename)
+    with open(filename) as f:
+        assert f.read() == 'foo'
+    assert os.listdir(tmpdir) == ['foo.svg']
+
+
+def test_scene_to_svg_exporter_export_keeps_file_mode(view, tmpdir):
+    filename = os.path.join(tmpdir, 'foo.svg')
+    with open(filename, 'w') as f:
+        f.write('foo')
+    os.chmod(filename, 0o640)
+    view.scene.addItem(BeeTextItem('foo'))
+    exporter = SceneToSVGExporter(view.scene)
+    exporter.size = QtCore.QSize(100, 120)
+    exporter.export(filename)
+    assert stat.S_IMODE(os.stat(filename).st_mode) == 0o640
+    with open(filename, 'rb') as f:
+        assert f.read().startswith(b'<?xml')
@@ -5,11 +5,14 @@ from unittest.mock import patch
 import httpretty
 import pytest
 
-import plum
-
 from PyQt6 import QtCore, QtGui
 
-from beeref.fileio.image import exif_rotated_image, load_image
+from beeref.fileio.image import (
+    exif_rotated_image,
+    exif_rotated_image_from_data,
+    FirstImageSourceParser,
+    load_image,
+)
 
 
 def test_exif_rotated_image_without_path(qapp):
@@ -22,20 +25,6 @@ def test_exif_rotated_image_not_a_file(qapp):
     assert img.isNull() is True
 
 
-def test_exif_rotated_image_exif_unpack_error(qapp, imgfilename3x3):
-    with patch('beeref.fileio.image.exif.Image',
-               side_effect=plum.exceptions.UnpackError()):
-        img = exif_rotated_image(imgfilename3x3)
-        assert img.isNull() is False
-
-
-def test_exif_rotated_image_exif_notimplementederror(qapp, imgfilename3x3):
-    with patch('beeref.fileio.image.exif.Image.list_all',
-               side_effect=NotImplementedError()):
-        img = exif_rotated_image(imgfilename3x3)
-        assert img.isNull() is False
-
-
 @pytest.mark.parametrize('path,expected',
                          [('test3x3.png', 'test3x3.png'),
                           ('test3x3_orientation1.jpg', 'test3x3.jpg'),
@@ -66,6 +55,22 @@ def test_exif_rotated_image(path, expected, qapp):
             assert math.sqrt(sum(diff)) < 3
 
 
+def test_exif_rotated_image_from_data(qapp):
+    root = os.path.join(os.path.dirname(__file__), '..', 'assets')
+    with open(os.path.join(root, 'test3x3_orientation6.jpg'), 'rb') as f:
+        data = f.read()
+    img = exif_rotated_image_from_data(data)
+    expected = exif_rotated_image(
+        os.path.join(root, 'test3x3_orientation6.jpg'))
+    assert img.isNull() is False
+    assert img == expected
+
+
+def test_exif_rotated_image_from_data_invalid(qapp):
+    img = exif_rotated_image_from_data(b'foo')
+    assert img.isNull() is True
+
+
 def test_load_image_loads_from_filename(view, imgfilename3x3):
     img, filename = load_image(imgfilename3x3)
     assert img.isNull() is False
@@ -93,7 +98,9 @@ def test_load_image_loads_from_existing_web_url(view, imgdata3x3):
         url,
         body=imgdata3x3,
     )
-    img, filename = load_image(QtCore.QUrl(url))
+    with patch('beeref.fileio.image.exif_rotated_image') as rotated_mock:
+        img, filename = load_image(QtCore.QUrl(url))
+        rotated_mock.assert_called_once_with()
     assert img.isNull() is False
     assert filename == url
 
@@ -184,3 +191,16 @@ def test_load_image_from_pinterest_when_url_errors(view, imgdata3x3):
     )
     img, filename = load_image(QtCore.QUrl(url))
     assert img.isNull() is True
+
+
+@pytest.mark.parametrize('html,expected',
+                         [('<p><IMG SRC="foo.png"><img src="bar.png"></p>',
+                           'foo.png'),
+                          ('<img alt="foo"><img src="bar.png">', 'bar.png'),
+                          ('<p>no image</p>', None),
+                          ('<img src=foo.png>', 'foo.png')])
+def test_first_image_source_parser(html, expected):
+    parser = FirstImageSourceParser()
+    parser.feed(html)
+    parser.close()
+    assert parser.src == expected
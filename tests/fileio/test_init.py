@@ -1,8 +1,9 @@
 import os.path
 import tempfile
+import threading
 from unittest.mock import MagicMock, patch
 
-from PyQt6 import QtCore
+from PyQt6 import QtCore, QtGui
 
 from beeref import fileio
 from beeref import commands
@@ -84,3 +85,112 @@ def test_load_images_error(view, imgfilename3x3):
     assert cmd.scene == view.scene
     assert cmd.ignore_first_redo is True
     assert item.pos() == QtCore.QPointF(3.5, 4.5)
+
+
+def test_load_images_keeps_order(view, imgfilename3x3):
+    view.scene.undo_stack = MagicMock()
+    worker = MagicMock(canceled=False)
+    fileio.load_images([imgfilename3x3, 'foo.jpg', imgfilename3x3, 'bar.jpg'],
+                       QtCore.QPointF(5, 6), view.scene, worker)
+    worker.progress.emit.assert_any_call(0)
+    worker.progress.emit.assert_called_with(3)
+    worker.finished.emit.assert_called_once_with(
+        '', ['foo.jpg', 'bar.jpg'])
+    itemdata = queue2list(view.scene.items_to_add)
+    assert len(itemdata) == 2
+    args = view.scene.undo_stack.push.call_args_list[0][0]
+    assert args[0].items == [data[0]['item'] for data in itemdata]
+
+
+@patch('beeref.fileio.load_image')
+def test_load_images_loads_in_parallel(load_mock, view, imgfilename3x3):
+    barrier = threading.Barrier(2, timeout=5)
+
+    def load(filename):
+        # Both files need to be loading at the same time to get past
+        # the barrier
+        barrier.wait()
+        return (QtGui.QImage(imgfilename3x3), filename)
+
+    load_mock.side_effect = load
+    view.scene.undo_stack = MagicMock()
+    worker = MagicMock(canceled=False)
+    with patch('beeref.fileio.os.cpu_count', return_value=2):
+        fileio.load_images(['foo.jpg', 'bar.jpg'],
+                           QtCore.QPointF(5, 6), view.scene, worker)
+    worker.finished.emit.assert_called_once_with('', [])
+    assert len(queue2list(view.scene.items_to_add)) == 2
+
+
+@patch('beeref.fileio.load_image')
+def test_load_images_limits_images_loaded_ahead(
+        load_mock, view, imgfilename3x3):
+    loaded = []
+
+    def load(filename):
+        loaded.append(filename)
+        return (QtGui.QImage(imgfilename3x3), filename)
+
+    load_mock.side_effect = load
+    loaded_when_added = []
+    view.scene.undo_stack = MagicMock()
+    view.scene.add_item_later = MagicMock(
+        side_effect=lambda *args, **kwargs: loaded_when_added.append(
+            len(loaded)))
+    worker = MagicMock(canceled=False)
+    with patch('beeref.fileio.os.cpu_count', return_value=1):
+        fileio.load_images([f'{i}.png' for i in range(8)],
+                           QtCore.QPointF(5, 6), view.scene, worker)
+    assert len(loaded_when_added) == 8
+    # Lookahead of 2 plus the one submitted for the current image
+    assert loaded_when_added[0] <= 3
+
+
+def test_load_images_converts_to_pixmap_format(view, imgfilename3x3):
+    view.scene.undo_stack = MagicMock()
+    worker = MagicMock(canceled=False)
+    with patch('beeref.fileio.BeePixmapItem') as item_mock:
+        fileio.load_images([imgfilename3x3],
+                           QtCore.QPointF(5, 6), view.scene, worker)
+    img = item_mock.call_args[0][0]
+    assert img.format() == QtGui.QImage.Format.Format_RGB32
+
+
+@patch('beeref.fileio.load_image')
+def test_load_images_converts_to_premultiplied(load_mock, view):
+    img = QtGui.QImage(10, 10, QtGui.QImage.Format.Format_ARGB32)
+    load_mock.return_value = (img, 'foo.png')
+    view.scene.undo_stack = MagicMock()
+    worker = MagicMock(canceled=False)
+    with patch('beeref.fileio.BeePixmapItem') as item_mock:
+        fileio.load_images(['foo.png'],
+                           QtCore.QPointF(5, 6), view.scene, worker)
+    img = item_mock.call_args[0][0]
+    assert img.format() == QtGui.QImage.Format.Format_ARGB32_Premultiplied
+
+
+def test_threaded_io_wait_for_main_thread_blocks(qapp):
+    worker = fileio.ThreadedIO(lambda worker: None)
+    worker.pending = QtCore.QSemaphore(1)
+    worker.wait_for_main_thread()
+    assert worker.pending.tryAcquire(1, 0) is False
+
+
+def test_threaded_io_progress_releases(qapp):
+    worker = fileio.ThreadedIO(lambda worker: None)
+    for i in range(worker.MAX_PENDING):
+        worker.wait_for_main_thread()
+    assert worker.pending.available() == 0
+    worker.progress.emit(0)
+    assert worker.pending.available() == 1
+
+
+def test_threaded_io_load_images_more_than_max_pending(view, imgfilename3x3):
+    view.scene.undo_stack = MagicMock()
+    filenames = [imgfilename3x3] * 3
+    worker = fileio.ThreadedIO(
+        fileio.load_images, filenames, QtCore.QPointF(5, 6), view.scene)
+    worker.MAX_PENDING = 1
+    worker.pending = QtCore.QSemaphore(1)
+    worker.run()
+    assert len(queue2list(view.scene.items_to_add)) == 3
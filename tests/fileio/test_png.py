@@ -0,0 +1,76 @@
+import io
+
+from PyQt6 import QtGui
+import pytest
+
+from beeref.fileio.png import PNGStreamWriter
+
+
+def make_image(width, height, color):
+    img = QtGui.QImage(width, height, QtGui.QImage.Format.Format_RGB32)
+    img.fill(QtGui.QColor(*color))
+    return img
+
+
+def test_png_stream_writer_writes_strips(qapp):
+    f = io.BytesIO()
+    writer = PNGStreamWriter(f, 5, 7)
+    writer.write_image(make_image(5, 3, (10, 20, 30)))
+    writer.write_image(make_image(5, 4, (40, 50, 60)))
+    writer.close()
+
+    data = f.getvalue()
+    assert data.startswith(b'\x89PNG')
+    img = QtGui.QImage.fromData(data)
+    assert img.width() == 5
+    assert img.height() == 7
+    assert img.pixelColor(4, 2) == QtGui.QColor(10, 20, 30)
+    assert img.pixelColor(4, 3) == QtGui.QColor(40, 50, 60)
+
+
+def test_png_stream_writer_rows_with_padding(qapp):
+    # RGB rows of odd widths get padded by Qt
+    f = io.BytesIO()
+    writer = PNGStreamWriter(f, 3, 2)
+    img = make_image(3, 2, (1, 2, 3))
+    img.setPixelColor(2, 1, QtGui.QColor(200, 100, 0))
+    writer.write_image(img)
+    writer.close()
+
+    result = QtGui.QImage.fromData(f.getvalue())
+    assert result.pixelColor(0, 0) == QtGui.QColor(1, 2, 3)
+    assert result.pixelColor(2, 1) == QtGui.QColor(200, 100, 0)
+
+
+def test_png_stream_writer_writes_partial_image(qapp):
+    f = io.BytesIO()
+    writer = PNGStreamWriter(f, 4, 3)
+    writer.write_image(make_image(4, 2, (10, 20, 30)))
+    img = make_image(4, 2, (40, 50, 60))
+    img.setPixelColor(0, 1, QtGui.QColor(255, 0, 0))
+    writer.write_image(img, 1)
+    writer.close()
+
+    result = QtGui.QImage.fromData(f.getvalue())
+    assert result.height() == 3
+    assert result.pixelColor(0, 2) == QtGui.QColor(40, 50, 60)
+
+
+def test_png_stream_writer_raises_when_width_doesnt_match(qapp):
+    writer = PNGStreamWriter(io.BytesIO(), 4, 3)
+    with pytest.raises(ValueError):
+        writer.write_image(make_image(5, 3, (10, 20, 30)))
+
+
+def test_png_stream_writer_raises_when_too_many_rows(qapp):
+    writer = PNGStreamWriter(io.BytesIO(), 4, 3)
+    writer.write_image(make_image(4, 2, (10, 20, 30)))
+    with pytest.raises(ValueError):
+        writer.write_image(make_image(4, 2, (10, 20, 30)))
+
+
+def test_png_stream_writer_raises_when_closed_too_early(qapp):
+    writer = PNGStreamWriter(io.BytesIO(), 4, 3)
+    writer.write_image(make_image(4, 2, (10, 20, 30)))
+    with pytest.raises(ValueError):
+        writer.close()
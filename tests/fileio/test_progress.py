@@ -0,0 +1,44 @@
+from unittest.mock import MagicMock, patch
+
+from beeref.fileio.progress import BatchedProgress
+
+
+def emitted(worker):
+    return [c.args[0] for c in worker.progress.emit.call_args_list]
+
+
+def test_batched_progress_emits_first_last_and_batches():
+    worker = MagicMock()
+    progress = BatchedProgress(worker, 20, batch_size=8, interval=100)
+    for i in range(20):
+        progress.update(i)
+    assert emitted(worker) == [0, 8, 16, 19]
+
+
+def test_batched_progress_returns_whether_emitted():
+    worker = MagicMock()
+    progress = BatchedProgress(worker, 20, batch_size=8, interval=100)
+    assert progress.update(0) is True
+    assert progress.update(1) is False
+
+
+def test_batched_progress_force():
+    worker = MagicMock()
+    progress = BatchedProgress(worker, 20, batch_size=8, interval=100)
+    progress.update(0)
+    progress.update(1)
+    progress.update(2, force=True)
+    assert emitted(worker) == [0, 2]
+
+
+@patch('beeref.fileio.progress.time.monotonic')
+def test_batched_progress_emits_after_interval(monotonic_mock):
+    monotonic_mock.return_value = 10
+    worker = MagicMock()
+    progress = BatchedProgress(worker, 20, batch_size=8, interval=0.05)
+    progress.update(0)
+    progress.update(1)
+    monotonic_mock.return_value = 10.1
+    progress.update(2)
+    progress.update(3)
+    assert emitted(worker) == [0, 2]
@@ -1,6 +1,7 @@
 import json
 import os
 import os.path
+import sqlite3
 import stat
 from unittest.mock import MagicMock, patch
 
@@ -9,18 +10,37 @@ import pytest
 
 from beeref.fileio import schema, is_bee_file
 from beeref.fileio.errors import BeeFileIOError
-from beeref.fileio.sql import SQLiteIO
+from beeref.fileio.sql import SQLiteIO, copy_file, _SQL_SELECT_ITEMS
 from beeref.items import BeePixmapItem, BeeTextItem, BeeErrorItem
 
 
 @pytest.mark.parametrize('filename,expected',
                          [(os.path.join('foo', 'bar.bee'), True),
+                          (os.path.join('foo', 'bar.BEE'), True),
                           (os.path.join('foo', 'bar.png'), False),
                           (os.path.join('foo', 'bar'), False)])
 def test_is_bee_file(filename, expected):
     assert is_bee_file(filename) is expected
 
 
+def test_copy_file(tmpfile):
+    with open(tmpfile, 'wb') as f:
+        f.write(b'foobar')
+    copy_file(tmpfile, f'{tmpfile}-copy')
+    with open(f'{tmpfile}-copy', 'rb') as f:
+        assert f.read() == b'foobar'
+
+
+@patch('beeref.fileio.sql.fcntl')
+def test_copy_file_when_cloning_fails(fcntl_mock, tmpfile):
+    fcntl_mock.ioctl.side_effect = OSError
+    with open(tmpfile, 'wb') as f:
+        f.write(b'foobar')
+    copy_file(tmpfile, f'{tmpfile}-copy')
+    with open(f'{tmpfile}-copy', 'rb') as f:
+        assert f.read() == b'foobar'
+
+
 def test_sqliteio_migrate_does_nothing_when_version_ok(tmpfile):
     io = SQLiteIO(tmpfile, MagicMock(), create_new=True)
     io.ex('PRAGMA user_version=%s' % schema.USER_VERSION)
@@ -71,6 +91,31 @@ def test_sqliteio_migrate_migrates_when_file_not_writable(tmpfile):
     assert os.path.exists(newdir) is False
 
 
+@patch('beeref.fileio.sql.USER_VERSION', 2)
+@patch('beeref.fileio.sql.MIGRATIONS', {2: ['foobar']})
+def test_sqliteio_migrate_closes_connection_when_migration_fails(tmpfile):
+    io = SQLiteIO(tmpfile, MagicMock(), create_new=True)
+    io.ex('PRAGMA user_version=1')
+    io.connection.commit()
+    del io
+    connect = sqlite3.connect
+    connections = []
+
+    def connect_side_effect(*args, **kwargs):
+        connections.append(connect(*args, **kwargs))
+        return connections[-1]
+
+    with patch('beeref.fileio.sql.sqlite3.connect',
+               side_effect=connect_side_effect):
+        io = SQLiteIO(tmpfile, MagicMock())
+        io.connection
+    assert len(connections) == 2
+    with pytest.raises(sqlite3.ProgrammingError):
+        connections[0].execute('SELECT 1')
+    assert io.create_new is True
+    assert io.connection is connections[1]
+
+
 def test_all_migrations(tmpfile):
     io = SQLiteIO(tmpfile, MagicMock(), create_new=True)
 
@@ -120,6 +165,50 @@ def test_all_migrations(tmpfile):
     assert result[3] == b'bla'
 
 
+def test_sqliteio_configures_connection(tmpfile):
+    io = SQLiteIO(tmpfile, MagicMock(), create_new=True)
+    assert io.fetchone('PRAGMA cache_size')[0] == -65536
+    assert io.fetchone('PRAGMA temp_store')[0] == 2
+    assert io.fetchone('PRAGMA journal_mode')[0] == 'delete'
+
+
+def test_sqliteio_sets_page_size_on_new_file(tmpfile, view):
+    view.scene.addItem(BeeTextItem('foo'))
+    io = SQLiteIO(tmpfile, view.scene, create_new=True)
+    io.write()
+    assert io.fetchone('PRAGMA page_size')[0] == 8192
+
+
+def test_sqliteio_configures_readonly_connection(tmpfile):
+    io = SQLiteIO(tmpfile, MagicMock(), create_new=True)
+    io.create_schema_on_new()
+    io.connection.commit()
+    io._close_connection()
+
+    io = SQLiteIO(tmpfile, MagicMock(), readonly=True)
+    assert io.fetchone('PRAGMA cache_size')[0] == -65536
+    assert io.fetchone('PRAGMA journal_mode')[0] == 'delete'
+
+
+def test_sqliteio_close_connection_reconnects_on_next_use(tmpfile):
+    io = SQLiteIO(tmpfile, MagicMock(), create_new=True)
+    connection = io.connection
+    io._close_connection()
+    assert io._connection is None
+    assert io._cursor is None
+    assert io.connection is not connection
+    assert io.fetchone('SELECT 1') == (1,)
+
+
+def test_sqliteio_connection_caches_statements(tmpfile):
+    io = SQLiteIO(tmpfile, MagicMock(), create_new=True)
+    with patch('beeref.fileio.sql.sqlite3.connect',
+               wraps=sqlite3.connect) as connect_mock:
+        io.connection
+    connect_mock.assert_called_once()
+    assert connect_mock.call_args.kwargs['cached_statements'] == 256
+
+
 def test_sqliteio_write_meta_application_id(tmpfile):
     io = SQLiteIO(tmpfile, MagicMock(), create_new=True)
     io.write_meta()
@@ -294,6 +383,54 @@ def test_sqliteio_write_inserts_new_pixmap_item_without_filename(
     assert result[1] == '0001.png'
 
 
+@patch('beeref.fileio.sql.SQLiteIO.INSERT_BATCH_SIZE', 2)
+def test_sqliteio_write_inserts_new_items_in_batches(tmpfile, view):
+    items = []
+    for i in range(5):
+        item = BeePixmapItem(QtGui.QImage(), filename=f'bee{i}.png')
+        item.pixmap_to_bytes = MagicMock(return_value=(b'abc', 'png'))
+        view.scene.addItem(item)
+        items.append(item)
+    io = SQLiteIO(tmpfile, view.scene, create_new=True)
+    io.write()
+
+    assert sorted(item.save_id for item in items) == [1, 2, 3, 4, 5]
+    result = io.fetchall(
+        'SELECT items.id, sqlar.name FROM items '
+        'INNER JOIN sqlar on sqlar.item_id = items.id ORDER BY items.id')
+    assert result == [
+        (item.save_id, f'{item.save_id:04}-bee{i}.png')
+        for i, item in sorted(enumerate(items), key=lambda x: x[1].save_id)]
+
+
+@patch('beeref.fileio.sql.SQLiteIO.BLOB_CHUNK_SIZE', 2)
+def test_sqliteio_write_inserts_pixmap_data_in_chunks(tmpfile, view):
+    item = BeePixmapItem(QtGui.QImage(), filename='bee.png')
+    item.pixmap_to_bytes = MagicMock(return_value=(b'abcde', 'png'))
+    view.scene.addItem(item)
+    io = SQLiteIO(tmpfile, view.scene, create_new=True)
+    io.write()
+    assert io.fetchone('SELECT sz, data FROM sqlar') == (5, b'abcde')
+
+
+def test_sqliteio_write_inserts_new_items_after_existing(tmpfile, view):
+    item1 = BeeTextItem(text='foo')
+    view.scene.addItem(item1)
+    item2 = BeeTextItem(text='bar')
+    view.scene.addItem(item2)
+    io = SQLiteIO(tmpfile, view.scene, create_new=True)
+    io.write()
+    removed_id = min(item1.save_id, item2.save_id)
+    view.scene.removeItem(item1 if item1.save_id == removed_id else item2)
+
+    item3 = BeeTextItem(text='baz')
+    view.scene.addItem(item3)
+    io.create_new = False
+    io.write()
+    assert item3.save_id == 3
+    assert io.fetchone('SELECT COUNT(*) FROM items') == (2,)
+
+
 def test_sqliteio_write_updates_existing_text_item(tmpfile, view):
     item = BeeTextItem(text='foo bar')
     view.scene.addItem(item)
@@ -330,6 +467,47 @@ def test_sqliteio_write_updates_existing_text_item(tmpfile, view):
     assert result[7] is None
 
 
+def test_sqliteio_write_skips_unchanged_items(tmpfile, view):
+    item1 = BeeTextItem(text='foo')
+    view.scene.addItem(item1)
+    item2 = BeeTextItem(text='bar')
+    view.scene.addItem(item2)
+    io = SQLiteIO(tmpfile, view.scene, create_new=True)
+    io.write()
+    io.ex('UPDATE items SET x=99')
+    io.connection.commit()
+
+    item2.setPos(20, 30)
+    io = SQLiteIO(tmpfile, view.scene, create_new=False)
+    io.write()
+
+    assert io.fetchone('SELECT COUNT(*) from items') == (2,)
+    assert io.fetchone(
+        'SELECT x FROM items WHERE id=?', (item1.save_id,)) == (99,)
+    assert io.fetchone(
+        'SELECT x FROM items WHERE id=?', (item2.save_id,)) == (20,)
+
+
+def test_sqliteio_write_skips_items_unchanged_since_read(tmpfile, view):
+    io = SQLiteIO(tmpfile, view.scene, create_new=True)
+    io.create_schema_on_new()
+    io.ex('INSERT INTO items '
+          '(type, x, y, z, scale, rotation, flip, data) '
+          'VALUES (?, ?, ?, ?, ?, ?, ?, ?) ',
+          ('text', 22.2, 33.3, 0.22, 3.4, 45, 1,
+           json.dumps({'text': 'foo bar'})))
+    io.connection.commit()
+    del io
+
+    io = SQLiteIO(tmpfile, view.scene, readonly=True)
+    io.read()
+    view.scene.add_queued_items()
+    io = SQLiteIO(tmpfile, view.scene, create_new=False)
+    with patch.object(io, 'update_items') as update_mock:
+        io.write()
+    update_mock.assert_called_once_with([])
+
+
 def test_sqliteio_write_updates_existing_pixmap_item(tmpfile, view):
     item = BeePixmapItem(QtGui.QImage(), filename='bee.png')
     view.scene.addItem(item)
@@ -470,6 +648,52 @@ def test_sqliteio_write_removes_nonexisting_pixmap_item(tmpfile, view):
     assert io.fetchone('SELECT COUNT(*) from sqlar') == (0,)
 
 
+def test_sqliteio_write_leaves_single_file(tmpfile, view):
+    view.scene.addItem(BeeTextItem('foo'))
+    io = SQLiteIO(tmpfile, view.scene, create_new=True)
+    io.write()
+    assert io.fetchone('PRAGMA journal_mode')[0] == 'delete'
+    assert os.path.exists(tmpfile) is True
+    assert os.path.exists(f'{tmpfile}-wal') is False
+
+
+def test_sqliteio_write_vacuums_when_many_pages_unused(tmpfile, view):
+    io = SQLiteIO(tmpfile, view.scene, create_new=True)
+    with patch.object(io, 'fetchone', side_effect=[(100,), (30,)]):
+        with patch.object(io, 'ex') as ex_mock:
+            io.vacuum_if_needed()
+    ex_mock.assert_called_once_with('VACUUM')
+
+
+def test_sqliteio_write_doesnt_vacuum_when_few_pages_unused(tmpfile, view):
+    io = SQLiteIO(tmpfile, view.scene, create_new=True)
+    with patch.object(io, 'fetchone', side_effect=[(100,), (10,)]):
+        with patch.object(io, 'ex') as ex_mock:
+            io.vacuum_if_needed()
+    ex_mock.assert_not_called()
+
+
+@patch('beeref.fileio.sql.SQLiteIO.DELETE_BATCH_SIZE', 2)
+def test_sqliteio_write_removes_items_in_batches(tmpfile, view):
+    items = []
+    for i in range(5):
+        item = BeePixmapItem(QtGui.QImage(), filename=f'bee{i}.png')
+        item.pixmap_to_bytes = MagicMock(return_value=(b'abc', 'png'))
+        view.scene.addItem(item)
+        items.append(item)
+    io = SQLiteIO(tmpfile, view.scene, create_new=True)
+    io.write()
+    assert io.fetchone('SELECT COUNT(*) from sqlar') == (5,)
+
+    for item in items[1:]:
+        view.scene.removeItem(item)
+    io = SQLiteIO(tmpfile, view.scene, create_new=False)
+    io.write()
+
+    assert io.fetchall('SELECT id from items') == [(items[0].save_id,)]
+    assert io.fetchall('SELECT item_id from sqlar') == [(items[0].save_id,)]
+
+
 def test_sqliteio_write_update_recovers_from_borked_file(view, tmpfile):
     item = BeePixmapItem(QtGui.QImage(), filename='bee.png')
     item.save_id = 1
@@ -505,17 +729,20 @@ def test_sqliteio_write_updates_progress(tmpfile, view):
     worker.finished.emit.assert_called_once_with(tmpfile, [])
 
 
+@patch('beeref.fileio.sql.SQLiteIO.INSERT_BATCH_SIZE', 1)
 def test_sqliteio_write_canceled(tmpfile, view):
     worker = MagicMock(canceled=True)
     io = SQLiteIO(tmpfile, view.scene, create_new=True, worker=worker)
-    item = BeePixmapItem(QtGui.QImage())
-    view.scene.addItem(item)
-    item = BeePixmapItem(QtGui.QImage())
-    view.scene.addItem(item)
+    item1 = BeePixmapItem(QtGui.QImage())
+    view.scene.addItem(item1)
+    item2 = BeePixmapItem(QtGui.QImage())
+    view.scene.addItem(item2)
     io.write()
     worker.begin_processing.emit.assert_called_once_with(2)
     worker.progress.emit.assert_called_once_with(0)
     worker.finished.emit.assert_called_once_with(tmpfile, [])
+    assert io.fetchone('SELECT COUNT(*) FROM items')[0] == 1
+    assert [item1.save_id, item2.save_id].count(None) == 1
 
 
 def test_sqliteio_read_reads_readonly_text_item(tmpfile, view):
@@ -606,6 +833,46 @@ def test_sqliteio_read_reads_readonly_pixmap_item_error(tmpfile, view):
     assert view.scene.items_to_add.empty() is True
 
 
+def test_sqliteio_read_skips_pixmap_item_without_data(tmpfile, view):
+    io = SQLiteIO(tmpfile, view.scene, create_new=True)
+    io.create_schema_on_new()
+    io.ex('INSERT INTO items (type, data) VALUES (?, ?)',
+          ('pixmap', json.dumps({'filename': 'bee.png'})))
+    io.ex('INSERT INTO items (type, data) VALUES (?, ?)',
+          ('text', json.dumps({'text': 'foo bar'})))
+    io.connection.commit()
+    del io
+
+    io = SQLiteIO(tmpfile, view.scene, readonly=True)
+    io.read()
+    view.scene.add_queued_items()
+    assert len(view.scene.items()) == 1
+    item = view.scene.items()[0]
+    assert isinstance(item, BeeTextItem)
+    assert item.save_id == 2
+
+
+def test_sqliteio_read_query_scans_items_once(tmpfile, view):
+    io = SQLiteIO(tmpfile, view.scene, create_new=True)
+    io.create_schema_on_new()
+    plan = [row[3] for row in
+            io.fetchall(f'EXPLAIN QUERY PLAN {_SQL_SELECT_ITEMS}')]
+    assert plan[0].startswith('SCAN') and 'items' in plan[0]
+    assert plan[1].startswith('SEARCH') and 'COVERING INDEX' in plan[1]
+    assert len(plan) == 2
+
+
+def test_sqliteio_read_blob(tmpfile, view):
+    io = SQLiteIO(tmpfile, view.scene, create_new=True)
+    io.create_schema_on_new()
+    io.ex('INSERT INTO items (type) VALUES (?)', ('pixmap',))
+    io.ex('INSERT INTO sqlar (item_id, name, data) VALUES (?, ?, ?)',
+          (1, '0001.png', b'bla'))
+    io.connection.commit()
+    rowid = io.fetchone('SELECT rowid FROM sqlar')[0]
+    assert io.read_blob(rowid) == b'bla'
+
+
 def test_sqliteio_read_updates_progress(tmpfile, view):
     worker = MagicMock(canceled=False)
     io = SQLiteIO(tmpfile, view.scene, create_new=True,
@@ -624,6 +891,24 @@ def test_sqliteio_read_updates_progress(tmpfile, view):
     worker.finished.emit.assert_called_once_with(tmpfile, [])
 
 
+def test_sqliteio_read_ends_transaction_before_loading_items(
+        tmpfile, view):
+    io = SQLiteIO(tmpfile, view.scene, create_new=True)
+    io.create_schema_on_new()
+    io.ex('INSERT INTO items (type, x, y, z, scale, data) '
+          'VALUES (?, ?, ?, ?, ?, ?) ',
+          ('text', 0, 0, 0, 1, json.dumps({'text': 'foo'})))
+    io.connection.commit()
+
+    in_transaction = []
+    with patch.object(view.scene, 'add_item_later',
+                      side_effect=lambda data: in_transaction.append(
+                          io.connection.in_transaction)):
+        io.read()
+    assert in_transaction == [False]
+    assert io.connection.in_transaction is False
+
+
 def test_sqliteio_read_canceled(tmpfile, view):
     worker = MagicMock(canceled=True)
     io = SQLiteIO(tmpfile, view.scene, create_new=True, worker=worker)
@@ -2,11 +2,12 @@ from unittest.mock import patch, MagicMock
 
 from PyQt6 import QtCore, QtWidgets
 
-from beeref.items import BeeErrorItem, item_registry
+from beeref.items import BeeErrorItem, item_factories, item_registry
 
 
 def test_in_items_registry():
     assert item_registry['error'] == BeeErrorItem
+    assert item_factories['error'] == BeeErrorItem.create_from_data
 
 
 @patch('beeref.selection.SelectableMixin.init_selectable')
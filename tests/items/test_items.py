@@ -44,3 +44,16 @@ def test_sort_by_filename_deals_with_text_items(view):
     item1 = BeeTextItem('Foo')
     item2 = BeeTextItem('Bar')
     assert len(sort_by_filename([item1, item2])) == 2
+
+
+def test_sort_by_filename_orders_text_items_by_save_id(view):
+    item1 = BeeTextItem('Foo')
+    item1.save_id = 5
+    item2 = BeePixmapItem(QtGui.QImage())
+    item2.filename = 'foo.png'
+    item2.save_id = 8
+    item3 = BeeTextItem('Bar')
+    item3.save_id = 2
+    item4 = BeeTextItem('Baz')
+    result = sort_by_filename([item4, item1, item2, item3])
+    assert result == [item2, item3, item1, item4]
@@ -4,11 +4,12 @@ from unittest.mock import patch, MagicMock
 from PyQt6 import QtCore, QtGui, QtWidgets
 from PyQt6.QtCore import Qt
 
-from beeref.items import BeePixmapItem, item_registry
+from beeref.items import BeePixmapItem, item_factories, item_registry
 
 
 def test_in_item_registry():
     assert item_registry['pixmap'] == BeePixmapItem
+    assert item_factories['pixmap'] == BeePixmapItem.create_from_data
 
 
 @patch('beeref.selection.SelectableMixin.init_selectable')
@@ -62,14 +63,24 @@ def test_set_crop(qapp, item):
 def test_set_grayscale_true(qapp, item):
     item.grayscale = True
     assert item.grayscale is True
-    assert item._grayscale_pixmap is not None
+    assert '_grayscale_pixmap' not in item.__dict__
+    assert item._grayscale_pixmap.size() == item.pixmap().size()
+    assert item._grayscale_pixmap.toImage().isGrayscale() is True
 
 
 def test_set_grayscale_false(qapp, item):
     item._grayscale_pixmap = QtGui.QPixmap()
     item.grayscale = False
     assert item.grayscale is False
-    assert item._grayscale_pixmap is None
+    assert '_grayscale_pixmap' not in item.__dict__
+
+
+def test_set_pixmap_resets_grayscale_pixmap(qapp, item, imgfilename3x3):
+    item.grayscale = True
+    item._grayscale_pixmap
+    item.setPixmap(QtGui.QPixmap(imgfilename3x3))
+    assert '_grayscale_pixmap' not in item.__dict__
+    assert item._grayscale_pixmap.size() == QtCore.QSize(3, 3)
 
 
 def test_bounding_rect_unselected(qapp, imgfilename3x3):
@@ -270,6 +281,65 @@ def test_pixmap_to_bytes_apply_grayscale_crop_when_not_set(
     assert img.size() == QtCore.QSize(3, 3)
 
 
+def test_pixmap_to_bytes_cached(qapp, imgfilename3x3):
+    item = BeePixmapItem(QtGui.QImage(imgfilename3x3))
+    result = item.pixmap_to_bytes()
+    with patch('PyQt6.QtGui.QImage.save') as save_mock:
+        assert item.pixmap_to_bytes() == result
+        save_mock.assert_not_called()
+
+
+def test_prepare_pixmap_bytes_only_encodes_when_called(
+        qapp, imgfilename3x3):
+    item = BeePixmapItem(QtGui.QImage(imgfilename3x3))
+    item.crop = QtCore.QRectF(0, 0, 2, 2)
+    with patch('PyQt6.QtGui.QImage.save') as save_mock:
+        encode = item.prepare_pixmap_bytes(apply_crop=True)
+        save_mock.assert_not_called()
+    data, imgformat = encode()
+    assert imgformat == 'png'
+    img = QtGui.QImage.fromData(data)
+    assert img.size() == QtCore.QSize(2, 2)
+
+
+def test_pixmap_to_bytes_cache_considers_crop(qapp, imgfilename3x3):
+    item = BeePixmapItem(QtGui.QImage(imgfilename3x3))
+    data, imgformat = item.pixmap_to_bytes(apply_crop=True)
+    item.crop = QtCore.QRectF(0, 0, 2, 2)
+    data2, imgformat = item.pixmap_to_bytes(apply_crop=True)
+    assert data != data2
+    pixmap = QtGui.QPixmap()
+    pixmap.loadFromData(data2)
+    assert pixmap.size() == QtCore.QSize(2, 2)
+
+
+def test_pixmap_to_bytes_cache_considers_grayscale(qapp, imgfilename3x3):
+    item = BeePixmapItem(QtGui.QImage(imgfilename3x3))
+    item.pixmap_to_bytes(apply_grayscale=True)
+    item.grayscale = True
+    data, imgformat = item.pixmap_to_bytes(apply_grayscale=True)
+    pixmap = QtGui.QPixmap()
+    pixmap.loadFromData(data)
+    assert pixmap.toImage().allGray() is True
+
+
+def test_pixmap_to_bytes_cache_considers_format(
+        qapp, imgfilename3x3, settings):
+    item = BeePixmapItem(QtGui.QImage(imgfilename3x3))
+    assert item.pixmap_to_bytes()[1] == 'png'
+    settings.setValue('Items/image_storage_format', 'jpg')
+    assert item.pixmap_to_bytes()[1] == 'jpg'
+
+
+def test_pixmap_to_bytes_cache_considers_new_pixmap(
+        qapp, imgfilename3x3):
+    item = BeePixmapItem(QtGui.QImage(imgfilename3x3))
+    data, imgformat = item.pixmap_to_bytes()
+    item.setPixmap(QtGui.QPixmap(10, 10))
+    data2, imgformat = item.pixmap_to_bytes()
+    assert data != data2
+
+
 def test_pixmap_from_bytes(qapp, item, imgfilename3x3):
     with open(imgfilename3x3, 'rb') as f:
         imgdata = f.read()
@@ -279,6 +349,103 @@ def test_pixmap_from_bytes(qapp, item, imgfilename3x3):
     assert item.crop == QtCore.QRectF(0, 0, 3, 3)
 
 
+def test_pixmap_from_bytes_with_decoded_image(qapp, item, imgfilename3x3):
+    with open(imgfilename3x3, 'rb') as f:
+        imgdata = f.read()
+    with patch('PyQt6.QtGui.QPixmap.loadFromData') as load_mock:
+        item.pixmap_from_bytes(imgdata, QtGui.QImage.fromData(imgdata))
+        load_mock.assert_not_called()
+    assert item.width == 3
+    assert item.height == 3
+
+
+def jpg_data(filename):
+    img = QtGui.QImage(filename)
+    barray = QtCore.QByteArray()
+    buffer = QtCore.QBuffer(barray)
+    buffer.open(QtCore.QIODevice.OpenModeFlag.WriteOnly)
+    img.save(buffer, 'JPG')
+    return barray.data()
+
+
+def test_pixmap_to_bytes_returns_data_from_bytes(
+        qapp, item, imgfilename3x3, settings):
+    settings.setValue('Items/image_storage_format', 'jpg')
+    imgdata = jpg_data(imgfilename3x3)
+    item.pixmap_from_bytes(imgdata)
+    with patch('PyQt6.QtGui.QImage.save') as save_mock:
+        data, imgformat = item.pixmap_to_bytes(apply_grayscale=True,
+                                               apply_crop=True)
+        save_mock.assert_not_called()
+    assert data is imgdata
+    assert imgformat == 'jpg'
+
+
+def test_pixmap_from_bytes_doesnt_keep_png_data(qapp, item, imgfilename3x3):
+    with open(imgfilename3x3, 'rb') as f:
+        imgdata = f.read()
+    item.pixmap_from_bytes(imgdata)
+    assert item._raw_data is None
+
+
+def test_pixmap_to_bytes_from_bytes_applies_crop(
+        qapp, item, imgfilename3x3, settings):
+    settings.setValue('Items/image_storage_format', 'jpg')
+    imgdata = jpg_data(imgfilename3x3)
+    item.pixmap_from_bytes(imgdata)
+    item.crop = QtCore.QRectF(0, 0, 2, 2)
+    assert item.pixmap_to_bytes()[0] is imgdata
+    data, imgformat = item.pixmap_to_bytes(apply_crop=True)
+    pixmap = QtGui.QPixmap()
+    pixmap.loadFromData(data)
+    assert pixmap.size() == QtCore.QSize(2, 2)
+
+
+def test_pixmap_to_bytes_from_bytes_applies_grayscale(
+        qapp, item, imgfilename3x3, settings):
+    settings.setValue('Items/image_storage_format', 'jpg')
+    imgdata = jpg_data(imgfilename3x3)
+    item.pixmap_from_bytes(imgdata)
+    item.grayscale = True
+    assert item.pixmap_to_bytes()[0] is imgdata
+    data, imgformat = item.pixmap_to_bytes(apply_grayscale=True)
+    pixmap = QtGui.QPixmap()
+    pixmap.loadFromData(data)
+    assert pixmap.toImage().allGray() is True
+
+
+def test_pixmap_to_bytes_from_bytes_considers_format(
+        qapp, item, imgfilename3x3, settings):
+    imgdata = jpg_data(imgfilename3x3)
+    item.pixmap_from_bytes(imgdata)
+    settings.setValue('Items/image_storage_format', 'png')
+    data, imgformat = item.pixmap_to_bytes()
+    assert imgformat == 'png'
+    assert data.startswith(b'\x89PNG')
+
+
+def test_pixmap_to_bytes_from_bytes_after_new_pixmap(
+        qapp, item, imgfilename3x3, settings):
+    settings.setValue('Items/image_storage_format', 'jpg')
+    imgdata = jpg_data(imgfilename3x3)
+    item.pixmap_from_bytes(imgdata)
+    item.setPixmap(QtGui.QPixmap(10, 10))
+    data, imgformat = item.pixmap_to_bytes()
+    assert data is not imgdata
+
+
+def test_pixmap_from_bytes_unknown_format(qapp, item, imgfilename3x3):
+    img = QtGui.QImage(imgfilename3x3)
+    barray = QtCore.QByteArray()
+    buffer = QtCore.QBuffer(barray)
+    buffer.open(QtCore.QIODevice.OpenModeFlag.WriteOnly)
+    img.save(buffer, 'BMP')
+    item.pixmap_from_bytes(barray.data())
+    data, imgformat = item.pixmap_to_bytes()
+    assert imgformat == 'png'
+    assert data.startswith(b'\x89PNG')
+
+
 def test_has_selection_outline_when_not_selected(view, item):
     view.scene.addItem(item)
     item.setSelected(False)
@@ -339,6 +506,25 @@ def test_update_from_data(item):
     assert item.flip() == -1
 
 
+def test_update_from_data_remembers_saved_state(item):
+    item.update_from_data(
+        save_id=3,
+        x=11,
+        y=22,
+        z=1.2,
+        scale=2.5,
+        rotation=45,
+        flip=-1,
+        data={'filename': 'bee.png'})
+    assert item.saved_state == (11, 22, 1.2, 2.5, 45, -1,
+                                {'filename': 'bee.png'})
+
+
+def test_update_from_data_without_save_id_keeps_saved_state(item):
+    item.update_from_data(rotation=45)
+    assert item.saved_state is None
+
+
 def test_update_from_data_keeps_flip(item):
     item.do_flip()
     item.update_from_data(flip=-1)
@@ -414,6 +600,54 @@ def test_create_copy(qapp, imgfilename3x3):
     assert copy.grayscale is True
 
 
+def test_sample_color_at(view):
+    img = QtGui.QImage(10, 10, QtGui.QImage.Format.Format_ARGB32)
+    img.fill(QtGui.QColor(255, 0, 0))
+    item = BeePixmapItem(img, 'foo.png')
+    view.scene.addItem(item)
+    assert item.sample_color_at(QtCore.QPointF(2, 2)) == QtGui.QColor(
+        255, 0, 0)
+
+
+def test_sample_color_at_when_transparent(view):
+    img = QtGui.QImage(10, 10, QtGui.QImage.Format.Format_ARGB32)
+    img.fill(QtGui.QColor(255, 0, 0, 0))
+    item = BeePixmapItem(img, 'foo.png')
+    view.scene.addItem(item)
+    assert item.sample_color_at(QtCore.QPointF(2, 2)) is None
+
+
+def test_sample_color_at_when_outside(view):
+    img = QtGui.QImage(10, 10, QtGui.QImage.Format.Format_ARGB32)
+    img.fill(QtGui.QColor(255, 0, 0))
+    item = BeePixmapItem(img, 'foo.png')
+    view.scene.addItem(item)
+    assert item.sample_color_at(QtCore.QPointF(20, 2)) is None
+
+
+def test_sample_color_at_after_set_pixmap(view):
+    img = QtGui.QImage(10, 10, QtGui.QImage.Format.Format_ARGB32)
+    img.fill(QtGui.QColor(255, 0, 0))
+    item = BeePixmapItem(img, 'foo.png')
+    view.scene.addItem(item)
+    item.sample_color_at(QtCore.QPointF(2, 2))
+    img.fill(QtGui.QColor(0, 0, 255))
+    item.setPixmap(QtGui.QPixmap.fromImage(img))
+    assert item.sample_color_at(QtCore.QPointF(2, 2)) == QtGui.QColor(
+        0, 0, 255)
+
+
+def test_sample_color_at_after_grayscale(view):
+    img = QtGui.QImage(10, 10, QtGui.QImage.Format.Format_ARGB32)
+    img.fill(QtGui.QColor(255, 0, 0))
+    item = BeePixmapItem(img, 'foo.png')
+    view.scene.addItem(item)
+    item.sample_color_at(QtCore.QPointF(2, 2))
+    item.grayscale = True
+    color = item.sample_color_at(QtCore.QPointF(2, 2))
+    assert color.red() == color.green() == color.blue()
+
+
 def test_color_gamut_finds_colors(qapp):
     img = QtGui.QImage(10, 10, QtGui.QImage.Format.Format_ARGB32)
     img.fill(QtGui.QColor(0, 0, 0))
@@ -445,6 +679,27 @@ def test_color_gamut_ignores_almost_transparent(qapp):
     assert item.color_gamut == {}
 
 
+def test_color_gamut_merges_colors_with_different_alpha(qapp):
+    img = QtGui.QImage(10, 10, QtGui.QImage.Format.Format_ARGB32)
+    img.fill(QtGui.QColor(0, 0, 0))
+    img.setPixelColor(1, 1, QtGui.QColor(255, 0, 0))
+    img.setPixelColor(2, 2, QtGui.QColor(255, 0, 0, 100))
+    item = BeePixmapItem(img, 'foo.png')
+    assert item.color_gamut == {(0, 255): 2}
+
+
+def test_color_gamut_samples_large_images(qapp):
+    img = QtGui.QImage(3000, 10, QtGui.QImage.Format.Format_ARGB32)
+    img.fill(QtGui.QColor(255, 0, 0))
+    item = BeePixmapItem(img, 'foo.png')
+    assert item.color_gamut == {(0, 255): 1000 * 4}
+
+
+def test_color_gamut_empty_image(qapp):
+    item = BeePixmapItem(QtGui.QImage(), 'foo.png')
+    assert item.color_gamut == {}
+
+
 def test_copy_to_clipboard(qapp, imgfilename3x3):
     clipboard = QtWidgets.QApplication.clipboard()
     item = BeePixmapItem(QtGui.QImage(imgfilename3x3), 'foo.png')
@@ -464,6 +719,11 @@ def test_crop_handle_topleft(qapp, item):
     assert item.crop_handle_topleft() == QtCore.QRectF(100, 200, 15, 15)
 
 
+def test_crop_handle_topleft_with_given_size(qapp, item):
+    item.crop_temp = QtCore.QRectF(100, 200, 300, 400)
+    assert item.crop_handle_topleft(10) == QtCore.QRectF(100, 200, 10, 10)
+
+
 def test_crop_handle_bottomleft(qapp, item):
     item.crop_temp = QtCore.QRectF(100, 200, 300, 400)
     assert item.crop_handle_bottomleft() == QtCore.QRectF(100, 585, 15, 15)
@@ -507,7 +767,7 @@ def test_paint(qapp, item):
     item.paint_selectable = MagicMock()
     item.crop = QtCore.QRectF(10, 20, 30, 40)
     painter = MagicMock(
-        combinedTransform=MagicMock(
+        worldTransform=MagicMock(
             return_value=MagicMock(
                 m11=MagicMock(return_value=0.5))))
     item.paint(painter, None, None)
@@ -516,6 +776,24 @@ def test_paint(qapp, item):
         QtCore.QRectF(10, 20, 30, 40),
         item.pixmap(),
         QtCore.QRectF(10, 20, 30, 40))
+    painter.setRenderHint.assert_called_once_with(
+        painter.RenderHint.SmoothPixmapTransform)
+
+
+def test_paint_when_zoomed_in(qapp, item):
+    item.pixmap = MagicMock()
+    item.paint_selectable = MagicMock()
+    painter = MagicMock(
+        worldTransform=MagicMock(
+            return_value=MagicMock(
+                m11=MagicMock(return_value=-3))))
+    item.paint(painter, None, None)
+    painter.setRenderHint.assert_not_called()
+
+
+def test_crop_edge_top_with_given_size(qapp, item):
+    item.crop_temp = QtCore.QRectF(100, 200, 300, 400)
+    assert item.crop_edge_top(10) == QtCore.QRectF(110, 200, 280, 10)
 
 
 def test_paint_when_crop_mode(qapp, item):
@@ -525,7 +803,7 @@ def test_paint_when_crop_mode(qapp, item):
     item.crop_mode = True
     item.crop_temp = QtCore.QRectF(11, 22, 29, 39)
     painter = MagicMock(
-        combinedTransform=MagicMock(
+        worldTransform=MagicMock(
             return_value=MagicMock(
                 m11=MagicMock(return_value=0.5))))
     item.paint(painter, None, None)
@@ -820,6 +1098,18 @@ def test_ensure_point_within_crop_bounds(
     assert result == QtCore.QPointF(*expected)
 
 
+def test_ensure_point_within_crop_bounds_after_set_pixmap(
+        qapp, item, imgfilename3x3):
+    item.crop_temp = QtCore.QRectF(0, 0, 1, 1)
+    item.ensure_point_within_crop_bounds(
+        QtCore.QPointF(0, 0), item.crop_handle_bottomright)
+    item.setPixmap(QtGui.QPixmap(imgfilename3x3))
+    item.crop_temp = QtCore.QRectF(0, 0, 1, 1)
+    result = item.ensure_point_within_crop_bounds(
+        QtCore.QPointF(10, 10), item.crop_handle_bottomright)
+    assert result == QtCore.QPointF(3, 3)
+
+
 @pytest.mark.parametrize(
     'start,pos,handle,expected',
     [[(10, 10), (5, 5), 'crop_handle_topleft', (5, 15, 35, 45)],
@@ -3,11 +3,12 @@ from unittest.mock import patch, MagicMock
 from PyQt6 import QtCore, QtWidgets
 from PyQt6.QtCore import Qt
 
-from beeref.items import BeeTextItem, item_registry
+from beeref.items import BeeTextItem, item_factories, item_registry
 
 
 def test_in_items_registry():
     assert item_registry['text'] == BeeTextItem
+    assert item_factories['text'] == BeeTextItem.create_from_data
 
 
 @patch('beeref.selection.SelectableMixin.init_selectable')
@@ -64,6 +65,16 @@ def test_get_extra_save_data(qapp):
     assert item.get_extra_save_data() == {'text': 'foo bar'}
 
 
+def test_get_save_state(qapp):
+    item = BeeTextItem('foo bar')
+    item.setPos(11, 22)
+    item.setZValue(1.2)
+    item.setScale(2.5)
+    item.setRotation(45)
+    assert item.get_save_state() == (
+        11, 22, 1.2, 2.5, 45, 1, {'text': 'foo bar'})
+
+
 @patch('beeref.items.BeeTextItem.boundingRect')
 def test_contains_when_inside_bounds(brect_mock, qapp):
     brect_mock.return_value = QtCore.QRectF(20, 30, 50, 50)
@@ -76,7 +76,7 @@ def test_select_handle_free_center(view, item):
 def test_draw_debug_shape_rect(view, item):
     view.scene.addItem(item)
     painter = MagicMock(
-        combinedTransform=MagicMock(
+        worldTransform=MagicMock(
             return_value=MagicMock(
                 m11=MagicMock(return_value=0.5))))
     item.draw_debug_shape(
@@ -90,7 +90,7 @@ def test_draw_debug_shape_rect(view, item):
 def test_draw_debug_shape_path(view, item):
     view.scene.addItem(item)
     painter = MagicMock(
-        combinedTransform=MagicMock(
+        worldTransform=MagicMock(
             return_value=MagicMock(
                 m11=MagicMock(return_value=0.5))))
     path = QtGui.QPainterPath()
@@ -107,7 +107,7 @@ def test_draw_debug_shape_path(view, item):
 def test_paint_when_not_selected(debug_mock, view, item):
     view.scene.addItem(item)
     painter = MagicMock(
-        combinedTransform=MagicMock(
+        worldTransform=MagicMock(
             return_value=MagicMock(
                 m11=MagicMock(return_value=0.5))))
     item.setSelected(False)
@@ -121,7 +121,7 @@ def test_paint_when_not_selected(debug_mock, view, item):
 def test_paint_when_selected_single_selection(view, item):
     view.scene.addItem(item)
     painter = MagicMock(
-        combinedTransform=MagicMock(
+        worldTransform=MagicMock(
             return_value=MagicMock(
                 m11=MagicMock(return_value=0.5))))
     item.setSelected(True)
@@ -137,7 +137,7 @@ def test_paint_when_selected_multi_selection(view, item):
     item2.setSelected(True)
     view.scene.addItem(item2)
     painter = MagicMock(
-        combinedTransform=MagicMock(
+        worldTransform=MagicMock(
             return_value=MagicMock(
                 m11=MagicMock(return_value=0.5))))
     item.setSelected(True)
@@ -155,7 +155,7 @@ def test_paint_when_debug_shapes(view):
             args_mock.debug_handles = False
             item = BeePixmapItem(QtGui.QImage())
             painter = MagicMock(
-                combinedTransform=MagicMock(
+                worldTransform=MagicMock(
                     return_value=MagicMock(
                         m11=MagicMock(return_value=0.5))))
             item.paint(painter, None, None)
@@ -170,7 +170,7 @@ def test_paint_when_debug_boundingrects(view):
             args_mock.debug_handles = False
             item = BeePixmapItem(QtGui.QImage())
             painter = MagicMock(
-                combinedTransform=MagicMock(
+                worldTransform=MagicMock(
                     return_value=MagicMock(
                         m11=MagicMock(return_value=0.5))))
             item.paint(painter, None, None)
@@ -187,7 +187,7 @@ def test_paint_when_debug_handles(view):
             view.scene.addItem(item)
             item.setSelected(True)
             painter = MagicMock(
-                combinedTransform=MagicMock(
+                worldTransform=MagicMock(
                     return_value=MagicMock(
                         m11=MagicMock(return_value=0.5))))
             item.paint(painter, None, None)
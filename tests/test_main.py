@@ -29,8 +29,9 @@ def test_beerefapplication_fileopenevent(open_mock, qapp, main_window):
 
 @patch('beeref.__main__.BeeRefApplication')
 @patch('beeref.__main__.CommandlineArgs')
+@patch('beeref.config.BeeSettings.sync')
 @patch('beeref.config.BeeSettings.on_startup')
-def test_main(startup_mock, args_mock, app_mock, qapp):
+def test_main(startup_mock, sync_mock, args_mock, app_mock, qapp):
     app_mock.return_value = qapp
     args_mock.return_value.filename = None
     args_mock.return_value.loglevel = 'WARN'
@@ -42,3 +43,4 @@ def test_main(startup_mock, args_mock, app_mock, qapp):
 
     args_mock.assert_called_once_with(with_check=True)
     startup_mock.assert_called()
+    sync_mock.assert_called_once_with()
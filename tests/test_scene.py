@@ -614,6 +614,17 @@ def test_sample_color_at_when_no_item(view):
     assert view.scene.sample_color_at(QtCore.QPointF(2, 2)) is None
 
 
+def test_clear_sample_images(view):
+    item = BeePixmapItem(
+        QtGui.QImage(10, 10, QtGui.QImage.Format.Format_ARGB32), 'foo.png')
+    view.scene.addItem(item)
+    view.scene.addItem(BeeTextItem('foo'))
+    view.scene.sample_color_at(QtCore.QPointF(2, 2))
+    assert '_sample_image' in item.__dict__
+    view.scene.clear_sample_images()
+    assert '_sample_image' not in item.__dict__
+
+
 def test_select_all_items_when_true(view):
     item1 = BeeTextItem('foo')
     view.scene.addItem(item1)
@@ -1397,6 +1408,30 @@ def test_add_queued_items_selected(view):
     assert item.zValue() > 0.6
 
 
+def test_add_queued_items_batches_selection_changed(view):
+    for i in range(3):
+        data = {'type': 'text', 'z': 0.1 * i, 'data': {'text': 'foo'}}
+        view.scene.add_item_later(data, selected=True)
+    callback = MagicMock()
+    view.scene.selectionChanged.connect(callback)
+    view.scene.add_queued_items()
+    # Once for the added items, once more for adding the multi select
+    # item as a result
+    assert callback.call_count == 2
+    assert len(view.scene.selectedItems(user_only=True)) == 3
+    assert view.scene.multi_select_item.scene() == view.scene
+    assert view.scene.signalsBlocked() is False
+
+
+def test_add_queued_items_unselected_doesnt_emit_selection_changed(view):
+    data = {'type': 'text', 'z': 0.33, 'data': {'text': 'foo'}}
+    view.scene.add_item_later(data, selected=False)
+    callback = MagicMock()
+    view.scene.selectionChanged.connect(callback)
+    view.scene.add_queued_items()
+    callback.assert_not_called()
+
+
 def test_add_queued_items_when_no_items(view):
     view.scene.add_queued_items()
     assert view.scene.items() == []
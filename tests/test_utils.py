@@ -85,13 +85,83 @@ def test_actionlist_inits_dict():
     action1 = Action(id='foo', text='Foo')
     action2 = Action(id='bar', text='Bar')
     actionlist = utils.ActionList([action1, action2])
-    actionlist['foo'] == action1
-    actionlist['bar'] == action2
+    assert actionlist['foo'] == action1
+    assert actionlist['bar'] == action2
 
 
 def test_actionlist_acts_as_list():
     action1 = Action(id='foo', text='Foo')
     action2 = Action(id='bar', text='Bar')
     actionlist = utils.ActionList([action1, action2])
-    actionlist[0] == action1
-    actionlist[1] == action2
+    assert actionlist[0] == action1
+    assert actionlist[1] == action2
+    assert actionlist[-1] == action2
+
+
+def test_actionlist_values():
+    action1 = Action(id='foo', text='Foo')
+    action2 = Action(id='bar', text='Bar')
+    actionlist = utils.ActionList([action1, action2])
+    assert actionlist.values() == (action1, action2)
+    assert actionlist.values() is actionlist.values()
+
+
+def test_actionlist_values_after_modification():
+    action1 = Action(id='foo', text='Foo')
+    action2 = Action(id='bar', text='Bar')
+    action3 = Action(id='baz', text='Baz')
+    actionlist = utils.ActionList([action1, action2])
+    actionlist.values()
+    actionlist['baz'] = action3
+    assert actionlist.values() == (action1, action2, action3)
+    assert actionlist[2] == action3
+    actionlist.pop('foo')
+    assert actionlist.values() == (action2, action3)
+    del actionlist['bar']
+    assert actionlist.values() == (action3,)
+    actionlist.clear()
+    assert actionlist.values() == ()
+
+
+def test_bytes_lru_cache_get_set():
+    cache = utils.BytesLRUCache(max_size=10)
+    cache.set('foo', (b'abc', 'png'), 3)
+    assert cache.get('foo') == (b'abc', 'png')
+    assert cache.get('bar') is None
+    assert cache.size == 3
+
+
+def test_bytes_lru_cache_evicts_least_recently_used():
+    cache = utils.BytesLRUCache(max_size=10)
+    cache.set('foo', b'abcd', 4)
+    cache.set('bar', b'abcd', 4)
+    cache.get('foo')
+    cache.set('baz', b'abcd', 4)
+    assert cache.get('foo') == b'abcd'
+    assert cache.get('bar') is None
+    assert cache.get('baz') == b'abcd'
+    assert cache.size == 8
+
+
+def test_bytes_lru_cache_replaces_existing_key():
+    cache = utils.BytesLRUCache(max_size=10)
+    cache.set('foo', b'abcd', 4)
+    cache.set('foo', b'ab', 2)
+    assert cache.get('foo') == b'ab'
+    assert cache.size == 2
+    assert len(cache) == 1
+
+
+def test_bytes_lru_cache_ignores_too_large_values():
+    cache = utils.BytesLRUCache(max_size=10)
+    cache.set('foo', b'a' * 11, 11)
+    assert cache.get('foo') is None
+    assert cache.size == 0
+
+
+def test_bytes_lru_cache_clear():
+    cache = utils.BytesLRUCache(max_size=10)
+    cache.set('foo', b'abcd', 4)
+    cache.clear()
+    assert cache.get('foo') is None
+    assert cache.size == 0
@@ -10,7 +10,7 @@ from PyQt6.QtCore import Qt
 from beeref import commands, widgets
 from beeref.actions import actions
 from beeref.config import logfile_name
-from beeref.items import BeePixmapItem, BeeTextItem
+from beeref.items import BeePixmapItem, BeeTextItem, pixmap_bytes_cache
 from beeref.view import BeeGraphicsView
 
 
@@ -96,6 +96,15 @@ def test_clear_scene(view, item):
     assert view.parent.windowTitle() == 'BeeRef'
 
 
+def test_clear_scene_clears_pixmap_bytes_cache(view, item):
+    pixmap_bytes_cache.clear()
+    view.scene.addItem(item)
+    item.pixmap_to_bytes()
+    assert len(pixmap_bytes_cache) == 1
+    view.clear_scene()
+    assert len(pixmap_bytes_cache) == 0
+
+
 def test_reset_previous_transform_when_other_item(view):
     item1 = MagicMock()
     item2 = MagicMock()
@@ -1076,6 +1085,15 @@ def test_cancel_active_modes_when_sample_color_mode(view):
     assert view.viewport().cursor() == Qt.CursorShape.ArrowCursor
 
 
+def test_cancel_sample_color_mode_clears_sample_images(view):
+    view.scene.clear_sample_images = MagicMock()
+    view.active_mode = view.SAMPLE_COLOR_MODE
+    view.sample_color_widget = widgets.SampleColorWidget(
+        view, MagicMock(), MagicMock())
+    view.cancel_sample_color_mode()
+    view.scene.clear_sample_images.assert_called_once_with()
+
+
 def test_cancel_sample_color_mode_when_multi_selection(view, item):
     view.scene.addItem(item)
     item.setSelected(True)